@@ -0,0 +1,121 @@
+"""
+Borrow/return throughput of branches sharing a database versus sharded.
+
+Runs N threads of borrow and return cycles, each on its own book and reader,
+first with every thread in the same branch (one SQLite file, whose single
+writer lock serializes the commits) and then with each thread in its own
+branch on its own SQLite file. Commits are synced to disk (synchronous=FULL),
+as a durable deployment would.
+
+    python benchmarks/branch_throughput.py [--threads 1 2 4] [--seconds S]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "library")
+)
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import django
+from django.conf import settings
+
+from library import settings as base_settings
+
+TMP_DIR = tempfile.mkdtemp(prefix="branch-throughput-")
+MAX_THREADS = 8
+
+
+def sqlite_database(name):
+    return {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.path.join(TMP_DIR, f"{name}.sqlite3"),
+        "OPTIONS": {
+            "timeout": 60,
+            "transaction_mode": "IMMEDIATE",
+            "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=FULL",
+        },
+    }
+
+
+branches = {f"b{i}": "default" if i == 0 else f"b{i}" for i in range(MAX_THREADS)}
+settings.configure(
+    **{
+        name: getattr(base_settings, name)
+        for name in dir(base_settings)
+        if name.isupper()
+    },
+)
+settings.DATABASES = {alias: sqlite_database(alias) for alias in branches.values()}
+settings.BRANCHES = branches
+settings.DEFAULT_BRANCH = "b0"
+settings.LOAN_EVENTS = {**settings.LOAN_EVENTS, "DURABLE": True}
+django.setup()
+
+from django.core.management import call_command
+from django.db import connections
+
+from api.branches import use_branch
+from api.models import Book, Reader
+from api.services import BookService, create_reader
+
+
+def prepare():
+    for branch, alias in branches.items():
+        call_command("migrate", database=alias, verbosity=0)
+        with use_branch(branch):
+            for i in range(MAX_THREADS):
+                BookService.create_book(f"10000{i}", f"Book {i}", "Author")
+                create_reader(f"20000{i}")
+
+
+def worker(branch, slot, deadline, counts):
+    done = 0
+    with use_branch(branch):
+        book = Book.objects.get(pk=f"10000{slot}")
+        reader = Reader.objects.get(serial_number=f"20000{slot}")
+        while time.monotonic() < deadline:
+            BookService.update_borrow_status(book, reader)
+            BookService.update_borrow_status(book, None)
+            done += 2
+    connections.close_all()
+    counts.append(done)
+
+
+def run(assignments, seconds):
+    counts = []
+    deadline = time.monotonic() + seconds
+    threads = [
+        threading.Thread(target=worker, args=(branch, slot, deadline, counts))
+        for slot, branch in enumerate(assignments)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    if max(args.threads) > MAX_THREADS:
+        parser.error(f"At most {MAX_THREADS} threads.")
+
+    prepare()
+    print(f"{'threads':>7} {'shared ops/s':>13} {'sharded ops/s':>14} {'speedup':>8}")
+    for n in args.threads:
+        shared = run(["b0"] * n, args.seconds)
+        sharded = run([f"b{i}" for i in range(n)], args.seconds)
+        print(f"{n:>7} {shared:>13.0f} {sharded:>14.0f} {sharded / shared:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Book retrieve latency with pooled, persistent and per-request connections.
+
+Starts a throwaway PostgreSQL cluster (initdb and pg_ctl must be on PATH or
+in `pg_config --bindir`, and the script must not run as root), with
+password authentication over TCP like a deployed server. Then N threads
+send GET /api/books/{serial}/ through the WSGI handler, so connections are
+opened and released as in a gunicorn worker, once for each setup:
+
+- unpooled: CONN_MAX_AGE=0, a new connection for every request
+- persistent: CONN_MAX_AGE=60, a connection kept by every thread
+- pooled: OPTIONS["pool"], connections borrowed from a psycopg 3 pool
+
+Needs psycopg 3 with its pool: poetry install --extras pool.
+--existing uses the POSTGRES_* server instead of starting one; its
+database gets migrated and written to.
+
+    python benchmarks/connection_pool.py [--threads N] [--requests N] [--existing]
+"""
+
+import argparse
+import atexit
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "library")
+)
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+MODES = ["unpooled", "persistent", "pooled"]
+PASSWORD = "benchmark"
+
+
+def postgres_binary(name):
+    path = shutil.which(name)
+    if path is None:
+        bindir = subprocess.run(
+            ["pg_config", "--bindir"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        path = os.path.join(bindir, name)
+    return path
+
+
+def start_postgres():
+    """Start a temporary cluster, stopped at exit; returns its settings."""
+    directory = tempfile.mkdtemp(prefix="connection-pool-")
+    data = os.path.join(directory, "data")
+    password_file = os.path.join(directory, "password")
+    with open(password_file, "w") as f:
+        f.write(PASSWORD)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    subprocess.run(
+        [
+            postgres_binary("initdb"),
+            "--pgdata",
+            data,
+            "--username",
+            "postgres",
+            "--pwfile",
+            password_file,
+            "--auth",
+            "scram-sha-256",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    pg_ctl = postgres_binary("pg_ctl")
+    subprocess.run(
+        [
+            pg_ctl,
+            "--pgdata",
+            data,
+            "--log",
+            os.path.join(directory, "postgres.log"),
+            "--options",
+            f"-p {port} -k {directory} -c listen_addresses=127.0.0.1",
+            "--wait",
+            "start",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    atexit.register(
+        subprocess.run,
+        [pg_ctl, "--pgdata", data, "--mode", "fast", "stop"],
+        capture_output=True,
+    )
+    return {
+        "NAME": "postgres",
+        "USER": "postgres",
+        "PASSWORD": PASSWORD,
+        "HOST": "127.0.0.1",
+        "PORT": str(port),
+    }
+
+
+def setup_django(server, threads):
+    import django
+    from django.conf import settings
+
+    from library import settings as base_settings
+
+    settings.configure(
+        **{
+            name: getattr(base_settings, name)
+            for name in dir(base_settings)
+            if name.isupper()
+        },
+    )
+    database = {
+        **settings.DATABASES["default"],
+        **server,
+        "ENGINE": "django.db.backends.postgresql",
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
+    }
+    settings.DATABASES = {
+        "default": {**database, "CONN_MAX_AGE": 0},
+        "persistent": {**database, "CONN_MAX_AGE": 60},
+        "pooled": {
+            **database,
+            "CONN_MAX_AGE": 0,
+            "OPTIONS": {"pool": {"min_size": threads, "max_size": threads}},
+        },
+    }
+    # Every setup reads the same database under its own alias
+    settings.BRANCHES = {
+        "unpooled": "default",
+        "persistent": "persistent",
+        "pooled": "pooled",
+    }
+    settings.DEFAULT_BRANCH = "unpooled"
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ["localhost"]
+    settings.RATE_LIMIT = {**settings.RATE_LIMIT, "ENABLED": False}
+    settings.CONCURRENCY_LIMIT = {**settings.CONCURRENCY_LIMIT, "ENABLED": False}
+    django.setup()
+
+
+def run(mode, serial_numbers, threads, requests):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connections
+    from django.test import RequestFactory
+
+    handler = WSGIHandler()
+    factory = RequestFactory(SERVER_NAME="localhost")
+    latencies = []
+
+    def start_response(status, headers):
+        assert status.startswith("200"), status
+
+    def client(offset):
+        timings = []
+        for i in range(requests):
+            serial_number = serial_numbers[(offset + i) % len(serial_numbers)]
+            environ = factory.get(
+                f"/api/books/{serial_number}/", HTTP_X_LIBRARY_BRANCH=mode
+            ).environ
+            started = time.perf_counter()
+            response = handler(environ, start_response)
+            b"".join(response)
+            response.close()  # request_finished releases the connection
+            timings.append(time.perf_counter() - started)
+        connections.close_all()
+        latencies.extend(timings)
+
+    workers = [threading.Thread(target=client, args=(i * 7,)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    percentiles = statistics.quantiles(latencies, n=100)
+    return len(latencies) / elapsed, percentiles[49], percentiles[98]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=500, help="per thread")
+    parser.add_argument("--books", type=int, default=100)
+    parser.add_argument("--existing", action="store_true")
+    args = parser.parse_args()
+
+    server = {} if args.existing else start_postgres()
+    setup_django(server, args.threads)
+
+    from django.core.management import call_command
+
+    from api.models import Book
+
+    call_command("migrate", verbosity=0)
+    serial_numbers = [str(500000 + i) for i in range(args.books)]
+    Book.objects.bulk_create(
+        [
+            Book(serial_number=s, title=f"Book {s}", author="Author")
+            for s in serial_numbers
+        ],
+        ignore_conflicts=True,
+    )
+
+    print(f"{args.threads} threads x {args.requests} requests")
+    print(f"{'':>10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in MODES:
+        throughput, p50, p99 = run(mode, serial_numbers, args.threads, args.requests)
+        print(f"{mode:>10} {throughput:>8.0f} {p50 * 1000:>8.2f} {p99 * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
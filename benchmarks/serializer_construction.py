@@ -0,0 +1,84 @@
+"""
+Microbenchmark of serializer construction on the hot book endpoints.
+
+Compares building and rendering the serializers of retrieve, create and the
+status action with fields cached per class (CachedFieldsMixin) against
+rebuilding them through model introspection on every instantiation.
+
+    python benchmarks/serializer_construction.py [--iterations N]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "library")
+)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library.settings")
+os.environ.setdefault("TEST_DATABASE", "sqlite")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import django
+
+django.setup()
+
+from rest_framework import serializers
+
+from api.models import Book
+from api.serializers import BookListSerializer, BookSerializer, BookStatusSerializer
+
+
+def uncached(serializer_class):
+    """The same serializer, building its fields on every instantiation"""
+    return type(
+        f"Uncached{serializer_class.__name__}",
+        (serializer_class,),
+        {"get_fields": serializers.ModelSerializer.get_fields},
+    )
+
+
+def request_cycle(book_serializer, status_serializer, list_serializer, book):
+    # retrieve
+    book_serializer(book).data
+    # create
+    book_serializer(
+        data={"serial_number": "123456", "title": "Title", "author": "Author"}
+    ).fields
+    # status
+    status_serializer(data={"borrower": None}).fields
+    list_serializer(book).data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    book = Book(serial_number="123456", title="Title", author="Author")
+    variants = {
+        "uncached": (
+            uncached(BookSerializer),
+            uncached(BookStatusSerializer),
+            uncached(BookListSerializer),
+        ),
+        "cached": (BookSerializer, BookStatusSerializer, BookListSerializer),
+    }
+    timings = {}
+    for name, classes in variants.items():
+        request_cycle(*classes, book)
+        best = min(
+            timeit.repeat(
+                lambda: request_cycle(*classes, book),
+                number=args.iterations,
+                repeat=5,
+            )
+        )
+        timings[name] = best / args.iterations * 1e6
+        print(f"{name:>9}: {timings[name]:8.1f} us per request")
+    print(f"  speedup: {timings['uncached'] / timings['cached']:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
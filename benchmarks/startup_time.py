@@ -0,0 +1,117 @@
+"""
+Cold start of a worker process, with and without the preload warm-up.
+
+Starts fresh interpreters that set up Django and serve two book list
+requests from a file SQLite database, and reports the median time of each
+phase. "cold" serves the first request right after setup; "warm" runs
+api.warmup.warm_up_app first, as gunicorn.conf.py does in the master before
+forking workers, so the difference in the first request is what preloading
+saves each worker. Watch the setup and first request columns for
+regressions.
+
+    python benchmarks/startup_time.py [--runs N]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_started = time.perf_counter()
+
+LIBRARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "library")
+PHASES = ["setup", "warm-up", "1st request", "2nd request"]
+
+
+def setup_django(database):
+    sys.path.insert(0, LIBRARY_DIR)
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+    import django
+    from django.conf import settings
+
+    from library import settings as base_settings
+
+    settings.configure(
+        **{
+            name: getattr(base_settings, name)
+            for name in dir(base_settings)
+            if name.isupper()
+        },
+    )
+    settings.DATABASES = {
+        "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": database}
+    }
+    django.setup()
+
+
+def child(database, warm):
+    timings = {}
+    setup_django(database)
+    timings["setup"] = time.perf_counter() - _started
+
+    from django.test import Client
+
+    from api.warmup import warm_up_app
+
+    started = time.perf_counter()
+    if warm:
+        warm_up_app()
+    timings["warm-up"] = time.perf_counter() - started
+
+    client = Client(SERVER_NAME="localhost")
+    for phase in ("1st request", "2nd request"):
+        started = time.perf_counter()
+        response = client.get("/api/books/")
+        timings[phase] = time.perf_counter() - started
+        assert response.status_code == 200, response.status_code
+    print(json.dumps(timings))
+
+
+def run(database, warm, runs):
+    results = []
+    for _ in range(runs):
+        args = [sys.executable, __file__, "--child", database]
+        if warm:
+            args.append("--warm")
+        output = subprocess.run(args, check=True, capture_output=True, text=True)
+        results.append(json.loads(output.stdout))
+    return {phase: statistics.median(r[phase] for r in results) for phase in PHASES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", metavar="DATABASE", help=argparse.SUPPRESS)
+    parser.add_argument("--warm", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.warm)
+        return
+
+    database = os.path.join(tempfile.mkdtemp(prefix="startup-time-"), "db.sqlite3")
+    setup_django(database)
+    from django.core.management import call_command
+
+    from api.services import BookService
+
+    call_command("migrate", verbosity=0)
+    for i in range(20):
+        BookService.create_book(f"{100000 + i}", f"Book {i}", "Author")
+
+    print(f"median of {args.runs} runs, ms")
+    print(f"{'':>5}" + "".join(f"{phase:>13}" for phase in PHASES))
+    for mode in ("cold", "warm"):
+        timings = run(database, mode == "warm", args.runs)
+        print(
+            f"{mode:>5}"
+            + "".join(f"{timings[phase] * 1000:>13.1f}" for phase in PHASES)
+        )
+
+
+if __name__ == "__main__":
+    main()
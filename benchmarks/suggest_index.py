@@ -0,0 +1,80 @@
+"""
+Memory and latency of the in-memory title typeahead index.
+
+Builds a PrefixIndex over synthetic books and reports the memory it holds
+and the time of prefix lookups.
+
+    python benchmarks/suggest_index.py [--books N] [--queries N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "library")
+)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library.settings")
+os.environ.setdefault("TEST_DATABASE", "sqlite")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import django
+
+django.setup()
+
+from api.suggest import PrefixIndex
+
+SYLLABLES = "ka lo mi ra the so na ve li to qua ber an dor el win gar hel".split()
+
+
+def word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+
+
+def books(count, rng):
+    for i in range(count):
+        title = " ".join(word(rng) for _ in range(rng.randint(1, 5))).title()
+        author = f"{word(rng).title()} {word(rng).title()}"
+        yield f"{i:06d}", title, author
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=10000)
+    args = parser.parse_args()
+    rng = random.Random(42)
+    catalog = list(books(args.books, rng))
+
+    started = time.perf_counter()
+    index = PrefixIndex.build(catalog)
+    build_time = time.perf_counter() - started
+    del index
+    # Tracing slows the build down, so memory is measured on a second one
+    tracemalloc.start()
+    index = PrefixIndex.build(catalog)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    prefixes = [word(rng)[: rng.randint(2, 4)] for _ in range(args.queries)]
+    timings = []
+    for prefix in prefixes:
+        started = time.perf_counter()
+        index.search(prefix, 10)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+
+    print(f"books:            {len(index)}")
+    print(f"entries:          {index.entry_count}")
+    print(f"build time:       {build_time:.2f} s")
+    print(f"memory:           {memory / 2**20:.1f} MiB")
+    print(f"per 100k books:   {memory / len(index) * 100000 / 2**20:.1f} MiB")
+    print(f"lookup p50:       {timings[len(timings) // 2] * 1e6:.1f} us")
+    print(f"lookup p99:       {timings[int(len(timings) * 0.99)] * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
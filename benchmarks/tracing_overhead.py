@@ -0,0 +1,118 @@
+"""
+Cost of request tracing on the book status endpoint.
+
+Times borrow and return PATCH requests through the full middleware stack
+with tracing disabled, enabled but not sampling the requests, and
+recording every request to a JSON lines file (whose writes happen on the
+exporter's background thread). The database is in memory, so the timings
+are the CPU cost of the request and its tracing.
+
+    python benchmarks/tracing_overhead.py [--iterations N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "library")
+)
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import django
+from django.conf import settings
+
+from library import settings as base_settings
+
+TMP_DIR = tempfile.mkdtemp(prefix="tracing-overhead-")
+
+settings.configure(
+    **{
+        name: getattr(base_settings, name)
+        for name in dir(base_settings)
+        if name.isupper()
+    },
+)
+settings.DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    }
+}
+settings.BRANCHES = {"main": "default"}
+settings.DEFAULT_BRANCH = "main"
+settings.ALLOWED_HOSTS = ["testserver"]
+settings.RATE_LIMIT = {**settings.RATE_LIMIT, "ENABLED": False}
+settings.CONCURRENCY_LIMIT = {**settings.CONCURRENCY_LIMIT, "ENABLED": False}
+settings.LOAN_EVENTS = {**settings.LOAN_EVENTS, "DURABLE": True}
+django.setup()
+
+from django.core.management import call_command
+from django.test import Client
+
+from api.services import BookService, create_reader
+from api.tracing import get_exporter
+
+SPANS_FILE = os.path.join(TMP_DIR, "spans.jsonl")
+VARIANTS = {
+    "disabled": {"ENABLED": False},
+    "unsampled": {"ENABLED": True, "SAMPLE_RATE": 0},
+    "sampled": {"ENABLED": True, "SAMPLE_RATE": 1},
+}
+
+
+def configure(variant):
+    settings.TRACING = {
+        **base_settings.TRACING,
+        **VARIANTS[variant],
+        "EXPORTER": {
+            "BACKEND": "api.tracing.JsonLinesExporter",
+            "OPTIONS": {"path": SPANS_FILE, "flush_interval": 0.5},
+        },
+    }
+
+
+def borrow_and_return(client, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for borrower in ("200000", None):
+            response = client.patch(
+                "/api/books/100000/status/",
+                {"borrower": borrower},
+                content_type="application/json",
+            )
+            assert response.status_code == 200, response.content
+    return (time.perf_counter() - started) / (iterations * 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    BookService.create_book("100000", "Book", "Author")
+    create_reader("200000")
+    client = Client()
+
+    timings = {}
+    for variant in VARIANTS:
+        configure(variant)
+        borrow_and_return(client, 20)
+        timings[variant] = min(
+            borrow_and_return(client, args.iterations) for _ in range(3)
+        )
+        get_exporter().flush()
+        overhead = timings[variant] / timings["disabled"] - 1
+        print(
+            f"{variant:>10}: {timings[variant] * 1e6:8.1f} us per request"
+            f" ({overhead:+.1%})"
+        )
+    with open(SPANS_FILE) as f:
+        print(f"{sum(1 for _ in f)} spans written to {SPANS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
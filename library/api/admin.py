@@ -1,6 +1,165 @@
-from django.contrib import admin
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils import timezone
+from django.utils.functional import cached_property
 
-from .models import Reader
+from .models import Book, Reader
+from .services import BookService
 
-# Register your models here.
-admin.site.register(Reader)
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that trusts PostgreSQL's row estimate for unfiltered tables.
+
+    An exact COUNT(*) of a table with millions of rows scans all of it; the
+    planner's estimate (pg_class.reltuples, refreshed by VACUUM/ANALYZE) is
+    instant. Below ADMIN_ESTIMATED_COUNT_THRESHOLD rows, for filtered
+    querysets and on other databases, rows are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        # The default manager may filter, e.g. books leave out withdrawn ones
+        unfiltered = queryset.model._default_manager.all().query.where
+        if queryset.query.where == unfiltered:
+            estimate = self._estimate(queryset)
+            if estimate > settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def _estimate(queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else 0
+
+
+class LoanStatusFilter(admin.SimpleListFilter):
+    title = "status"
+    parameter_name = "status"
+
+    def lookups(self, request, model_admin):
+        return [
+            ("borrowed", "Borrowed"),
+            ("available", "Available"),
+            ("overdue", "Overdue"),
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() == "borrowed":
+            return queryset.filter(borrower__isnull=False)
+        if self.value() == "available":
+            return queryset.filter(borrower__isnull=True)
+        if self.value() == "overdue":
+            return queryset.filter(due_date__lt=timezone.now())
+        return queryset
+
+
+class LoanActionForm(ActionForm):
+    reader = forms.CharField(
+        required=False, max_length=6, label="Reader serial number (to lend to)"
+    )
+
+
+@admin.register(Book)
+class BookAdmin(admin.ModelAdmin):
+    list_display = [
+        "serial_number",
+        "title",
+        "author",
+        "borrower",
+        "borrow_date",
+        "due_date",
+    ]
+    list_select_related = ["borrower"]
+    list_filter = [LoanStatusFilter]
+    # Exact matches only, both are served by unique indexes
+    search_fields = ["=serial_number", "=borrower__serial_number"]
+    search_help_text = "Book or reader serial number"
+    raw_id_fields = ["borrower"]
+    readonly_fields = ["borrow_date", "due_date"]
+    ordering = ["serial_number"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = LoanActionForm
+    actions = ["lend_books", "return_books"]
+
+    def save_model(self, request, obj, form, change):
+        """
+        Save through BookService, so loan counters, history and statistics
+        follow borrower changes made in the form.
+        """
+        borrower = obj.borrower
+        if change:
+            obj.borrower_id = form.initial.get("borrower")
+            obj.save()
+        else:
+            obj.borrower = None
+            BookService.create_book(obj.serial_number, obj.title, obj.author)
+            obj._state.adding = False
+        if "borrower" in form.changed_data:
+            try:
+                BookService.update_borrow_status(obj, borrower)
+            except ValidationError as e:
+                self.message_user(request, " ".join(e.messages), messages.ERROR)
+            except Book.DoesNotExist:
+                self.message_user(
+                    request, "The book was withdrawn meanwhile.", messages.ERROR
+                )
+
+    def delete_model(self, request, obj):
+        BookService.delete(obj.serial_number)
+
+    def delete_queryset(self, request, queryset):
+        for serial_number in queryset.values_list("serial_number", flat=True):
+            BookService.delete(serial_number)
+
+    @admin.action(description="Lend selected books to the reader")
+    def lend_books(self, request, queryset):
+        serial_number = request.POST.get("reader", "").strip()
+        reader = Reader.objects.filter(serial_number=serial_number).first()
+        if reader is None:
+            self.message_user(
+                request,
+                f"Reader with serial number '{serial_number}' not found.",
+                messages.ERROR,
+            )
+            return
+        try:
+            borrowed = BookService.bulk_borrow(
+                list(queryset.values_list("serial_number", flat=True)), reader
+            )
+        except ValidationError as e:
+            self.message_user(request, " ".join(e.messages), messages.ERROR)
+            return
+        self.message_user(request, f"Lent {len(borrowed)} book(s) to {reader}.")
+
+    @admin.action(description="Return selected books")
+    def return_books(self, request, queryset):
+        returned = BookService.bulk_return(
+            list(queryset.values_list("serial_number", flat=True))
+        )
+        self.message_user(request, f"Returned {len(returned)} book(s).")
+
+
+@admin.register(Reader)
+class ReaderAdmin(admin.ModelAdmin):
+    list_display = ["serial_number", "active_loans", "loan_limit"]
+    search_fields = ["=serial_number"]
+    readonly_fields = ["active_loans"]
+    ordering = ["serial_number"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,89 @@
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+
+from .profiler import function_samples, get_store
+
+
+class LibraryAdminSite(admin.AdminSite):
+    """
+    The admin site, with the request profiles of api.profiler listed next
+    to the models. Profiles are shown to superusers only, since their paths
+    may hold query parameters.
+    """
+
+    def get_urls(self):
+        return [
+            path(
+                "profiles/",
+                self.admin_view(self.profile_list),
+                name="profile_list",
+            ),
+            path(
+                "profiles/<int:profile_id>/",
+                self.admin_view(self.profile_detail),
+                name="profile_detail",
+            ),
+        ] + super().get_urls()
+
+    def get_app_list(self, request, app_label=None):
+        app_list = super().get_app_list(request, app_label)
+        if app_label is None and request.user.is_superuser:
+            url = reverse("admin:profile_list", current_app=self.name)
+            app_list.append(
+                {
+                    "name": "Profiling",
+                    "app_label": "profiling",
+                    "app_url": url,
+                    "has_module_perms": True,
+                    "models": [
+                        {
+                            "name": "Request profiles",
+                            "object_name": "RequestProfile",
+                            "admin_url": url,
+                            "add_url": None,
+                            "view_only": True,
+                            "perms": {"view": True},
+                        }
+                    ],
+                }
+            )
+        return app_list
+
+    def profile_list(self, request):
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        return TemplateResponse(
+            request,
+            "admin/api/profile_list.html",
+            {
+                **self.each_context(request),
+                "title": "Request profiles",
+                "profiles": get_store().list(),
+            },
+        )
+
+    def profile_detail(self, request, profile_id):
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        profile = get_store().get(profile_id)
+        if profile is None:
+            raise Http404("The profile was never stored or has been overwritten.")
+        if request.GET.get("format") == "collapsed":
+            response = HttpResponse(profile["stacks"], content_type="text/plain")
+            response["Content-Disposition"] = (
+                f'attachment; filename="profile-{profile_id}.collapsed"'
+            )
+            return response
+        return TemplateResponse(
+            request,
+            "admin/api/profile_detail.html",
+            {
+                **self.each_context(request),
+                "title": f"Profile {profile_id}: {profile['method']} {profile['path']}",
+                "profile": profile,
+                "functions": function_samples(profile["stacks"])[:50],
+            },
+        )
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.contrib.admin.apps import AdminConfig
 
 
 class ApiConfig(AppConfig):
@@ -7,5 +8,17 @@ class ApiConfig(AppConfig):
 
     def ready(self):
         import api.signals  # noqa: F401
+        from api.throttling import get_bucket_store
+        from api.tracing import instrument_drf
+
+        # Create the rate limit store up front, so a preloading server shares
+        # it between the worker processes it forks
+        get_bucket_store()
+        # Spans around serializers and rendering while tracing
+        instrument_drf()
 
         return super().ready()
+
+
+class LibraryAdminConfig(AdminConfig):
+    default_site = "api.adminsite.LibraryAdminSite"
@@ -0,0 +1,71 @@
+from .branches import atomic
+from .models import ArchivedBook, Book
+
+
+def withdrawn_books():
+    """Withdrawn books still in the book table."""
+    return Book.all_objects.filter(withdrawn_at__isnull=False)
+
+
+def get_archived_books(serial_number=None, withdrawn_after=None, withdrawn_before=None):
+    """Archived books, optionally of one serial number or withdrawal period."""
+    books = ArchivedBook.objects.all()
+    if serial_number:
+        books = books.filter(serial_number=serial_number)
+    if withdrawn_after:
+        books = books.filter(withdrawn_at__gte=withdrawn_after)
+    if withdrawn_before:
+        books = books.filter(withdrawn_at__lt=withdrawn_before)
+    return books
+
+
+def archive(books):
+    """
+    Move the given withdrawn books to the archive, in the current transaction.
+
+    The rows are locked first, so a book archived concurrently isn't copied
+    twice. Returns the number of books archived.
+    """
+    rows = list(
+        books.filter(withdrawn_at__isnull=False)
+        .select_for_update()
+        .values_list("serial_number", "title", "author", "withdrawn_at")
+    )
+    if not rows:
+        return 0
+    ArchivedBook.objects.bulk_create(
+        [
+            ArchivedBook(
+                serial_number=serial_number,
+                title=title,
+                author=author,
+                withdrawn_at=withdrawn_at,
+            )
+            for serial_number, title, author, withdrawn_at in rows
+        ]
+    )
+    withdrawn_books().filter(serial_number__in=[row[0] for row in rows]).delete()
+    return len(rows)
+
+
+def archive_withdrawn_books(batch_size=1000, progress=None):
+    """
+    Move all withdrawn books to the archive, batch_size books per transaction,
+    so the book table and its indexes only hold the catalog.
+    progress(books archived so far) is called after each batch.
+
+    Returns the number of books archived.
+    """
+    archived = 0
+    while True:
+        with atomic():
+            batch = withdrawn_books().order_by("withdrawn_at", "serial_number")
+            serial_numbers = list(
+                batch.values_list("serial_number", flat=True)[:batch_size]
+            )
+            count = archive(withdrawn_books().filter(serial_number__in=serial_numbers))
+        archived += count
+        if progress and count:
+            progress(archived)
+        if len(serial_numbers) < batch_size:
+            return archived
@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+from django.db import transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+
+from .branches import get_database
+
+# Headers that describe the batch request itself, not its operations
+EXCLUDED_HEADERS = ("CONTENT_LENGTH", "CONTENT_TYPE", "HTTP_IDEMPOTENCY_KEY")
+
+
+class BatchOperation:
+    """
+    One sub-request of a batch, dispatched in-process to the view its path
+    resolves to, with the headers and user of the batch request.
+    """
+
+    def __init__(self, method, path, body=None):
+        self.method = method
+        self.path = path
+        self.body = body
+
+    def build_request(self, request):
+        path, _, query = self.path.partition("?")
+        sub_request = HttpRequest()
+        sub_request.method = self.method
+        sub_request.path = sub_request.path_info = path
+        sub_request.META = {
+            key: value
+            for key, value in request.META.items()
+            if key not in EXCLUDED_HEADERS
+        }
+        sub_request.META.update(
+            REQUEST_METHOD=self.method, PATH_INFO=path, QUERY_STRING=query
+        )
+        sub_request.GET = QueryDict(query)
+        sub_request.COOKIES = request.COOKIES
+        if hasattr(request, "user"):
+            sub_request.user = request.user
+        body = b"" if self.body is None else json.dumps(self.body).encode()
+        sub_request._body = body
+        sub_request._read_started = True
+        sub_request.META["CONTENT_LENGTH"] = str(len(body))
+        if body:
+            sub_request.META["CONTENT_TYPE"] = "application/json"
+        return sub_request
+
+    def execute(self, request):
+        """Run the operation, returning its status code and response body."""
+        try:
+            match = resolve(self.path.partition("?")[0])
+        except Resolver404:
+            return 404, {"detail": "Not found."}
+        if not is_batchable(match.func):
+            return 400, {"detail": "This endpoint can't be used in a batch."}
+        sub_request = self.build_request(request)
+        sub_request.resolver_match = match
+        response = match.func(sub_request, *match.args, **match.kwargs)
+        if response.streaming:
+            return 400, {"detail": "This endpoint can't be used in a batch."}
+        if hasattr(response, "data"):
+            return response.status_code, response.data
+        content = response.content
+        return response.status_code, json.loads(content) if content else None
+
+
+def is_batchable(view):
+    """Async views and views with batchable = False can't run in a batch."""
+    view = getattr(view, "view_class", view)
+    return getattr(view, "batchable", True) and not asyncio.iscoroutinefunction(view)
+
+
+def run_batch(request, operations, atomic=False):
+    """
+    Execute the operations in order, in one transaction.
+
+    In atomic mode the first failed operation (status 400 or above) rolls
+    back the whole batch and the remaining operations are not executed.
+    Otherwise each operation runs in its own savepoint: a failed operation is
+    rolled back on its own and the others are committed.
+
+    Returns a list of (status code, body) results, one per operation, and
+    whether anything was committed.
+    """
+    results = []
+    database = get_database()
+    with transaction.atomic(using=database):
+        for operation in operations:
+            savepoint = transaction.savepoint(using=database)
+            status_code, body = operation.execute(request)
+            results.append((status_code, body))
+            if status_code < 400:
+                transaction.savepoint_commit(savepoint, using=database)
+                continue
+            transaction.savepoint_rollback(savepoint, using=database)
+            if atomic:
+                transaction.set_rollback(True, using=database)
+                break
+    skipped = (424, {"detail": "Not executed, an earlier operation failed."})
+    results += [skipped] * (len(operations) - len(results))
+    committed = not (atomic and any(code >= 400 for code, _ in results))
+    return results, committed
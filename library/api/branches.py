@@ -0,0 +1,150 @@
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+BRANCH_HEADER = "X-Library-Branch"
+
+_current_branch = ContextVar("library_branch", default=None)
+
+
+class CrossBranchError(Exception):
+    """An object of one branch was written through another branch."""
+
+
+def current_branch():
+    """The branch being served, DEFAULT_BRANCH outside of use_branch."""
+    return _current_branch.get() or settings.DEFAULT_BRANCH
+
+
+def get_database(branch=None):
+    """Alias of the database holding the branch (default: the current one)."""
+    branch = branch or current_branch()
+    try:
+        return settings.BRANCHES[branch]
+    except KeyError:
+        raise LookupError(f"Unknown branch '{branch}'.") from None
+
+
+def database_aliases():
+    """The default database and the databases of every branch."""
+    return sorted({DEFAULT_DB_ALIAS, *settings.BRANCHES.values()})
+
+
+@contextmanager
+def use_branch(branch):
+    """Route the queries made in the block to the branch's database."""
+    get_database(branch)
+    token = _current_branch.set(branch)
+    try:
+        yield
+    finally:
+        _current_branch.reset(token)
+
+
+def check_branch(*objects):
+    """Raise CrossBranchError unless the objects belong to the current branch."""
+    database = get_database()
+    for obj in objects:
+        if obj is not None and obj._state.db not in (None, database):
+            raise CrossBranchError(
+                f"{obj!r} belongs to database '{obj._state.db}', "
+                f"not to branch '{current_branch()}'."
+            )
+
+
+def atomic(func=None, *, savepoint=True, durable=False):
+    """
+    transaction.atomic on the current branch's database.
+
+    The database is looked up when the block is entered, not when a function
+    is decorated, so @atomic works for every branch.
+    """
+    if func is None:
+        return transaction.atomic(
+            using=get_database(), savepoint=savepoint, durable=durable
+        )
+
+    @functools.wraps(func)
+    def inner(*args, **kwargs):
+        with transaction.atomic(
+            using=get_database(), savepoint=savepoint, durable=durable
+        ):
+            return func(*args, **kwargs)
+
+    return inner
+
+
+def on_commit(func):
+    """transaction.on_commit on the current branch's database."""
+    transaction.on_commit(func, using=get_database())
+
+
+class BranchConnection:
+    """Stands for the connection to the current branch's database."""
+
+    def __getattr__(self, name):
+        return getattr(connections[get_database()], name)
+
+
+connection = BranchConnection()
+
+
+class BranchRouter:
+    """
+    Places the api app's tables on the database of each branch.
+
+    Every branch has its own alias in BRANCHES, whose database holds its
+    books, readers, loans and everything derived from them; the other apps
+    (auth, admin, sessions) stay on the default database. Queries go to the
+    current branch's database, see use_branch and BranchMiddleware.
+    Relations between objects of different branches are refused, and so is
+    saving an object loaded from one branch while serving another.
+    """
+
+    app_label = "api"
+
+    def __init__(self):
+        aliases = list(settings.BRANCHES.values())
+        if len(set(aliases)) != len(aliases):
+            # Serial numbers are only unique per database
+            raise ImproperlyConfigured(
+                "BRANCHES must map each branch to its own alias."
+            )
+        missing = set(aliases) - set(settings.DATABASES)
+        if missing:
+            raise ImproperlyConfigured(
+                f"BRANCHES uses unknown database(s): {', '.join(sorted(missing))}."
+            )
+        if settings.DEFAULT_BRANCH not in settings.BRANCHES:
+            raise ImproperlyConfigured(
+                f"DEFAULT_BRANCH '{settings.DEFAULT_BRANCH}' is not in BRANCHES."
+            )
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            # Follow relations within the branch the instance came from
+            return instance._state.db
+        return get_database()
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+        check_branch(hints.get("instance"))
+        return get_database()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if obj1._state.db and obj2._state.db:
+            return obj1._state.db == obj2._state.db
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if app_label == self.app_label:
+            return db in settings.BRANCHES.values()
+        return db == "default"
@@ -0,0 +1,118 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, OuterRef, Subquery
+from django.utils import timezone
+
+from .branches import atomic
+from .models import Book, BookChange, Checkpoint
+
+HORIZON_CHECKPOINT = "book_changes:horizon"
+
+
+class CursorExpired(Exception):
+    """The cursor points before changes removed by the retention policy."""
+
+
+def record_change(serial_number, op):
+    """
+    Append a change of a book to the feed, in the current transaction.
+    """
+    BookChange.objects.create(serial_number=serial_number, op=op)
+
+
+def record_changes(serial_numbers, op):
+    """
+    Append the same change of many books to the feed, for bulk writes.
+    """
+    now = timezone.now()
+    BookChange.objects.bulk_create(
+        [BookChange(serial_number=sn, op=op, changed_at=now) for sn in serial_numbers]
+    )
+
+
+def get_horizon():
+    """
+    Return the oldest cursor that is still safe to resume from.
+    """
+    checkpoint = Checkpoint.objects.filter(name=HORIZON_CHECKPOINT).first()
+    return checkpoint.position.get("cursor", 0) if checkpoint else 0
+
+
+def get_changes(since, limit):
+    """
+    Retrieve up to limit changes after the cursor, oldest first.
+
+    Changes younger than CHANGE_FEED["SETTLE_SECONDS"] are held back, so a
+    transaction that took its id earlier but committed later can't slip
+    behind a cursor a client already moved past.
+
+    Returns the changes and a dict of the current state of the books they
+    refer to (deleted books are missing from it).
+    Raises CursorExpired if changes after a non-zero cursor were purged;
+    cursor 0 always replays what is retained, which is a full sync.
+    """
+    if 0 < since < get_horizon():
+        raise CursorExpired()
+    settled = timezone.now() - timedelta(seconds=settings.CHANGE_FEED["SETTLE_SECONDS"])
+    changes = []
+    for change in BookChange.objects.filter(pk__gt=since).order_by("pk")[:limit]:
+        if change.changed_at > settled:
+            # Stop at the first unsettled change, later ones must wait for it
+            break
+        changes.append(change)
+    books = Book.objects.select_related("borrower").in_bulk(
+        {change.serial_number for change in changes}
+    )
+    return changes, books
+
+
+def compact(retention_days, batch_size=10000):
+    """
+    Shrink the feed without losing the latest state of any book.
+
+    Removes every change superseded by a later change of the same book, then
+    drops delete markers older than the retention period and moves the
+    horizon past them: clients with older cursors must resync in full.
+
+    Returns the number of removed changes.
+    """
+    removed = 0
+    latest = (
+        BookChange.objects.filter(serial_number=OuterRef("serial_number"))
+        .order_by("-pk")
+        .values("pk")[:1]
+    )
+    last_id = BookChange.objects.aggregate(last=Max("pk"))["last"] or 0
+    for start in range(0, last_id, batch_size):
+        superseded = BookChange.objects.filter(
+            pk__gt=start, pk__lte=start + batch_size
+        ).exclude(pk=Subquery(latest))
+        removed += superseded.delete()[0]
+
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    expired = BookChange.objects.filter(op=BookChange.DELETE, changed_at__lt=cutoff)
+    horizon = expired.aggregate(last=Max("pk"))["last"]
+    if horizon:
+        with atomic():
+            Checkpoint.objects.update_or_create(
+                name=HORIZON_CHECKPOINT,
+                defaults={"position": {"cursor": max(horizon, get_horizon())}},
+            )
+            removed += expired.filter(pk__lte=horizon).delete()[0]
+    return removed
+
+
+def restart():
+    """
+    Discard the feed after the books were replaced wholesale, e.g. by a restore.
+
+    Every existing non-zero cursor expires, so clients resync in full from the
+    changes recorded afterwards.
+    """
+    last_id = BookChange.objects.aggregate(last=Max("pk"))["last"] or 0
+    with atomic():
+        BookChange.objects.all().delete()
+        Checkpoint.objects.update_or_create(
+            name=HORIZON_CHECKPOINT, defaults={"position": {"cursor": last_id + 1}}
+        )
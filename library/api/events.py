@@ -0,0 +1,222 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, connections
+from django.utils.module_loading import import_string
+
+from .branches import current_branch
+
+logger = logging.getLogger(__name__)
+
+
+def availability_event(book, deleted=False):
+    """Build the event pushed to subscribers when a book changes."""
+    if deleted:
+        book_status = "deleted"
+    else:
+        book_status = "borrowed" if book.borrower_id else "available"
+    return {"serial_number": book.serial_number, "status": book_status}
+
+
+class Subscription:
+    """
+    A subscriber's bounded event queue, owned by the event loop serving it.
+
+    Events that don't fit in the queue are dropped and the subscription is
+    flagged, so the stream can tell the client to refetch. A subscription
+    without a branch receives the events of every branch.
+    """
+
+    def __init__(self, serial_numbers, loop, max_queue, branch=None):
+        self.serial_numbers = frozenset(serial_numbers)
+        self.branch = branch
+        self.loop = loop
+        self.queue = asyncio.Queue(max_queue)
+        self.overflowed = False
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class InProcessBroker:
+    """
+    Fans book events out to the subscribers of this process.
+
+    Subscribers are indexed by serial number, so publishing costs a dict
+    lookup plus one callback per interested subscriber, however many idle
+    subscribers there are. publish() is thread-safe: sync views publish from
+    worker threads and events are handed to each subscriber's event loop.
+    Only subscribers in the publishing process are reached; use
+    PostgresBroker when several processes serve streams.
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._by_serial = defaultdict(set)
+        self._everything = set()
+
+    def subscribe(self, serial_numbers=(), branch=None):
+        """
+        Subscribe to the given books, or to all books if none are given, of
+        the branch. Must be called from the event loop that will consume the
+        queue.
+        """
+        subscription = Subscription(
+            serial_numbers, asyncio.get_running_loop(), self.max_queue, branch
+        )
+        with self._lock:
+            if subscription.serial_numbers:
+                for serial_number in subscription.serial_numbers:
+                    self._by_serial[serial_number].add(subscription)
+            else:
+                self._everything.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._everything.discard(subscription)
+            for serial_number in subscription.serial_numbers:
+                subscribers = self._by_serial.get(serial_number)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_serial[serial_number]
+
+    def publish(self, event):
+        """Publish an event of a book of the current branch."""
+        self.dispatch(event, current_branch())
+
+    def dispatch(self, event, branch=None):
+        """Deliver an event to the local subscribers interested in it."""
+        with self._lock:
+            targets = list(self._everything)
+            targets.extend(self._by_serial.get(event["serial_number"], ()))
+        for subscription in targets:
+            if subscription.branch not in (None, branch):
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's event loop is gone
+                self.unsubscribe(subscription)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._everything) + len(
+                set().union(*self._by_serial.values()) if self._by_serial else ()
+            )
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    Broker that fans events out across processes with LISTEN/NOTIFY.
+
+    publish() sends a NOTIFY on the default database; each process runs one
+    listener thread on a dedicated connection that dispatches notifications
+    to its local subscribers.
+    """
+
+    def __init__(self, channel="book_events", max_queue=100, alias="default"):
+        super().__init__(max_queue=max_queue)
+        self.channel = channel
+        self.alias = alias
+        self._listener = None
+
+    def publish(self, event):
+        message = {"branch": current_branch(), "event": event}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_notify(%s, %s)", [self.channel, json.dumps(message)]
+            )
+
+    def subscribe(self, serial_numbers=(), branch=None):
+        self._ensure_listener()
+        return super().subscribe(serial_numbers, branch)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(
+                    target=self._listen, name="book-event-listener", daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        wrapper = connections[self.alias]
+        conn = wrapper.get_new_connection(wrapper.get_connection_params())
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+            while True:
+                for payload in self._wait_for_notifies(conn):
+                    try:
+                        message = json.loads(payload)
+                        self.dispatch(message["event"], message["branch"])
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning("Ignoring malformed book event %r", payload)
+        except Exception:
+            logger.exception("Book event listener stopped")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _wait_for_notifies(conn, timeout=5.0):
+        if hasattr(conn, "poll"):
+            # psycopg2
+            if select.select([conn], [], [], timeout)[0]:
+                conn.poll()
+                while conn.notifies:
+                    yield conn.notifies.pop(0).payload
+        else:
+            # psycopg 3
+            for notify in conn.notifies(timeout=timeout):
+                yield notify.payload
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the broker configured in EVENT_BROKER, creating it once."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            config = settings.EVENT_BROKER
+            _broker = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+        return _broker
+
+
+async def stream_events(subscription, heartbeat):
+    """
+    Render a subscription as a Server-Sent Events stream.
+
+    Sends a comment every heartbeat seconds so proxies keep idle connections
+    open, and unsubscribes when the client goes away.
+    """
+    broker = get_broker()
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if subscription.overflowed:
+                subscription.overflowed = False
+                yield "event: overflow\ndata: {}\n\n"
+            yield f"event: availability\ndata: {json.dumps(event)}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,57 @@
+import csv
+import os
+
+from .models import Book
+
+# The first three columns are the ones import_books reads
+COLUMNS = [
+    "serial_number",
+    "title",
+    "author",
+    "borrower_serial_number",
+    "borrow_date",
+    "due_date",
+]
+
+
+def export_books(path, chunk_size=10000, progress=None):
+    """
+    Write all books, with their current loans, to a CSV file.
+
+    Books are read in serial number order in keyset-paginated chunks, so
+    memory stays bounded. The file is written next to path and renamed into
+    place once complete, so a reader never sees a partial export.
+    progress(rows written so far, total rows) is called after each chunk.
+
+    Returns the number of books written.
+    """
+    books = Book.objects.order_by("serial_number").values_list(
+        "serial_number",
+        "title",
+        "author",
+        "borrower__serial_number",
+        "borrow_date",
+        "due_date",
+    )
+    total = Book.objects.count()
+    written = 0
+    partial_path = f"{path}.partial"
+    with open(partial_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        last = None
+        while True:
+            page = books if last is None else books.filter(serial_number__gt=last)
+            chunk = list(page[:chunk_size])
+            if not chunk:
+                break
+            writer.writerows(
+                [*row[:4], *(date.isoformat() if date else "" for date in row[4:])]
+                for row in chunk
+            )
+            written += len(chunk)
+            last = chunk[-1][0]
+            if progress:
+                progress(written, max(total, written))
+    os.replace(partial_path, path)
+    return written
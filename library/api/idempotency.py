@@ -0,0 +1,173 @@
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .branches import atomic
+from .models import IdempotencyKey
+
+IDEMPOTENT_METHODS = ("POST", "PATCH")
+REPLAYED_HEADER = "Idempotent-Replayed"
+POLL_INTERVAL = 0.05
+MAX_CLAIM_ATTEMPTS = 3
+
+
+def _fingerprint(request):
+    """Hash of the request payload, so a key can't be reused for another body"""
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _lease_expired(record):
+    """Whether the in-flight request of the record has outlived its lease"""
+    lease = timedelta(seconds=settings.IDEMPOTENCY_LEASE)
+    return record.status_code is None and record.claimed_at + lease <= timezone.now()
+
+
+def _claim(key, method, path, fingerprint):
+    """
+    Insert the in-flight record for the key.
+
+    Returns (record, True) if this request claimed the key, or the existing
+    record and False if another request got there first. An in-flight
+    record for the same body whose lease expired belonged to a request that
+    died before answering, this request takes it over.
+    """
+    now = timezone.now()
+    lookup = {"key": key, "method": method, "path": path}
+    expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    IdempotencyKey.objects.filter(expires_at__lte=now, **lookup).delete()
+    try:
+        with atomic():
+            record = IdempotencyKey.objects.create(
+                fingerprint=fingerprint, claimed_at=now, expires_at=expires_at, **lookup
+            )
+        return record, True
+    except IntegrityError:
+        record = IdempotencyKey.objects.filter(**lookup).first()
+    if record and record.fingerprint == fingerprint and _lease_expired(record):
+        # Conditional on the lease we saw, so only one retry takes over
+        taken = IdempotencyKey.objects.filter(
+            pk=record.pk, status_code__isnull=True, claimed_at=record.claimed_at
+        ).update(claimed_at=now, expires_at=expires_at)
+        if taken:
+            record.claimed_at, record.expires_at = now, expires_at
+            return record, True
+    return record, False
+
+
+def _wait_for_completion(record):
+    """
+    Poll the in-flight record until its response is stored or its lease
+    expires.
+
+    Returns the record, or None if it was released because the original
+    request failed.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while (
+        record.status_code is None
+        and not _lease_expired(record)
+        and time.monotonic() < deadline
+    ):
+        time.sleep(POLL_INTERVAL)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+        if record is None:
+            return None
+    return record
+
+
+def _replay(record):
+    return Response(
+        record.response_body,
+        status=record.status_code,
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+def idempotent(view_method):
+    """
+    Make a POST/PATCH view method honour the Idempotency-Key header.
+
+    The first response for a key is stored and replayed to retries without
+    running the view again. A retry arriving while the first request is still
+    in flight waits for its response instead of executing twice, unless the
+    first request held the key for longer than IDEMPOTENCY_LEASE seconds:
+    its worker is presumed dead and the retry runs the view. Server errors
+    are not stored, so the request can be retried.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key or request.method not in IDEMPOTENT_METHODS:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            return Response(
+                {"detail": "Idempotency-Key is too long."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = _fingerprint(request)
+        for _ in range(MAX_CLAIM_ATTEMPTS):
+            record, claimed = _claim(key, request.method, request.path, fingerprint)
+            if claimed:
+                break
+            if record is None:
+                # Released between our insert and lookup, try to claim again
+                continue
+            if record.fingerprint != fingerprint:
+                return Response(
+                    {"detail": "Idempotency-Key was already used with another body."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            record = _wait_for_completion(record)
+            if record is None or _lease_expired(record):
+                continue
+            if record.status_code is not None:
+                return _replay(record)
+            break
+        if not claimed:
+            return Response(
+                {"detail": "A request with this Idempotency-Key is in progress."},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500:
+            record.delete()
+        else:
+            record.status_code = response.status_code
+            record.response_body = getattr(response, "data", None)
+            record.save(update_fields=["status_code", "response_body"])
+        return response
+
+    return wrapper
+
+
+def purge_expired_keys(batch_size=1000):
+    """
+    Delete expired idempotency records in batches.
+    Returns the number of deleted records.
+    """
+    purged = 0
+    while True:
+        expired = IdempotencyKey.objects.filter(
+            expires_at__lte=timezone.now()
+        ).values_list("pk", flat=True)[:batch_size]
+        deleted, _ = IdempotencyKey.objects.filter(pk__in=list(expired)).delete()
+        purged += deleted
+        if deleted < batch_size:
+            return purged
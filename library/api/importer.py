@@ -0,0 +1,174 @@
+import csv
+import os
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+
+from .archive import archive
+from .branches import atomic, connection, on_commit
+from .changefeed import record_changes
+from .events import get_broker
+from .models import Book, BookChange, Checkpoint
+from .pgcopy import copy_rows
+from .stats import adjust_counters
+from .validators import six_number_digits_validator
+
+COLUMNS = ["serial_number", "title", "author"]
+STAGING_TABLE = "import_books_staging"
+
+
+class BookImportError(Exception):
+    """The file can't be imported, e.g. it lacks a required column."""
+
+
+def _validate(row):
+    """Return the cleaned (serial_number, title, author) or raise ValidationError."""
+    values = [(row.get(column) or "").strip() for column in COLUMNS]
+    serial_number, title, author = values
+    six_number_digits_validator(serial_number)
+    for column, value in zip(COLUMNS[1:], values[1:]):
+        max_length = Book._meta.get_field(column).max_length
+        if not value:
+            raise ValidationError(f"{column} is required.")
+        if len(value) > max_length:
+            raise ValidationError(f"{column} is longer than {max_length} characters.")
+    return serial_number, title, author
+
+
+def _merge(rows):
+    """Upsert rows through a temporary staging table loaded with COPY."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} "
+            "(serial_number varchar(6), title varchar(100), author varchar(100)) "
+            "ON COMMIT DELETE ROWS"
+        )
+        copy_rows(STAGING_TABLE, COLUMNS, rows)
+        cursor.execute(
+            f"INSERT INTO {Book._meta.db_table} (serial_number, title, author) "
+            f"SELECT serial_number, title, author FROM {STAGING_TABLE} "
+            "ON CONFLICT (serial_number) DO UPDATE "
+            "SET title = EXCLUDED.title, author = EXCLUDED.author"
+        )
+
+
+def _upsert(rows):
+    """
+    Create or update the books of one batch in the current transaction.
+
+    Returns the serial numbers of the created and of the updated books;
+    books whose title and author didn't change aren't written.
+    """
+    rows = list({row[0]: row for row in rows}.values())
+    # Withdrawn books free their serial number for the imported ones
+    archive(Book.all_objects.filter(serial_number__in=[row[0] for row in rows]))
+    existing = {
+        serial_number: (title, author)
+        for serial_number, title, author in Book.objects.filter(
+            serial_number__in=[row[0] for row in rows]
+        ).values_list(*COLUMNS)
+    }
+    created = [row for row in rows if row[0] not in existing]
+    updated = [
+        row for row in rows if row[0] in existing and existing[row[0]] != row[1:]
+    ]
+    if created or updated:
+        if connection.vendor == "postgresql":
+            _merge(created + updated)
+        else:
+            Book.objects.bulk_create(
+                [Book(**dict(zip(COLUMNS, row))) for row in created + updated],
+                update_conflicts=True,
+                unique_fields=["serial_number"],
+                update_fields=["title", "author"],
+            )
+    return [row[0] for row in created], [row[0] for row in updated]
+
+
+def _publish_created(serial_numbers):
+    broker = get_broker()
+    for serial_number in serial_numbers:
+        broker.publish({"serial_number": serial_number, "status": "available"})
+
+
+def import_books(
+    path, batch_size=1000, rejects_path=None, restart=False, progress=None
+):
+    """
+    Create or update books from a CSV file with serial_number, title and
+    author columns.
+
+    The file is streamed and upserted in batches of batch_size rows, each in
+    its own transaction that also records how many rows were consumed, so an
+    interrupted import resumes after the last committed batch. Invalid rows
+    are appended to rejects_path (default: <path>.rejected.csv) with an
+    error column. The circulation counters, the change feed and availability
+    events are updated like for books created one at a time. progress(rows
+    consumed so far) is called after each batch.
+
+    Raises BookImportError if the file lacks a required column.
+    Returns counts of created, updated, unchanged and rejected rows.
+    """
+    path = os.path.abspath(path)
+    rejects_path = rejects_path or f"{path}.rejected.csv"
+    checkpoint_name = f"import_books:{path}"
+    stat = os.stat(path)
+    source = {"size": stat.st_size, "mtime": stat.st_mtime}
+    if restart:
+        Checkpoint.objects.filter(name=checkpoint_name).delete()
+    checkpoint = Checkpoint.objects.filter(name=checkpoint_name).first()
+    position = checkpoint.position if checkpoint else {}
+    if position.get("source") != source:
+        # A new or modified file is imported from the start
+        position = {"source": source, "rows": 0}
+    counts = {"created": 0, "updated": 0, "unchanged": 0, "rejected": 0}
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        missing = set(COLUMNS) - set(reader.fieldnames or ())
+        if missing:
+            raise BookImportError(f"Missing column(s): {', '.join(sorted(missing))}.")
+        consumed = position["rows"]
+        rows = islice(reader, consumed, None)
+        while batch := list(islice(rows, batch_size)):
+            valid, rejected = [], []
+            for row in batch:
+                try:
+                    valid.append(_validate(row))
+                except ValidationError as e:
+                    rejected.append({**row, "error": " ".join(e.messages)})
+
+            consumed += len(batch)
+            with atomic():
+                created, updated = _upsert(valid)
+                record_changes(created, BookChange.CREATE)
+                record_changes(updated, BookChange.UPDATE)
+                adjust_counters(total=len(created))
+                Checkpoint.objects.update_or_create(
+                    name=checkpoint_name,
+                    defaults={"position": {"source": source, "rows": consumed}},
+                )
+                on_commit(lambda created=created: _publish_created(created))
+
+            if rejected:
+                _write_rejects(rejects_path, reader.fieldnames, rejected)
+            counts["created"] += len(created)
+            counts["updated"] += len(updated)
+            counts["unchanged"] += len(valid) - len(created) - len(updated)
+            counts["rejected"] += len(rejected)
+            if progress:
+                progress(consumed)
+
+    Checkpoint.objects.filter(name=checkpoint_name).delete()
+    return counts
+
+
+def _write_rejects(path, fieldnames, rows):
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(
+            f, fieldnames=[*fieldnames, "error"], extrasaction="ignore"
+        )
+        if new_file:
+            writer.writeheader()
+        writer.writerows(rows)
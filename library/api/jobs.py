@@ -0,0 +1,315 @@
+import contextvars
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .archive import archive_withdrawn_books
+from .branches import atomic, connection
+from .exporter import export_books
+from .importer import import_books
+from .models import Job
+from .notifications import send_overdue_notices
+from .snapshot import snapshot
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between two progress writes of a job
+PROGRESS_INTERVAL = 1.0
+# Number of queued jobs tried per claim when rows can't be locked
+CLAIM_CANDIDATES = 10
+
+registry = {}
+
+
+def job(name, max_attempts=None):
+    """
+    Register the decorated function as the job called name.
+
+    The function is called with a JobContext followed by the job's params as
+    keyword arguments, and returns a JSON-serializable result. It runs
+    outside a transaction and may be retried, after a failure or when its
+    worker is lost, so it should be safe to run again.
+    """
+
+    def decorator(func):
+        registry[name] = (func, max_attempts)
+        return func
+
+    return decorator
+
+
+def enqueue(name, max_attempts=None, **params):
+    """
+    Queue the job called name, run_worker runs it once the transaction
+    commits. Raises LookupError for a job that isn't registered.
+    """
+    if name not in registry:
+        raise LookupError(f"Unknown job '{name}'.")
+    max_attempts = max_attempts or registry[name][1] or settings.JOBS["MAX_ATTEMPTS"]
+    return Job.objects.create(name=name, params=params, max_attempts=max_attempts)
+
+
+class LeaseLost(Exception):
+    """The job was taken back from this worker, see requeue_stale."""
+
+
+class JobContext:
+    """Handle of the running job passed to job functions."""
+
+    def __init__(self, job, worker_id):
+        self.job = job
+        self.worker_id = worker_id
+        self._reported_at = 0.0
+        self._reporter = None
+
+    def progress(self, done, total=None):
+        """
+        Report how much of the job is done, which also renews the worker's
+        lease on it. Writes are throttled to one per PROGRESS_INTERVAL.
+
+        Raises LeaseLost if the job was taken back from this worker.
+        """
+        self.job.progress = done
+        if total is not None:
+            self.job.total = total
+        now = time.monotonic()
+        if now - self._reported_at < PROGRESS_INTERVAL and done != self.job.total:
+            return
+        self._reported_at = now
+        updated = _owned(self.job, self.worker_id).update(
+            progress=self.job.progress, total=self.job.total, locked_at=timezone.now()
+        )
+        if not updated:
+            raise LeaseLost(f"Job {self.job.pk} is no longer held by {self.worker_id}.")
+
+    def outside_transaction(self, func):
+        """
+        Wrap func (e.g. progress) to run on a thread of its own, whose
+        connection commits each write at once.
+
+        For jobs reporting progress inside their own transaction: there
+        requeue_stale wouldn't see a lease renewal until the transaction
+        commits, and a read-only one can't write at all. Exceptions are
+        raised in the caller.
+        """
+
+        def wrapper(*args, **kwargs):
+            if self._reporter is None:
+                self._reporter = ThreadPoolExecutor(
+                    1, thread_name_prefix="job-progress"
+                )
+            # Run in the caller's context, so queries go to the job's branch
+            context = contextvars.copy_context()
+            return self._reporter.submit(context.run, func, *args, **kwargs).result()
+
+        return wrapper
+
+    def close(self):
+        """Close the connections opened by outside_transaction()."""
+        if self._reporter is not None:
+            self._reporter.submit(connections.close_all).result()
+            self._reporter.shutdown()
+            self._reporter = None
+
+
+def _owned(job, worker_id):
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=worker_id)
+
+
+def claim(worker_id):
+    """
+    Take the oldest due queued job for worker_id, or return None.
+
+    Where the database supports it the candidate row is locked with
+    SELECT ... FOR UPDATE SKIP LOCKED, so concurrent workers skip each
+    other's rows instead of waiting on them. Either way the job is taken
+    with an UPDATE conditional on it still being queued, so on databases
+    without row locks (SQLite) a worker that loses the race just moves on
+    to the next candidate.
+    """
+    now = timezone.now()
+    due = (
+        Job.objects.filter(status=Job.QUEUED, run_after__lte=now)
+        .order_by("run_after", "pk")
+        .values_list("pk", flat=True)
+    )
+    with atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = list(due.select_for_update(skip_locked=True)[:1])
+        else:
+            candidates = list(due[:CLAIM_CANDIDATES])
+        for pk in candidates:
+            taken = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+                status=Job.RUNNING,
+                locked_by=worker_id,
+                locked_at=now,
+                started_at=now,
+                attempts=F("attempts") + 1,
+            )
+            if taken:
+                return Job.objects.get(pk=pk)
+    return None
+
+
+def requeue_stale(lease_seconds=None):
+    """
+    Take back running jobs whose worker hasn't reported progress for
+    lease_seconds (default: JOBS["LEASE_SECONDS"]), presumably because it
+    died. They are queued again, or failed if out of attempts.
+
+    Returns the number of jobs taken back.
+    """
+    lease_seconds = lease_seconds or settings.JOBS["LEASE_SECONDS"]
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=now - timedelta(seconds=lease_seconds)
+    )
+    error = "The worker running the job was lost."
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.FAILED, error=error, locked_by="", locked_at=None, finished_at=now
+    )
+    requeued = stale.update(
+        status=Job.QUEUED, error=error, locked_by="", locked_at=None, run_after=now
+    )
+    return failed + requeued
+
+
+def run_job(job, worker_id):
+    """
+    Run a claimed job and record its result.
+
+    A failed job is queued again after JOBS["RETRY_DELAY"] seconds, doubled
+    for each further attempt, until it has been tried max_attempts times.
+    Returns the job's final status for this attempt.
+    """
+    func, _ = registry.get(job.name, (None, None))
+    context = JobContext(job, worker_id)
+    try:
+        if func is None:
+            raise LookupError(f"Unknown job '{job.name}'.")
+        result = func(context, **job.params)
+    except LeaseLost:
+        logger.warning("Job %s was taken back from %s", job.pk, worker_id)
+        return None
+    except Exception:
+        logger.exception("Job %s (%s) failed", job.pk, job.name)
+        return _fail(job, worker_id, traceback.format_exc())
+    finally:
+        context.close()
+
+    _owned(job, worker_id).update(
+        status=Job.SUCCEEDED,
+        result=result,
+        error="",
+        locked_by="",
+        locked_at=None,
+        finished_at=timezone.now(),
+    )
+    return Job.SUCCEEDED
+
+
+def _fail(job, worker_id, error):
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        delay = settings.JOBS["RETRY_DELAY"] * 2 ** (job.attempts - 1)
+        _owned(job, worker_id).update(
+            status=Job.QUEUED,
+            error=error,
+            locked_by="",
+            locked_at=None,
+            run_after=now + timedelta(seconds=delay),
+        )
+        return Job.QUEUED
+    _owned(job, worker_id).update(
+        status=Job.FAILED, error=error, locked_by="", locked_at=None, finished_at=now
+    )
+    return Job.FAILED
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_worker(
+    worker_id=None, poll_interval=None, max_jobs=None, once=False, stop=None
+):
+    """
+    Claim and run jobs until stop (a threading.Event) is set.
+
+    An idle worker takes back stale jobs and polls for new ones every
+    poll_interval seconds (default: JOBS["POLL_INTERVAL"]). Stops after
+    max_jobs jobs, or once the queue is empty if once is set.
+
+    Returns the number of jobs run.
+    """
+    worker_id = worker_id or default_worker_id()
+    poll_interval = (
+        settings.JOBS["POLL_INTERVAL"] if poll_interval is None else poll_interval
+    )
+    stop = stop or threading.Event()
+    ran = 0
+    while not stop.is_set() and (max_jobs is None or ran < max_jobs):
+        close_old_connections()
+        job = claim(worker_id)
+        if job is None:
+            if once:
+                break
+            requeue_stale()
+            stop.wait(poll_interval)
+            continue
+        logger.info("Running job %s (%s)", job.pk, job.name)
+        status = run_job(job, worker_id)
+        logger.info("Job %s (%s) %s", job.pk, job.name, status or "taken back")
+        ran += 1
+    close_old_connections()
+    return ran
+
+
+# Jobs
+
+
+@job("export_books")
+def export_books_job(context):
+    os.makedirs(settings.JOBS["EXPORT_DIR"], exist_ok=True)
+    path = os.path.join(settings.JOBS["EXPORT_DIR"], f"books-{context.job.pk}.csv")
+    rows = export_books(path, progress=context.progress)
+    return {"path": path, "rows": rows}
+
+
+@job("import_books")
+def import_books_job(context, path, batch_size=1000):
+    # Retries resume after the last committed batch
+    return import_books(path, batch_size=batch_size, progress=context.progress)
+
+
+@job("snapshot")
+def snapshot_job(context, path):
+    # snapshot() reports progress from inside its read-only transaction
+    progress = context.outside_transaction(context.progress)
+    counts = snapshot(path, progress=lambda kind, rows: progress(rows))
+    return {"path": path, **counts}
+
+
+@job("send_overdue_notices")
+def send_overdue_notices_job(context, date=None):
+    sent = send_overdue_notices(
+        notice_date=parse_date(date) if date else None, progress=context.progress
+    )
+    return {"sent": sent}
+
+
+@job("archive_books")
+def archive_books_job(context, batch_size=1000):
+    archived = archive_withdrawn_books(batch_size=batch_size, progress=context.progress)
+    return {"archived": archived}
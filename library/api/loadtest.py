@@ -0,0 +1,403 @@
+import asyncio
+import bisect
+import itertools
+import json
+import math
+import random
+import ssl
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+from .branches import BRANCH_HEADER
+
+OPERATIONS = ("list", "retrieve", "status", "create", "delete")
+DEFAULT_MIX = {"list": 5, "retrieve": 60, "status": 30, "create": 3, "delete": 2}
+
+# Books created during a run get serial numbers from here up
+CREATED_SERIALS_START = 900000
+# Times a throttled setup or cleanup request is retried after its Retry-After
+MAX_THROTTLED_RETRIES = 20
+
+
+def parse_mix(value):
+    """
+    Parse "retrieve=60,status=30,..." into {operation: weight}.
+
+    Raises ValueError for unknown operations, negative weights or an all
+    zero mix.
+    """
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(
+                f"Unknown operation '{name}', expected one of {', '.join(OPERATIONS)}."
+            )
+        mix[name] = float(weight)
+        if mix[name] < 0:
+            raise ValueError(f"Weight of '{name}' must not be negative.")
+    if not any(mix.values()):
+        raise ValueError("The mix needs at least one positive weight.")
+    return mix
+
+
+class ZipfSampler:
+    """
+    Draws ranks 0..n-1 with probability proportional to 1 / (rank + 1) ** s.
+
+    s around 1 gives the long tail of real catalogs: a few hot books take
+    most requests. s=0 is uniform.
+    """
+
+    def __init__(self, n, s, rng):
+        self.rng = rng
+        self.cumulative = list(
+            itertools.accumulate(1 / (rank + 1) ** s for rank in range(n))
+        )
+
+    def sample(self):
+        point = self.rng.random() * self.cumulative[-1]
+        return bisect.bisect_right(self.cumulative, point)
+
+
+class RequestFailed(Exception):
+    """The connection failed or the server sent a malformed response."""
+
+
+class SetupFailed(Exception):
+    """The server refused a request creating or cleaning up the test data."""
+
+
+class HTTPConnection:
+    """
+    One keep-alive HTTP/1.1 connection on asyncio streams, reopened when the
+    server closes it.
+    """
+
+    def __init__(self, url, headers=None, timeout=30):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+        self.headers = {"Host": parts.netloc, **(headers or {})}
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        """
+        Send a request with an optional JSON body; returns (status, headers,
+        body), with the header names in lower case.
+        """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl
+            )
+        payload = b"" if body is None else json.dumps(body).encode()
+        headers = {**self.headers, "Content-Length": str(len(payload))}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        head = f"{method} {path} HTTP/1.1\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in headers.items()
+        )
+        try:
+            self.writer.write(head.encode("latin-1") + b"\r\n" + payload)
+            response = await asyncio.wait_for(self._read(), self.timeout)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+            self.close()
+            raise RequestFailed(str(e) or type(e).__name__) from e
+        return response
+
+    async def _read(self):
+        status_line = await self.reader.readline()
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError):
+            self.close()
+            raise RequestFailed(f"Malformed status line {status_line!r}.")
+        headers = {}
+        while (line := await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            data = bytearray()
+            while size := int((await self.reader.readline()).split(b";")[0], 16):
+                data += await self.reader.readexactly(size)
+                await self.reader.readexactly(2)
+            await self.reader.readline()
+        else:
+            data = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, headers, bytes(data)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Recorder:
+    """Latencies and outcomes of the requests of one run, by operation."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, operation, status, latency):
+        """status is the HTTP status, or None for a failed request."""
+        self.latencies[operation].append(latency)
+        self.statuses[operation][status] += 1
+
+    def report(self, duration):
+        """Throughput, latencies and outcomes, overall and by operation."""
+        operations = [
+            operation for operation in OPERATIONS if self.latencies[operation]
+        ]
+        return {
+            **summarize(
+                list(itertools.chain(*self.latencies.values())),
+                sum(self.statuses.values(), Counter()),
+                duration,
+            ),
+            "endpoints": {
+                operation: summarize(
+                    self.latencies[operation], self.statuses[operation], duration
+                )
+                for operation in operations
+            },
+        }
+
+
+def summarize(latencies, statuses, duration):
+    """
+    Summary of a set of requests. Errors are failed requests and server
+    errors, shed requests were refused by rate limiting or load shedding
+    (429, 503), conflicts are the other 4xx: loan limits, books deleted
+    meanwhile, concurrent idempotent retries.
+    """
+    count = len(latencies)
+    outcomes = Counter()
+    for status, n in statuses.items():
+        if status is None or (status >= 500 and status != 503):
+            outcomes["errors"] += n
+        elif status in (429, 503):
+            outcomes["shed"] += n
+        elif status >= 400:
+            outcomes["conflicts"] += n
+    latencies = sorted(latencies)
+
+    def milliseconds(seconds):
+        return round(seconds * 1000, 3)
+
+    def percentile(p):
+        return milliseconds(latencies[max(0, math.ceil(p / 100 * count) - 1)])
+
+    return {
+        "requests": count,
+        "throughput": round(count / duration, 1),
+        "latency_ms": (
+            {
+                "mean": milliseconds(sum(latencies) / count),
+                "p50": percentile(50),
+                "p90": percentile(90),
+                "p99": percentile(99),
+                "max": milliseconds(latencies[-1]),
+            }
+            if count
+            else None
+        ),
+        "status": {
+            str(status or "error"): n
+            for status, n in sorted(statuses.items(), key=lambda item: item[0] or 0)
+        },
+        "errors": outcomes["errors"],
+        "conflicts": outcomes["conflicts"],
+        "shed": outcomes["shed"],
+        "error_rate": round(outcomes["errors"] / count, 4) if count else 0.0,
+        "conflict_rate": round(outcomes["conflicts"] / count, 4) if count else 0.0,
+        "shed_rate": round(outcomes["shed"] / count, 4) if count else 0.0,
+    }
+
+
+class LoadTest:
+    """
+    Drives a running instance with a mix of book requests from concurrent
+    keep-alive connections, each sending its next request as soon as the
+    previous one is answered.
+
+    Books first_serial..first_serial + books - 1 must exist (see setup())
+    and are picked with Zipf-distributed popularity; status changes borrow
+    a book for a random reader of readers_first..readers_first + readers - 1
+    or return it. Creates add books from CREATED_SERIALS_START up, deletes
+    withdraw them again; the ones left are deleted after the run.
+    """
+
+    def __init__(
+        self,
+        url,
+        mix=None,
+        books=1000,
+        readers=100,
+        zipf=1.1,
+        concurrency=16,
+        first_serial=100000,
+        branch=None,
+        seed=None,
+    ):
+        self.url = url.rstrip("/")
+        self.mix = mix or DEFAULT_MIX
+        self.books = books
+        self.readers = readers
+        self.zipf = zipf
+        self.concurrency = concurrency
+        self.first_serial = first_serial
+        self.headers = {BRANCH_HEADER: branch} if branch else {}
+        self.rng = random.Random(seed)
+        # Spread the hot books over the serial numbers
+        self.ranked_books = [str(first_serial + i) for i in range(books)]
+        self.rng.shuffle(self.ranked_books)
+        self.popularity = ZipfSampler(books, zipf, self.rng)
+        self.operations = list(self.mix)
+        self.weights = [self.mix[operation] for operation in self.operations]
+        self.next_created = itertools.count(CREATED_SERIALS_START)
+        self.created = []
+
+    def connection(self):
+        return HTTPConnection(self.url, self.headers)
+
+    def reader(self):
+        return str(self.first_serial + self.rng.randrange(self.readers))
+
+    def book(self):
+        return self.ranked_books[self.popularity.sample()]
+
+    def next_request(self):
+        """(operation, method, path, body) of a request drawn from the mix."""
+        operation = self.rng.choices(self.operations, self.weights)[0]
+        if operation == "delete" and not self.created:
+            operation = "create"
+        if operation == "list":
+            return operation, "GET", "/api/books/", None
+        if operation == "retrieve":
+            return operation, "GET", f"/api/books/{self.book()}/", None
+        if operation == "status":
+            borrower = self.reader() if self.rng.random() < 0.5 else None
+            return (
+                operation,
+                "PATCH",
+                f"/api/books/{self.book()}/status/",
+                {"borrower": borrower},
+            )
+        if operation == "create":
+            serial_number = str(next(self.next_created))
+            return (
+                operation,
+                "POST",
+                "/api/books/",
+                {"serial_number": serial_number, "title": "Load test", "author": "-"},
+            )
+        serial_number = self.created.pop(self.rng.randrange(len(self.created)))
+        return operation, "DELETE", f"/api/books/{serial_number}/", None
+
+    async def _send_all(self, requests, accept):
+        """
+        Send (method, path, body) requests over `concurrency` connections.
+
+        Throttled requests (429, 503) are retried after their Retry-After.
+        Raises SetupFailed when accept(status, body) refuses a response, or
+        a request is still throttled after MAX_THROTTLED_RETRIES retries.
+        """
+        queue = list(requests)
+
+        async def send(connection, method, path, body):
+            for attempt in range(MAX_THROTTLED_RETRIES + 1):
+                status, headers, data = await connection.request(method, path, body)
+                if status not in (429, 503) or attempt == MAX_THROTTLED_RETRIES:
+                    break
+                try:
+                    retry_after = float(headers.get("retry-after", 1))
+                except ValueError:
+                    retry_after = 1
+                await asyncio.sleep(retry_after)
+            if not accept(status, data):
+                raise SetupFailed(
+                    f"{method} {path} returned {status}: "
+                    f"{data[:200].decode(errors='replace')}"
+                )
+
+        async def sender():
+            connection = self.connection()
+            try:
+                while queue:
+                    await send(connection, *queue.pop())
+            finally:
+                connection.close()
+
+        await asyncio.gather(*(sender() for _ in range(self.concurrency)))
+
+    def setup(self):
+        """
+        Create the readers and books the load test uses, skipping existing ones.
+
+        Raises SetupFailed if the server refuses to create one.
+        """
+        readers = [
+            ("POST", "/api/readers/", {"serial_number": str(self.first_serial + i)})
+            for i in range(self.readers)
+        ]
+        books = [
+            (
+                "POST",
+                "/api/books/",
+                {"serial_number": serial, "title": f"Book {serial}", "author": "-"},
+            )
+            for serial in self.ranked_books
+        ]
+
+        def created(status, body):
+            return status == 201 or (status == 400 and b"already exists" in body)
+
+        asyncio.run(self._send_all(readers + books, created))
+
+    async def _run(self, duration):
+        recorder = Recorder()
+        deadline = time.monotonic() + duration
+
+        async def client():
+            connection = self.connection()
+            try:
+                while time.monotonic() < deadline:
+                    operation, *request = self.next_request()
+                    started = time.perf_counter()
+                    try:
+                        status, _, _ = await connection.request(*request)
+                    except RequestFailed:
+                        status = None
+                    recorder.record(operation, status, time.perf_counter() - started)
+                    if operation == "create" and status == 201:
+                        self.created.append(request[2]["serial_number"])
+            finally:
+                connection.close()
+
+        started = time.monotonic()
+        await asyncio.gather(*(client() for _ in range(self.concurrency)))
+        elapsed = time.monotonic() - started
+        leftovers = [("DELETE", f"/api/books/{s}/", None) for s in self.created]
+        self.created = []
+        await self._send_all(leftovers, lambda status, _: status in (204, 404))
+        return recorder.report(elapsed)
+
+    def run(self, duration):
+        """Run the load for duration seconds; returns the report (JSON-ready)."""
+        report = asyncio.run(self._run(duration))
+        return {
+            "url": self.url,
+            "duration": duration,
+            "concurrency": self.concurrency,
+            "mix": self.mix,
+            "books": self.books,
+            "zipf": self.zipf,
+            **report,
+        }
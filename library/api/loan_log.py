@@ -0,0 +1,164 @@
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .branches import get_database, on_commit
+from .models import LoanEvent
+
+logger = logging.getLogger(__name__)
+
+
+class LoanEventBuffer:
+    """
+    In-process write-behind buffer for loan events.
+
+    Events are appended in memory and written with bulk_create by a
+    background thread, either every FLUSH_INTERVAL seconds or as soon as
+    BATCH_SIZE events are waiting, so request threads never block on the
+    INSERT. Events whose write fails stay buffered for the next flush, up to
+    MAX_PENDING (beyond that the oldest are dropped and counted in dropped).
+    Events still buffered when the process exits are flushed at exit; a
+    killed process loses them, use the durable mode if that's unacceptable.
+    Each event is written to the database of the branch it was recorded in.
+    """
+
+    def __init__(self):
+        self.dropped = 0
+        self._reset()
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._events = []
+        self._wakeup = threading.Event()
+        self._flusher = None
+
+    def add(self, event, database=None):
+        if self._pid != os.getpid():
+            # Forked worker, don't share the parent's buffer or thread
+            self._reset()
+        config = settings.LOAN_EVENTS
+        database = database or get_database()
+        with self._lock:
+            self._events.append((database, event))
+            full = len(self._events) >= config["BATCH_SIZE"]
+        if config["FLUSH_INTERVAL"] <= 0:
+            if full:
+                self.flush()
+            return
+        self._ensure_flusher(config["FLUSH_INTERVAL"])
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Write all buffered events. Returns the number of events written.
+
+        The events of a database whose write fails are put back at the front
+        of the buffer, and the first error is raised once the other
+        databases are written.
+        """
+        with self._lock:
+            events, self._events = self._events, []
+        by_database = defaultdict(list)
+        for database, event in events:
+            by_database[database].append(event)
+        failed = set()
+        error = None
+        for database, batch in by_database.items():
+            try:
+                LoanEvent.objects.using(database).bulk_create(
+                    batch, batch_size=settings.LOAN_EVENTS["BATCH_SIZE"]
+                )
+            except Exception as e:
+                failed.add(database)
+                error = error or e
+        if error is not None:
+            self._put_back([(d, event) for d, event in events if d in failed])
+            raise error
+        return len(events)
+
+    def _put_back(self, events):
+        limit = settings.LOAN_EVENTS["MAX_PENDING"]
+        with self._lock:
+            self._events[:0] = events
+            excess = len(self._events) - limit
+            if excess > 0:
+                del self._events[:excess]
+                self.dropped += excess
+        if excess > 0:
+            logger.error("Dropped %d loan events the database didn't take", excess)
+
+    def _ensure_flusher(self, interval):
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(
+                    target=self._run_flusher,
+                    args=(interval,),
+                    name="loan-event-flusher",
+                    daemon=True,
+                )
+                self._flusher.start()
+
+    def _run_flusher(self, interval):
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush loan events")
+            finally:
+                connections.close_all()
+
+    def __len__(self):
+        return len(self._events)
+
+
+buffer = LoanEventBuffer()
+
+
+def record_loan_event(book_serial_number, reader_serial_number, event):
+    """
+    Record a borrow or return event for the current transaction.
+
+    In durable mode the event is inserted in the same transaction as the
+    transition. Otherwise it's handed to the write-behind buffer once the
+    transaction commits, so rolled back transitions are never logged.
+    """
+    entry = LoanEvent(
+        book_serial_number=book_serial_number,
+        reader_serial_number=reader_serial_number,
+        event=event,
+        created_at=timezone.now(),
+    )
+    if settings.LOAN_EVENTS["DURABLE"]:
+        entry.save()
+    else:
+        database = get_database()
+        on_commit(lambda: buffer.add(entry, database))
+
+
+def get_book_history(serial_number):
+    """
+    Retrieve the loan events of a book, newest first.
+    """
+    return LoanEvent.objects.filter(book_serial_number=serial_number).order_by(
+        "-created_at", "-pk"
+    )
+
+
+def get_reader_history(serial_number):
+    """
+    Retrieve the loan events of a reader, newest first.
+    """
+    return LoanEvent.objects.filter(reader_serial_number=serial_number).order_by(
+        "-created_at", "-pk"
+    )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.archive import archive_withdrawn_books
+
+
+class Command(BaseCommand):
+    help = "Move withdrawn books from the book table to the archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        archived = archive_withdrawn_books(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} book(s)."))
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.changefeed import compact
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove superseded book changes and delete markers older than the "
+        "retention period from the change feed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.CHANGE_FEED["RETENTION_DAYS"],
+        )
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        removed = compact(options["retention_days"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} book change(s)."))
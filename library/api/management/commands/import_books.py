@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import BookImportError, import_books
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update books from a CSV file with serial_number, title and "
+        "author columns. An interrupted import resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file to import.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--rejects",
+            help="File invalid rows are appended to, defaults to <path>.rejected.csv.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the position saved by an interrupted import.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            counts = import_books(
+                options["path"],
+                batch_size=options["batch_size"],
+                rejects_path=options["rejects"],
+                restart=options["restart"],
+            )
+        except (OSError, BookImportError) as e:
+            raise CommandError(f"Can't import {options['path']}: {e}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                "Imported books: {created} created, {updated} updated, "
+                "{unchanged} unchanged, {rejected} rejected.".format(**counts)
+            )
+        )
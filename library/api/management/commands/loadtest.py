@@ -0,0 +1,86 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.loadtest import DEFAULT_MIX, LoadTest, RequestFailed, SetupFailed, parse_mix
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a running instance with a mix of book list, retrieve, status, "
+        "create and delete requests, with Zipf-distributed book popularity, "
+        "and print a JSON report of throughput, latencies and error rates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Base URL, e.g. http://localhost:8000.")
+        parser.add_argument(
+            "--duration", type=float, default=30, help="Seconds to run."
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=16,
+            help="Connections, each with one request in flight.",
+        )
+        parser.add_argument(
+            "--mix",
+            default=",".join(f"{op}={weight}" for op, weight in DEFAULT_MIX.items()),
+            help="Relative weights of list, retrieve, status, create and delete.",
+        )
+        parser.add_argument("--books", type=int, default=1000)
+        parser.add_argument("--readers", type=int, default=100)
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.1,
+            help="Zipf exponent of book popularity; 0 is uniform.",
+        )
+        parser.add_argument(
+            "--first-serial",
+            type=int,
+            default=100000,
+            help="Serial number of the first book and reader.",
+        )
+        parser.add_argument("--branch", help="Value of the X-Library-Branch header.")
+        parser.add_argument("--seed", type=int)
+        parser.add_argument(
+            "--setup",
+            action="store_true",
+            help="Create the books and readers first; existing ones are kept.",
+        )
+        parser.add_argument("--output", help="Write the report to this file.")
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options["mix"])
+        except ValueError as e:
+            raise CommandError(f"Invalid --mix: {e}")
+        if options["first_serial"] + max(options["books"], options["readers"]) > (
+            1000000
+        ):
+            raise CommandError("Serial numbers must stay below 1000000.")
+        load_test = LoadTest(
+            options["url"],
+            mix=mix,
+            books=options["books"],
+            readers=options["readers"],
+            zipf=options["zipf"],
+            concurrency=options["concurrency"],
+            first_serial=options["first_serial"],
+            branch=options["branch"],
+            seed=options["seed"],
+        )
+        try:
+            if options["setup"]:
+                load_test.setup()
+            report = load_test.run(options["duration"])
+        except (OSError, RequestFailed) as e:
+            raise CommandError(f"Can't reach {options['url']}: {e}")
+        except SetupFailed as e:
+            raise CommandError(f"Can't set up or clean up the test data: {e}")
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        self.stdout.write(output)
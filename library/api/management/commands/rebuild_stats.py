@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the circulation counters and author loan counts from the "
+        "books table and loan history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only compare the stored summaries with freshly computed ones.",
+        )
+
+    def handle(self, *args, **options):
+        mismatches = rebuild(verify_only=options["verify"])
+        for name, stored, actual in mismatches:
+            self.stdout.write(f"{name}: stored {stored}, actual {actual}")
+        if options["verify"]:
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} summary value(s) are off.")
+            self.stdout.write(self.style.SUCCESS("Summaries are consistent."))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Rebuilt summaries, {len(mismatches)} value(s) were off."
+                )
+            )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from api.services import reconcile_loan_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild readers' active loan counters from the books table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many readers have drifted counters.",
+        )
+
+    def handle(self, *args, **options):
+        drifted = reconcile_loan_counters(dry_run=options["dry_run"])
+        if options["dry_run"]:
+            self.stdout.write(f"{drifted} reader(s) with drifted loan counters.")
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"Reconciled {drifted} reader loan counter(s).")
+            )
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.snapshot import SnapshotError, restore
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace all readers, books and reservations with the contents of a "
+        "snapshot written by the snapshot command."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Snapshot file to restore (.jsonl.gz).")
+        parser.add_argument("--chunk-size", type=int, default=10000)
+        parser.add_argument(
+            "--no-input",
+            action="store_false",
+            dest="interactive",
+            help="Don't ask for confirmation.",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        if options["interactive"]:
+            confirm = input(
+                "This will delete all readers, books and reservations and replace "
+                "them with the snapshot. Type 'yes' to continue: "
+            )
+            if confirm != "yes":
+                raise CommandError("Restore cancelled.")
+        try:
+            counts = restore(
+                options["path"],
+                chunk_size=options["chunk_size"],
+                progress=self.progress,
+            )
+        except (OSError, ValueError, SnapshotError) as e:
+            raise CommandError(f"Can't restore {options['path']}: {e}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Restored {counts['reader']} reader(s), {counts['book']} book(s) "
+                f"and {counts['reservation']} reservation(s)."
+            )
+        )
+
+    def progress(self, kind, count):
+        if self.verbosity:
+            self.stdout.write(f"{kind}: {count}")
@@ -0,0 +1,59 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.branches import use_branch
+from api.jobs import default_worker_id, run_worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs. Several workers may run at once, each job "
+        "is claimed by one of them. SIGTERM and SIGINT stop the worker after "
+        "its current job."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--worker-id", help="Defaults to <hostname>:<pid>.")
+        parser.add_argument(
+            "--branch", help="Branch whose jobs to run, defaults to DEFAULT_BRANCH."
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            help="Seconds between polls of an idle worker.",
+        )
+        parser.add_argument(
+            "--max-jobs", type=int, help="Exit after running this many jobs."
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once no queued job is due.",
+        )
+
+    def handle(self, *args, **options):
+        branch = options["branch"] or settings.DEFAULT_BRANCH
+        if branch not in settings.BRANCHES:
+            raise CommandError(f"Unknown branch '{branch}'.")
+        stop = threading.Event()
+        previous = {
+            signum: signal.signal(signum, lambda *_: stop.set())
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        worker_id = options["worker_id"] or default_worker_id()
+        try:
+            with use_branch(branch):
+                ran = run_worker(
+                    worker_id=worker_id,
+                    poll_interval=options["poll_interval"],
+                    max_jobs=options["max_jobs"],
+                    once=options["once"],
+                    stop=stop,
+                )
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.stdout.write(self.style.SUCCESS(f"{worker_id} ran {ran} job(s)."))
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api.notifications import send_overdue_notices
+
+
+class Command(BaseCommand):
+    help = (
+        "Notify the borrowers of overdue books, at most once per loan and day. "
+        "An interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date", help="Notice date (YYYY-MM-DD), defaults to today."
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=settings.OVERDUE_NOTICES["CHUNK_SIZE"]
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the position saved by an interrupted run.",
+        )
+
+    def handle(self, *args, **options):
+        notice_date = None
+        if options["date"]:
+            try:
+                notice_date = parse_date(options["date"])
+            except ValueError:
+                notice_date = None
+            if notice_date is None:
+                raise CommandError(f"Invalid date '{options['date']}'.")
+        sent = send_overdue_notices(
+            notice_date=notice_date,
+            chunk_size=options["chunk_size"],
+            restart=options["restart"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} overdue notice(s)."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.snapshot import snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a consistent, compressed snapshot of all readers and books, with "
+        "their loans and hold queues, for restoring with the restore command."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Snapshot file to write (.jsonl.gz).")
+        parser.add_argument("--chunk-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        counts = snapshot(
+            options["path"], chunk_size=options["chunk_size"], progress=self.progress
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Wrote {counts['reader']} reader(s), {counts['book']} book(s) "
+                f"and {counts['reservation']} reservation(s) to {options['path']}."
+            )
+        )
+
+    def progress(self, kind, count):
+        if self.verbosity:
+            self.stdout.write(f"{kind}: {count}")
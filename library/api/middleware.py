@@ -0,0 +1,216 @@
+import hmac
+import math
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+
+from .branches import BRANCH_HEADER, database_aliases, use_branch
+from .profiler import profile_request
+from .tracing import (
+    TRACEPARENT_HEADER,
+    TRACERESPONSE_HEADER,
+    format_traceparent,
+    new_id,
+    parse_traceparent,
+    should_sample,
+    start_trace,
+    trace_sql,
+)
+
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Bounds the number of requests in flight in this process.
+
+    The limit adapts to observed latency (AIMD): it shrinks multiplicatively
+    whenever a request takes longer than the latency target and grows by one
+    when requests are fast while the limiter is at least half full.
+    """
+
+    def __init__(
+        self, initial_limit, min_limit, max_limit, latency_target, backoff=0.9
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency):
+        with self._lock:
+            busy = self.in_flight >= self.limit / 2
+            self.in_flight -= 1
+            if latency > self.latency_target:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            elif busy:
+                self.limit = min(self.max_limit, self.limit + 1)
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Sheds API requests with 503 and Retry-After when too many are in flight.
+
+    In-flight requests can't outnumber the worker's threads, so overload
+    shows as requests queueing for a thread. The latency fed to the limiter
+    includes that wait, taken from the proxy's QUEUE_START_HEADER, so a
+    growing queue shrinks the limit below the thread count. Failing fast
+    then drains the queue instead of letting requests (and their database
+    work) wait until they time out.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = settings.CONCURRENCY_LIMIT
+        self.limiter = AdaptiveConcurrencyLimiter(
+            initial_limit=config["INITIAL_LIMIT"],
+            min_limit=config["MIN_LIMIT"],
+            max_limit=config["MAX_LIMIT"],
+            latency_target=config["LATENCY_TARGET"],
+        )
+
+    def __call__(self, request):
+        config = settings.CONCURRENCY_LIMIT
+        if not config["ENABLED"] or not request.path.startswith("/api/"):
+            return self.get_response(request)
+
+        queued = queue_time(request, config["QUEUE_START_HEADER"])
+        if not self.limiter.acquire():
+            return JsonResponse(
+                {"detail": "Server is busy, try again later."},
+                status=503,
+                headers={"Retry-After": str(config["RETRY_AFTER"])},
+            )
+        started = time.monotonic()
+        try:
+            return self.get_response(request)
+        finally:
+            self.limiter.release(queued + time.monotonic() - started)
+
+
+def queue_time(request, header):
+    """
+    Seconds since the proxy received the request, from the t=<unix time>
+    value it set in header; 0 without a header or a valid value.
+    """
+    if not header:
+        return 0.0
+    value = request.headers.get(header, "").removeprefix("t=")
+    try:
+        received = float(value)
+    except ValueError:
+        return 0.0
+    if not math.isfinite(received):
+        return 0.0
+    return max(0.0, time.time() - received)
+
+
+class BranchMiddleware:
+    """
+    Serves each request from the branch named in its X-Library-Branch
+    header, or from DEFAULT_BRANCH without one.
+
+    Unknown branches get 400. Responses vary on the header, so caches keep
+    the branches apart.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        branch = request.headers.get(BRANCH_HEADER) or settings.DEFAULT_BRANCH
+        if branch not in settings.BRANCHES:
+            return JsonResponse({"detail": f"Unknown branch '{branch}'."}, status=400)
+        request.branch = branch
+        with use_branch(branch):
+            response = self.get_response(request)
+        patch_vary_headers(response, [BRANCH_HEADER])
+        return response
+
+
+class ProfilerMiddleware:
+    """
+    Profiles requests while PROFILER["ENABLED"]: a SAMPLE_RATE fraction of
+    them at random, and every request whose X-Profile-Token header matches
+    PROFILER["TOKEN"].
+
+    The stacks of a profiled request are stored in api.profiler's on-disk
+    ring buffer, browsable in the admin; its response carries the profile
+    id in X-Profile-Id. Other requests only pay for a random number and a
+    header lookup, and nothing while the profiler is disabled.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = settings.PROFILER
+        if not config["ENABLED"]:
+            return self.get_response(request)
+        token = request.headers.get(PROFILE_TOKEN_HEADER)
+        if token and config["TOKEN"]:
+            if not hmac.compare_digest(token.encode(), config["TOKEN"].encode()):
+                return JsonResponse({"detail": "Invalid profile token."}, status=403)
+            trigger = "token"
+        elif random.random() < config["SAMPLE_RATE"]:
+            trigger = "sampled"
+        else:
+            return self.get_response(request)
+        return profile_request(request, self.get_response, trigger)
+
+
+class TracingMiddleware:
+    """
+    Traces requests while TRACING["ENABLED"]: the request is the root span,
+    the service methods, serializers, rendering and SQL statements it runs
+    are its children (see api.tracing).
+
+    A valid W3C traceparent header continues the caller's trace, otherwise
+    a new one is started; should_sample() decides whether it is recorded.
+    Recorded requests answer with a traceresponse header naming their root
+    span. Other requests only pay for the sampling decision.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.TRACING["ENABLED"]:
+            return self.get_response(request)
+        parent = parse_traceparent(request.headers.get(TRACEPARENT_HEADER, ""))
+        trace_id, parent_id, parent_sampled = parent or (new_id(128), None, None)
+        if not should_sample(trace_id, parent_sampled):
+            return self.get_response(request)
+
+        attributes = {"http.method": request.method, "url.path": request.path}
+        with start_trace(request.method, trace_id, parent_id, attributes) as root:
+            with ExitStack() as stack:
+                for alias in database_aliases():
+                    stack.enter_context(connections[alias].execute_wrapper(trace_sql))
+                response = self.get_response(request)
+            match = request.resolver_match
+            if match:
+                root.name = f"{request.method} {match.view_name}"
+                root.attributes["http.route"] = match.route
+            root.attributes["http.status_code"] = response.status_code
+            root.attributes["library.branch"] = getattr(request, "branch", None)
+            if response.status_code >= 500:
+                root.status = "error"
+        response[TRACERESPONSE_HEADER] = format_traceparent(trace_id, root.span_id)
+        return response
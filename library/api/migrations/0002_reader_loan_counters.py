@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:06
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing_loans(apps, schema_editor):
+    Book = apps.get_model("api", "Book")
+    Reader = apps.get_model("api", "Reader")
+    db_alias = schema_editor.connection.alias
+    loans = (
+        Book.objects.using(db_alias)
+        .filter(borrower=OuterRef("pk"))
+        .order_by()
+        .values("borrower")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    Reader.objects.using(db_alias).update(active_loans=Coalesce(Subquery(loans), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reader",
+            name="active_loans",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="reader",
+            name="loan_limit",
+            field=models.PositiveIntegerField(
+                blank=True,
+                help_text="Maximum concurrent loans; falls back to READER_LOAN_LIMIT.",
+                null=True,
+            ),
+        ),
+        migrations.RunPython(count_existing_loans, migrations.RunPython.noop),
+    ]
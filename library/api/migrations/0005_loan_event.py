@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LoanEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("book_serial_number", models.CharField(max_length=6)),
+                ("reader_serial_number", models.CharField(max_length=6)),
+                (
+                    "event",
+                    models.CharField(
+                        choices=[("borrow", "Borrow"), ("return", "Return")],
+                        max_length=6,
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["book_serial_number", "created_at"],
+                        name="api_loaneve_book_se_f3363c_idx",
+                    ),
+                    models.Index(
+                        fields=["reader_serial_number", "created_at"],
+                        name="api_loaneve_reader__0d4181_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
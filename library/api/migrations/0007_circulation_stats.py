@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:15
+
+from django.db import migrations, models
+
+
+def count_existing_books(apps, schema_editor):
+    Book = apps.get_model("api", "Book")
+    CirculationCounter = apps.get_model("api", "CirculationCounter")
+    books = Book.objects.using(schema_editor.connection.alias)
+    CirculationCounter.objects.using(schema_editor.connection.alias).bulk_create(
+        [
+            CirculationCounter(name="total", shard=0, value=books.count()),
+            CirculationCounter(
+                name="borrowed",
+                shard=0,
+                value=books.filter(borrower__isnull=False).count(),
+            ),
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_book_change"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuthorLoanCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("author", models.CharField(max_length=100, unique=True)),
+                ("loans", models.PositiveIntegerField(db_index=True, default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="book",
+            name="borrow_date",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="reader",
+            name="active_loans",
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name="CirculationCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=20)),
+                ("shard", models.PositiveSmallIntegerField()),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("name", "shard"),
+                        name="unique_circulation_counter_shard",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(count_existing_books, migrations.RunPython.noop),
+    ]
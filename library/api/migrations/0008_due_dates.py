@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:16
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def set_existing_due_dates(apps, schema_editor):
+    Book = apps.get_model("api", "Book")
+    Book.objects.using(schema_editor.connection.alias).filter(
+        borrow_date__isnull=False
+    ).update(due_date=F("borrow_date") + timedelta(days=settings.LOAN_PERIOD_DAYS))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_circulation_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OverdueNotice",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("book_serial_number", models.CharField(max_length=6)),
+                ("reader_serial_number", models.CharField(max_length=6)),
+                ("borrow_date", models.DateTimeField()),
+                ("due_date", models.DateTimeField()),
+                ("notice_date", models.DateField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="due_date",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["due_date", "serial_number"], name="api_book_due_dat_a987c3_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="overduenotice",
+            constraint=models.UniqueConstraint(
+                fields=("book_serial_number", "borrow_date", "notice_date"),
+                name="unique_overdue_notice_per_loan_per_day",
+            ),
+        ),
+        migrations.RunPython(set_existing_due_dates, migrations.RunPython.noop),
+    ]
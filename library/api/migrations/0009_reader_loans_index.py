@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_due_dates"),
+    ]
+
+    # The composite index replaces the foreign key's own index, build it first
+    operations = [
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["borrower", "borrow_date"], name="api_book_borrowe_601b5d_idx"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="book",
+            name="borrower",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="api.reader",
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:36
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0010_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedBook",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("serial_number", models.CharField(db_index=True, max_length=6)),
+                ("title", models.CharField(max_length=100)),
+                ("author", models.CharField(max_length=100)),
+                ("withdrawn_at", models.DateTimeField(db_index=True)),
+                (
+                    "archived_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="withdrawn_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                condition=models.Q(("withdrawn_at__isnull", False)),
+                fields=["withdrawn_at"],
+                name="api_book_withdrawn_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_archived_books"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="idempotencykey",
+            name="claimed_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
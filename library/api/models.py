@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from .validators import six_number_digits_validator
 
 # Create your models here.
@@ -8,11 +9,24 @@ class Reader(models.Model):
     serial_number = models.CharField(
         max_length=6, validators=[six_number_digits_validator], unique=True
     )
+    active_loans = models.PositiveIntegerField(default=0, editable=False, db_index=True)
+    loan_limit = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Maximum concurrent loans; falls back to READER_LOAN_LIMIT.",
+    )
 
     def __str__(self):
         return self.serial_number
 
 
+class ActiveBookManager(models.Manager):
+    """Books in the catalog, withdrawn books are left out."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(withdrawn_at__isnull=True)
+
+
 class Book(models.Model):
     serial_number = models.CharField(
         max_length=6,
@@ -22,10 +36,233 @@ class Book(models.Model):
     )
     title = models.CharField(max_length=100)
     author = models.CharField(max_length=100)
+    # Indexed through (borrower, borrow_date) below
     borrower = models.ForeignKey(
-        Reader, on_delete=models.SET_NULL, null=True, blank=True
+        Reader, on_delete=models.SET_NULL, null=True, blank=True, db_index=False
     )
-    borrow_date = models.DateTimeField(null=True, blank=True)
+    borrow_date = models.DateTimeField(null=True, blank=True, db_index=True)
+    due_date = models.DateTimeField(null=True, blank=True)
+    # Set when the book is withdrawn, it's then moved to ArchivedBook
+    withdrawn_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = ActiveBookManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["due_date", "serial_number"]),
+            models.Index(fields=["borrower", "borrow_date"]),
+            # Only holds the few withdrawn books waiting to be archived
+            models.Index(
+                fields=["withdrawn_at"],
+                condition=models.Q(withdrawn_at__isnull=False),
+                name="api_book_withdrawn_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.serial_number} {self.title} {self.author}"
+
+
+class ArchivedBook(models.Model):
+    """Withdrawn book moved out of the book table (see api.archive)."""
+
+    # Not unique, a serial number can be reused and withdrawn again
+    serial_number = models.CharField(max_length=6, db_index=True)
+    title = models.CharField(max_length=100)
+    author = models.CharField(max_length=100)
+    withdrawn_at = models.DateTimeField(db_index=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.serial_number} {self.title} {self.author}"
+
+
+class Reservation(models.Model):
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="reservations"
+    )
+    reader = models.ForeignKey(
+        Reader, on_delete=models.CASCADE, related_name="reservations"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["book", "created_at"])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "reader"], name="unique_reservation_per_reader"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} held for {self.reader}"
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    # Stays null while the first request with the key is in flight
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When the in-flight request took the key, its claim lapses after
+    # IDEMPOTENCY_LEASE seconds so a retry can take over from a dead worker
+    claimed_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["key", "method", "path"], name="unique_idempotency_key"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.path} {self.key}"
+
+
+class LoanEvent(models.Model):
+    BORROW = "borrow"
+    RETURN = "return"
+    EVENT_CHOICES = [(BORROW, "Borrow"), (RETURN, "Return")]
+
+    # Serial numbers rather than foreign keys, so history outlives books and readers
+    book_serial_number = models.CharField(max_length=6)
+    reader_serial_number = models.CharField(max_length=6)
+    event = models.CharField(max_length=6, choices=EVENT_CHOICES)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["book_serial_number", "created_at"]),
+            models.Index(fields=["reader_serial_number", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.book_serial_number} {self.reader_serial_number}"
+
+
+class BookChange(models.Model):
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+    OP_CHOICES = [(CREATE, "Create"), (UPDATE, "Update"), (DELETE, "Delete")]
+
+    # The auto-incrementing id is the feed cursor
+    serial_number = models.CharField(max_length=6)
+    op = models.CharField(max_length=6, choices=OP_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["serial_number", "id"])]
+
+    def __str__(self):
+        return f"{self.pk} {self.op} {self.serial_number}"
+
+
+class Checkpoint(models.Model):
+    """Named position of a long-running or resumable process."""
+
+    name = models.CharField(max_length=255, unique=True)
+    position = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class CirculationCounter(models.Model):
+    """
+    One shard of a circulation counter.
+
+    Writers bump a random shard and readers sum all shards, so concurrent
+    borrows don't all queue on the same row lock.
+    """
+
+    TOTAL = "total"
+    BORROWED = "borrowed"
+
+    name = models.CharField(max_length=20)
+    shard = models.PositiveSmallIntegerField()
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "shard"], name="unique_circulation_counter_shard"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.name}[{self.shard}] = {self.value}"
+
+
+class AuthorLoanCount(models.Model):
+    author = models.CharField(max_length=100, unique=True)
+    loans = models.PositiveIntegerField(default=0, db_index=True)
+
+    def __str__(self):
+        return f"{self.author}: {self.loans}"
+
+
+class OverdueNotice(models.Model):
+    # A loan is identified by its book and the moment it was borrowed
+    book_serial_number = models.CharField(max_length=6)
+    reader_serial_number = models.CharField(max_length=6)
+    borrow_date = models.DateTimeField()
+    due_date = models.DateTimeField()
+    notice_date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book_serial_number", "borrow_date", "notice_date"],
+                name="unique_overdue_notice_per_loan_per_day",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.book_serial_number} overdue for {self.reader_serial_number}"
+
+
+class Job(models.Model):
+    """Background job run by the run_worker command (see api.jobs)."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    name = models.CharField(max_length=100)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default=QUEUED)
+    # Queued jobs are claimed once run_after has passed, retries are delayed
+    run_after = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=1)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # Worker holding a running job, and when it last reported progress
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_after"])]
+
+    def __str__(self):
+        return f"{self.pk} {self.name} {self.status}"
@@ -0,0 +1,151 @@
+import json
+import threading
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from .branches import atomic
+from .models import Book, Checkpoint, OverdueNotice
+
+
+class NoticeSink:
+    """
+    Delivers overdue notices to readers.
+
+    send() is called inside the transaction that stores the notices, so a
+    failed delivery rolls the chunk back and it's retried on the next run.
+    """
+
+    def send(self, notices):
+        raise NotImplementedError
+
+
+class DatabaseSink(NoticeSink):
+    """
+    Keeps the stored OverdueNotice rows as the only record of the notices,
+    for deployments where another system reads them from the database.
+    """
+
+    def send(self, notices):
+        pass
+
+
+class JsonLinesSink(NoticeSink):
+    """
+    Appends every notice to a JSON Lines file, one object per line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, notices):
+        lines = [
+            json.dumps(
+                {
+                    "book_serial_number": notice.book_serial_number,
+                    "reader_serial_number": notice.reader_serial_number,
+                    "borrow_date": notice.borrow_date.isoformat(),
+                    "due_date": notice.due_date.isoformat(),
+                    "notice_date": notice.notice_date.isoformat(),
+                }
+            )
+            + "\n"
+            for notice in notices
+        ]
+        with self._lock, open(self.path, "a") as f:
+            f.writelines(lines)
+
+
+def get_notice_sink():
+    """Create the sink configured in OVERDUE_NOTICES."""
+    config = settings.OVERDUE_NOTICES
+    return import_string(config["SINK"])(**config.get("OPTIONS", {}))
+
+
+def send_overdue_notices(
+    notice_date=None, chunk_size=None, sink=None, restart=False, progress=None
+):
+    """
+    Notify the borrowers of every book past its due date.
+
+    Overdue loans are read in chunks with a keyset range query over the
+    (due_date, serial_number) index, so memory stays bounded however many
+    loans there are. Each chunk's notices are stored with bulk_create and
+    delivered in one transaction that also saves the position reached, so an
+    interrupted run resumes after the last completed chunk. A loan is only
+    notified once per notice date, reruns on the same day skip it.
+    progress(notices sent so far) is called after each chunk.
+
+    Returns the number of notices sent.
+    """
+    notice_date = notice_date or timezone.localdate()
+    chunk_size = chunk_size or settings.OVERDUE_NOTICES["CHUNK_SIZE"]
+    sink = sink or get_notice_sink()
+    checkpoint_name = f"overdue_notices:{notice_date.isoformat()}"
+
+    position = {}
+    if restart:
+        Checkpoint.objects.filter(name=checkpoint_name).delete()
+    elif checkpoint := Checkpoint.objects.filter(name=checkpoint_name).first():
+        position = checkpoint.position
+
+    overdue = (
+        Book.objects.filter(due_date__lt=timezone.now(), borrower__isnull=False)
+        .order_by("due_date", "serial_number")
+        .values_list(
+            "serial_number", "borrower__serial_number", "borrow_date", "due_date"
+        )
+    )
+    sent = 0
+    while True:
+        chunk = overdue
+        if position:
+            last_due_date = parse_datetime(position["due_date"])
+            chunk = chunk.filter(
+                Q(due_date__gt=last_due_date)
+                | Q(due_date=last_due_date, serial_number__gt=position["serial_number"])
+            )
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            break
+
+        already_notified = set(
+            OverdueNotice.objects.filter(
+                notice_date=notice_date,
+                book_serial_number__in=[row[0] for row in rows],
+            ).values_list("book_serial_number", "borrow_date")
+        )
+        notices = [
+            OverdueNotice(
+                book_serial_number=serial_number,
+                reader_serial_number=reader_serial_number,
+                borrow_date=borrow_date,
+                due_date=due_date,
+                notice_date=notice_date,
+            )
+            for serial_number, reader_serial_number, borrow_date, due_date in rows
+            if (serial_number, borrow_date) not in already_notified
+        ]
+        last_serial_number, _, _, last_due_date = rows[-1]
+        position = {
+            "due_date": last_due_date.isoformat(),
+            "serial_number": last_serial_number,
+        }
+        with atomic():
+            OverdueNotice.objects.bulk_create(notices, ignore_conflicts=True)
+            if notices:
+                sink.send(notices)
+            Checkpoint.objects.update_or_create(
+                name=checkpoint_name, defaults={"position": position}
+            )
+        sent += len(notices)
+        if progress:
+            progress(sent)
+
+    # Loans that become overdue later in the day are picked up by the next run
+    Checkpoint.objects.filter(name=checkpoint_name).delete()
+    return sent
@@ -0,0 +1,58 @@
+from rest_framework.pagination import CursorPagination
+
+
+class LoanHistoryPagination(CursorPagination):
+    """
+    Keyset pagination over loan events, newest first.
+
+    Cursors keep every page an index range scan, however deep the history.
+    """
+
+    ordering = ("-created_at", "-pk")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class OverdueLoanPagination(CursorPagination):
+    """
+    Keyset pagination over loans, oldest loan first.
+    """
+
+    ordering = ("borrow_date", "serial_number")
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+class ReaderPagination(CursorPagination):
+    """
+    Keyset pagination over readers by serial number.
+    """
+
+    ordering = ("serial_number",)
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class ReaderLoanPagination(CursorPagination):
+    """
+    Keyset pagination over a reader's loans, oldest loan first.
+    """
+
+    ordering = ("borrow_date", "serial_number")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class ArchivedBookPagination(CursorPagination):
+    """
+    Keyset pagination over archived books, most recently withdrawn first.
+    """
+
+    ordering = ("-withdrawn_at", "-pk")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
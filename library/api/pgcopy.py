@@ -0,0 +1,22 @@
+import csv
+import io
+
+from .branches import connection
+
+
+def copy_rows(table, columns, rows):
+    """
+    Load rows into a PostgreSQL table with COPY, through psycopg 3 or psycopg2.
+    """
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, "copy"):
+            with raw.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            buffer.seek(0)
+            raw.copy_expert(f"{sql} WITH (FORMAT csv)", buffer)
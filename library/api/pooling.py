@@ -0,0 +1,22 @@
+from django.db import connections
+
+from .branches import database_aliases
+
+
+def get_pool(alias):
+    """The connection pool of the database in this process, None if unpooled."""
+    return getattr(connections[alias], "pool", None)
+
+
+def get_pool_stats():
+    """
+    Statistics of this process's connection pools by database alias, None
+    for databases without a pool (see psycopg_pool's get_stats()).
+
+    Pools are per process, so every worker reports its own.
+    """
+    stats = {}
+    for alias in database_aliases():
+        pool = get_pool(alias)
+        stats[alias] = pool.get_stats() if pool is not None else None
+    return stats
@@ -0,0 +1,189 @@
+import fcntl
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+TRUNCATED = "[truncated]"
+
+
+def frame_label(frame):
+    """module:qualified name of the function running in the frame."""
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+
+class StackSampler:
+    """
+    Samples the call stack of one thread from a background thread.
+
+    Every interval the sampler reads the thread's current frame, so the
+    profiled code runs unmodified; the counts are in the collapsed format
+    of flame graph tools, one "root;...;leaf" stack per key. At most
+    max_stacks different stacks are kept, further ones are counted as
+    TRUNCATED.
+    """
+
+    def __init__(self, thread_id=None, interval=0.001, max_stacks=2000):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling; returns the stack counts."""
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            stack = ";".join(reversed(labels))
+            if stack in self.stacks or len(self.stacks) < self.max_stacks:
+                self.stacks[stack] += 1
+            else:
+                self.stacks[TRUNCATED] += 1
+
+
+def collapse(stacks):
+    """Collapsed stack text, one "stack count" line per stack, hottest first."""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def function_samples(collapsed):
+    """
+    Samples by function of collapsed stack text, as (function, self, total)
+    tuples in decreasing order of total: self counts the samples in which
+    the function was running, total those in which it was on the stack.
+    """
+    own, total = Counter(), Counter()
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(" ")
+        functions = stack.split(";")
+        own[functions[-1]] += int(count)
+        for function in set(functions):
+            total[function] += int(count)
+    return [(function, own[function], n) for function, n in total.most_common()]
+
+
+class ProfileStore:
+    """
+    A ring buffer of profiles on disk: capacity slot files in directory,
+    each new profile overwriting the oldest.
+
+    Profiles get increasing ids from a sequence file locked with flock, so
+    all the processes of a host can share the directory. A profile is
+    written to a temporary file and renamed into its slot, so readers never
+    see half of one.
+    """
+
+    def __init__(self, directory, capacity):
+        self.directory = directory
+        self.capacity = capacity
+
+    def _slot(self, profile_id):
+        return os.path.join(
+            self.directory, f"profile-{profile_id % self.capacity:04d}.json"
+        )
+
+    def _next_id(self):
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(os.path.join(self.directory, "sequence"), os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            profile_id = int(os.read(fd, 32) or 0) + 1
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, str(profile_id).encode())
+            return profile_id
+        finally:
+            os.close(fd)
+
+    def add(self, profile):
+        """Store the profile (a JSON-ready dict); returns its id."""
+        profile_id = self._next_id()
+        path = self._slot(profile_id)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({**profile, "id": profile_id}, f)
+        os.replace(temporary, path)
+        return profile_id
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, profile_id):
+        """The profile, or None if it was never stored or was overwritten."""
+        profile = self._read(self._slot(profile_id))
+        return profile if profile and profile["id"] == profile_id else None
+
+    def list(self):
+        """The stored profiles, newest first."""
+        profiles = filter(None, map(self._read, map(self._slot, range(self.capacity))))
+        return sorted(profiles, key=lambda profile: profile["id"], reverse=True)
+
+
+def get_store():
+    """The ProfileStore configured by the PROFILER setting."""
+    config = settings.PROFILER
+    return ProfileStore(config["DIR"], config["CAPACITY"])
+
+
+def profile_request(request, get_response, trigger):
+    """
+    Run get_response(request) under a StackSampler and store the profile.
+
+    Returns the response, with the profile id in its X-Profile-Id header.
+    Streaming responses are profiled up to the start of the stream.
+    """
+    config = settings.PROFILER
+    sampler = StackSampler(
+        interval=config["INTERVAL"], max_stacks=config["MAX_STACKS"]
+    ).start()
+    started_at = timezone.now()
+    started = time.perf_counter()
+    try:
+        response = get_response(request)
+    finally:
+        duration = time.perf_counter() - started
+        stacks = sampler.stop()
+    profile_id = get_store().add(
+        {
+            "method": request.method,
+            "path": request.get_full_path(),
+            "status": response.status_code,
+            "trigger": trigger,
+            "started_at": started_at.isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "interval_ms": config["INTERVAL"] * 1000,
+            "samples": sum(stacks.values()),
+            "pid": os.getpid(),
+            "stacks": collapse(stacks),
+        }
+    )
+    response["X-Profile-Id"] = str(profile_id)
+    return response
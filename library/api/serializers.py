@@ -1,9 +1,70 @@
+import copy
+
+from django.conf import settings
 from rest_framework import serializers
 
-from .models import Reader, Book
+from .models import (
+    ArchivedBook,
+    AuthorLoanCount,
+    Reader,
+    Book,
+    BookChange,
+    Job,
+    LoanEvent,
+    Reservation,
+)
+
+
+class CachedFieldsMixin:
+    """
+    Builds the fields of a ModelSerializer class once instead of on every
+    instantiation.
+
+    ModelSerializer introspects the model to build its fields each time a
+    serializer is created. The built fields are kept on the class and every
+    instance gets deep copies, since binding a field to a serializer mutates
+    it. Only for serializers whose fields don't depend on the instance,
+    data or context.
+    """
+
+    def get_fields(self):
+        cls = type(self)
+        fields = cls.__dict__.get("_cached_fields")
+        if fields is None:
+            fields = super().get_fields()
+            cls._cached_fields = fields
+        return copy.deepcopy(fields)
 
 
-class ReaderCreateSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Lets callers restrict the output to a subset of Meta.fields with fields=[...].
+
+    field_columns maps each serializer field to the model columns it reads
+    (a field reads the column of the same name unless listed), so callers
+    can load only those columns.
+    """
+
+    field_columns = {}
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def get_columns(cls, fields):
+        """Return the model columns needed to render the given fields."""
+        columns = []
+        for name in fields:
+            for column in cls.field_columns.get(name, [name]):
+                if column not in columns:
+                    columns.append(column)
+        return columns
+
+
+class ReaderCreateSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for creating a new reader.
     """
@@ -13,21 +74,51 @@ class ReaderCreateSerializer(serializers.ModelSerializer):
         fields = ["serial_number"]
 
 
-class BookSerializer(serializers.ModelSerializer):
+class ReaderLoanSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a book currently borrowed by a reader.
+    """
+
+    class Meta:
+        model = Book
+        fields = ["serial_number", "title", "author", "borrow_date", "due_date"]
+
+
+class ReaderSerializer(serializers.ModelSerializer):
+    """
+    Serializer for readers with their current loans.
+    """
+
+    loans = ReaderLoanSerializer(source="book_set", many=True, read_only=True)
+
+    class Meta:
+        model = Reader
+        fields = ["serial_number", "active_loans", "loan_limit", "loans"]
+
+
+class BookSerializer(SparseFieldsMixin, CachedFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for book operations (create, retrieve, list, update, delete).
     """
 
     borrower = serializers.SerializerMethodField()
+    field_columns = {"borrower": ["borrower__serial_number"]}
 
     class Meta:
         model = Book
-        fields = ["serial_number", "title", "author", "borrower", "borrow_date"]
-        read_only_fields = ["borrow_date"]
+        fields = [
+            "serial_number",
+            "title",
+            "author",
+            "borrower",
+            "borrow_date",
+            "due_date",
+        ]
+        read_only_fields = ["borrow_date", "due_date"]
 
     def get_borrower(self, obj):
         """Return the borrower's serial number instead of ID"""
-        if obj.borrower:
+        if obj.borrower_id:
             return obj.borrower.serial_number
         return None
 
@@ -50,7 +141,7 @@ class BookSerializer(serializers.ModelSerializer):
         return book
 
 
-class BookStatusSerializer(serializers.ModelSerializer):
+class BookStatusSerializer(CachedFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for updating book status (borrowed/available).
     Only allows updating the borrower field.
@@ -82,13 +173,19 @@ class BookStatusSerializer(serializers.ModelSerializer):
         return super().to_internal_value(data)
 
 
-class BookListSerializer(serializers.ModelSerializer):
+class BookListSerializer(
+    SparseFieldsMixin, CachedFieldsMixin, serializers.ModelSerializer
+):
     """
     Serializer for listing books with borrower information.
     """
 
     status = serializers.SerializerMethodField()
     borrower_serial_number = serializers.SerializerMethodField()
+    field_columns = {
+        "status": ["borrower"],
+        "borrower_serial_number": ["borrower__serial_number"],
+    }
 
     class Meta:
         model = Book
@@ -99,10 +196,135 @@ class BookListSerializer(serializers.ModelSerializer):
             "status",
             "borrower_serial_number",
             "borrow_date",
+            "due_date",
         ]
 
     def get_status(self, obj):
-        return "borrowed" if obj.borrower else "available"
+        return "borrowed" if obj.borrower_id else "available"
 
     def get_borrower_serial_number(self, obj):
-        return obj.borrower.serial_number if obj.borrower else None
+        return obj.borrower.serial_number if obj.borrower_id else None
+
+
+class ReservationSerializer(serializers.ModelSerializer):
+    """
+    Serializer for placing and listing holds on a book.
+    """
+
+    book = serializers.CharField(source="book_id", read_only=True)
+    reader = serializers.SlugRelatedField(
+        slug_field="serial_number", queryset=Reader.objects.all()
+    )
+
+    class Meta:
+        model = Reservation
+        fields = ["book", "reader", "created_at"]
+        validators = []
+
+
+class LoanEventSerializer(serializers.ModelSerializer):
+    """
+    Serializer for borrow and return events in the loan history.
+    """
+
+    class Meta:
+        model = LoanEvent
+        fields = ["book_serial_number", "reader_serial_number", "event", "created_at"]
+
+
+class BookChangeSerializer(serializers.ModelSerializer):
+    """
+    Serializer for change feed entries with the current state of the book.
+
+    Expects the current books, keyed by serial number, in the "books" context.
+    """
+
+    cursor = serializers.IntegerField(source="pk")
+    book = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BookChange
+        fields = ["cursor", "serial_number", "op", "changed_at", "book"]
+
+    def get_book(self, obj):
+        book = self.context["books"].get(obj.serial_number)
+        return BookListSerializer(book).data if book else None
+
+
+class ReaderLoansSerializer(serializers.ModelSerializer):
+    """
+    Serializer for readers ranked by their current number of loans.
+    """
+
+    class Meta:
+        model = Reader
+        fields = ["serial_number", "active_loans"]
+
+
+class AuthorLoanCountSerializer(serializers.ModelSerializer):
+    """
+    Serializer for authors ranked by the number of times their books were lent.
+    """
+
+    class Meta:
+        model = AuthorLoanCount
+        fields = ["author", "loans"]
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    """
+    Serializer for one operation of a batch request.
+    """
+
+    method = serializers.ChoiceField(choices=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    path = serializers.RegexField(r"^/api/")
+    body = serializers.JSONField(required=False, allow_null=True)
+
+
+class BatchSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of operations executed in one request.
+    """
+
+    atomic = serializers.BooleanField(default=False)
+    operations = BatchOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, value):
+        if len(value) > settings.BATCH_MAX_OPERATIONS:
+            raise serializers.ValidationError(
+                f"At most {settings.BATCH_MAX_OPERATIONS} operations are allowed."
+            )
+        return value
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the status of a background job.
+    """
+
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "name",
+            "status",
+            "progress",
+            "total",
+            "attempts",
+            "max_attempts",
+            "result",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+
+class ArchivedBookSerializer(serializers.ModelSerializer):
+    """
+    Serializer for withdrawn books in the archive.
+    """
+
+    class Meta:
+        model = ArchivedBook
+        fields = ["serial_number", "title", "author", "withdrawn_at", "archived_at"]
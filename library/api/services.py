@@ -1,6 +1,20 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Count, F, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
-from django.db import transaction
-from .models import Reader, Book
+from .archive import archive
+from .branches import atomic, check_branch, connection, on_commit
+from .changefeed import record_changes
+from .events import availability_event, get_broker
+from .loan_log import record_loan_event
+from .models import Reader, Book, BookChange, LoanEvent, Reservation
+from .stats import adjust_counters, record_author_loan
+from .suggest import suggester
+from .tracing import traced_methods
 
 
 def create_reader(serial_number):
@@ -15,9 +29,89 @@ def create_reader(serial_number):
     return reader
 
 
+def get_readers():
+    """
+    Retrieve all readers with their current loans.
+
+    The loans of a whole page of readers are fetched in one extra query.
+    """
+    return Reader.objects.prefetch_related(
+        Prefetch(
+            "book_set", queryset=Book.objects.order_by("borrow_date", "serial_number")
+        )
+    )
+
+
+def get_reader(serial_number):
+    """
+    Get a reader with their current loans by serial number or None if not found.
+    """
+    return get_readers().filter(serial_number=serial_number).first()
+
+
+def get_reader_loans(reader):
+    """
+    Retrieve the books currently borrowed by the reader.
+    """
+    return Book.objects.filter(borrower=reader)
+
+
+def acquire_loan(reader, loans=1):
+    """
+    Increment the reader's active loan counter if they are below their limit.
+
+    The limit check and the increment happen in a single conditional UPDATE,
+    so concurrent borrows can never push a reader over the limit.
+
+    Raises ValidationError if the reader has reached their loan limit.
+    """
+    limit = Coalesce(F("loan_limit"), Value(settings.READER_LOAN_LIMIT))
+    acquired = Reader.objects.filter(
+        pk=reader.pk, active_loans__lte=limit - loans
+    ).update(active_loans=F("active_loans") + loans)
+    if not acquired:
+        raise ValidationError(
+            f"Reader with serial number '{reader.serial_number}' "
+            "has reached their loan limit.",
+            code="loan_limit_reached",
+        )
+
+
+def release_loan(reader_id, loans=1):
+    """
+    Decrement the active loan counter of the reader with the given id.
+    """
+    Reader.objects.filter(pk=reader_id).update(
+        active_loans=Greatest(F("active_loans") - loans, 0)
+    )
+
+
+def reconcile_loan_counters(dry_run=False):
+    """
+    Rebuild every reader's active loan counter from the books table.
+
+    Runs as a single bulk UPDATE touching only readers whose counter drifted.
+    Returns the number of drifted readers.
+    """
+    loans = (
+        Book.objects.filter(borrower=OuterRef("pk"))
+        .order_by()
+        .values("borrower")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    drifted = Reader.objects.annotate(actual=Coalesce(Subquery(loans), 0)).exclude(
+        active_loans=F("actual")
+    )
+    if dry_run:
+        return drifted.count()
+    return drifted.update(active_loans=Coalesce(Subquery(loans), 0))
+
+
+@traced_methods
 class BookService:
     @staticmethod
-    @transaction.atomic
+    @atomic
     def create_book(serial_number, title, author):
         """
         Create a new book with the given details.
@@ -26,59 +120,318 @@ class BookService:
         """
         book = Book(serial_number=serial_number, title=title, author=author)
         book.full_clean()
+        # A withdrawn book still holds the serial number until it's archived
+        archive(Book.all_objects.filter(serial_number=serial_number))
         book.save()
+        adjust_counters(total=1)
         return book
 
     @staticmethod
-    def get_all():
+    def get_all(columns=None):
         """
         Retrieve all books in the library.
+
+        If columns are given, only those are loaded and the borrower is only
+        joined if one of them is a borrower__ lookup.
         """
-        return Book.objects.select_related("borrower").all()
+        return BookService._select(columns).all()
 
     @staticmethod
-    def get_by_serial(serial_number):
+    def get_by_serial(serial_number, columns=None):
         """
         Get a book by its serial number or None if not found.
         """
         try:
-            return Book.objects.select_related("borrower").get(
-                serial_number=serial_number
-            )
+            return BookService._select(columns).get(serial_number=serial_number)
         except Book.DoesNotExist:
             return None
 
     @staticmethod
-    @transaction.atomic
+    def _select(columns):
+        if columns is None:
+            return Book.objects.select_related("borrower")
+        books = Book.objects.only(*columns)
+        if any(column.startswith("borrower__") for column in columns):
+            books = books.select_related("borrower")
+        return books
+
+    @staticmethod
+    @atomic
     def delete(serial_number):
         """
-        Delete a book by its serial number.
-        Returns True if deleted, False if not found.
+        Withdraw a book by its serial number.
+
+        The book leaves the catalog at once: its loan is ended and its holds
+        are cancelled. The row stays in the book table, hidden by the default
+        manager, until archive_withdrawn_books moves it to the archive.
+        Returns True if withdrawn, False if not found.
         """
         book = BookService.get_by_serial(serial_number)
-        if book:
-            book.delete()
-            return True
-        return False
+        if not book:
+            return False
+        withdrawn = Book.objects.filter(pk=book.pk).update(
+            withdrawn_at=timezone.now(),
+            borrower=None,
+            borrow_date=None,
+            due_date=None,
+        )
+        if not withdrawn:
+            return False
+        if book.borrower_id:
+            release_loan(book.borrower_id)
+            record_loan_event(
+                book.serial_number, book.borrower.serial_number, LoanEvent.RETURN
+            )
+        adjust_counters(total=-1, borrowed=-1 if book.borrower_id else 0)
+        book.reservations.all().delete()
+        # The update sends no signals, leave the feed, subscribers and index here
+        record_changes([book.serial_number], BookChange.DELETE)
+        event = availability_event(book, deleted=True)
+        on_commit(lambda: get_broker().publish(event))
+        on_commit(lambda: suggester.apply(serial_number))
+        return True
 
     @staticmethod
-    @transaction.atomic
+    @atomic
     def update_borrow_status(book, borrower=None):
         """
         Update book's status to borrowed or available.
         If borrower is provided, book is borrowed.
         If borrower is None, book is marked as available.
 
+        Raises ValidationError if the borrower has reached their loan limit,
+        CrossBranchError if the book or borrower is of another branch, and
+        Book.DoesNotExist if the book was withdrawn since it was loaded.
+
         Returns updated book.
         """
+        check_branch(book, borrower)
+        # Lock the book row so concurrent transitions see the same previous borrower
+        locked = (
+            Book.objects.select_for_update(of=("self",))
+            .filter(pk=book.pk)
+            .values_list("borrower_id", "borrower__serial_number")
+            .first()
+        )
+        if locked is None:
+            raise Book.DoesNotExist(f"Book {book.pk} is no longer in the catalog.")
+        previous_borrower_id, previous_borrower_serial = locked
+
         if borrower:
             # Setting borrower (book is borrowed)
+            if borrower.pk != previous_borrower_id:
+                acquire_loan(borrower)
+                Reservation.objects.filter(book=book, reader=borrower).delete()
             book.borrower = borrower
             book.borrow_date = timezone.now()
+        elif previous_borrower_id and (
+            next_borrower := ReservationService.claim_next(book)
+        ):
+            # Returned book goes straight to the head of the hold queue
+            book.borrower = next_borrower
+            book.borrow_date = timezone.now()
         else:
             # Clearing borrower (book is available)
             book.borrower = None
             book.borrow_date = None
+        book.due_date = (
+            book.borrow_date + timedelta(days=settings.LOAN_PERIOD_DAYS)
+            if book.borrow_date
+            else None
+        )
 
-        book.save()
+        # Only the loan: the rest of the instance may be older than the lock
+        book.save(update_fields=["borrower", "borrow_date", "due_date"])
+
+        if book.borrower_id != previous_borrower_id:
+            if previous_borrower_id:
+                release_loan(previous_borrower_id)
+                record_loan_event(
+                    book.serial_number, previous_borrower_serial, LoanEvent.RETURN
+                )
+            if book.borrower_id:
+                record_loan_event(
+                    book.serial_number, book.borrower.serial_number, LoanEvent.BORROW
+                )
+                record_author_loan(book.author)
+            adjust_counters(
+                borrowed=bool(book.borrower_id) - bool(previous_borrower_id)
+            )
         return book
+
+    @staticmethod
+    @atomic
+    def bulk_borrow(serial_numbers, borrower):
+        """
+        Lend every available book among the serial numbers to the borrower.
+
+        The books are updated with a single UPDATE and the borrower's loan
+        counter with a single conditional UPDATE, so the loan limit holds
+        for the whole batch. Books that are already borrowed are skipped.
+
+        Raises ValidationError if the books would take the borrower over
+        their loan limit, and CrossBranchError if the borrower is of another
+        branch.
+
+        Returns the serial numbers of the borrowed books.
+        """
+        check_branch(borrower)
+        books = list(
+            Book.objects.select_for_update()
+            .filter(pk__in=serial_numbers, borrower__isnull=True)
+            .values_list("serial_number", "author")
+        )
+        if not books:
+            return []
+        borrowed = [serial_number for serial_number, _ in books]
+        acquire_loan(borrower, loans=len(books))
+        borrow_date = timezone.now()
+        Book.objects.filter(pk__in=borrowed).update(
+            borrower=borrower,
+            borrow_date=borrow_date,
+            due_date=borrow_date + timedelta(days=settings.LOAN_PERIOD_DAYS),
+        )
+        Reservation.objects.filter(book__in=borrowed, reader=borrower).delete()
+
+        for serial_number, author in books:
+            record_loan_event(serial_number, borrower.serial_number, LoanEvent.BORROW)
+        for author, loans in Counter(author for _, author in books).items():
+            record_author_loan(author, loans)
+        BookService._record_bulk_change(borrowed, "borrowed")
+        adjust_counters(borrowed=len(borrowed))
+        return borrowed
+
+    @staticmethod
+    @atomic
+    def bulk_return(serial_numbers):
+        """
+        Mark every borrowed book among the serial numbers as available.
+
+        The books are updated with a single UPDATE and each borrower's loan
+        counter once. Books with holds are returned one at a time instead,
+        so they go to the head of their hold queue.
+
+        Returns the serial numbers of the returned books.
+        """
+        loans = list(
+            Book.objects.select_for_update(of=("self",))
+            .filter(pk__in=serial_numbers, borrower__isnull=False)
+            .values_list("serial_number", "borrower_id", "borrower__serial_number")
+        )
+        held = set(
+            Reservation.objects.filter(book__in=[loan[0] for loan in loans])
+            .values_list("book_id", flat=True)
+            .distinct()
+        )
+        returned = [loan for loan in loans if loan[0] not in held]
+        for serial_number in held:
+            BookService.update_borrow_status(Book.objects.get(pk=serial_number), None)
+        if returned:
+            Book.objects.filter(pk__in=[loan[0] for loan in returned]).update(
+                borrower=None, borrow_date=None, due_date=None
+            )
+            for reader_id, loans_released in Counter(
+                reader_id for _, reader_id, _ in returned
+            ).items():
+                release_loan(reader_id, loans_released)
+            for serial_number, _, reader_serial_number in returned:
+                record_loan_event(serial_number, reader_serial_number, LoanEvent.RETURN)
+            BookService._record_bulk_change([loan[0] for loan in returned], "available")
+            adjust_counters(borrowed=-len(returned))
+        return sorted(held) + [loan[0] for loan in returned]
+
+    @staticmethod
+    def _record_bulk_change(serial_numbers, book_status):
+        # Bulk UPDATEs send no signals, do what the Book signals would
+        record_changes(serial_numbers, BookChange.UPDATE)
+
+        def publish():
+            broker = get_broker()
+            for serial_number in serial_numbers:
+                broker.publish({"serial_number": serial_number, "status": book_status})
+
+        on_commit(publish)
+
+
+@traced_methods
+class ReservationService:
+    # How many queued holds a return looks at before giving up, e.g. when
+    # the readers at the head of the queue are all at their loan limit
+    CLAIM_BATCH_SIZE = 10
+
+    @staticmethod
+    def get_queue(book):
+        """
+        Retrieve the hold queue of a book, oldest reservation first.
+        """
+        return (
+            Reservation.objects.filter(book=book)
+            .select_related("reader")
+            .order_by("created_at", "pk")
+        )
+
+    @staticmethod
+    @atomic
+    def place(book, reader):
+        """
+        Place a hold on a borrowed book for the reader.
+
+        Raises ValidationError if the book is available, already borrowed
+        by the reader or already held by them, and CrossBranchError if the
+        book or reader is of another branch.
+        """
+        check_branch(book, reader)
+        if book.borrower_id is None:
+            raise ValidationError(
+                f"Book with serial number '{book.serial_number}' is available.",
+                code="book_available",
+            )
+        if book.borrower_id == reader.pk:
+            raise ValidationError(
+                f"Book with serial number '{book.serial_number}' is already "
+                f"borrowed by reader '{reader.serial_number}'.",
+                code="already_borrowed",
+            )
+        reservation = Reservation(book=book, reader=reader)
+        reservation.full_clean()
+        reservation.save()
+        return reservation
+
+    @staticmethod
+    @atomic
+    def cancel(book, reader_serial_number):
+        """
+        Cancel the reader's hold on a book.
+        Returns True if cancelled, False if not found.
+        """
+        deleted, _ = Reservation.objects.filter(
+            book=book, reader__serial_number=reader_serial_number
+        ).delete()
+        return deleted > 0
+
+    @staticmethod
+    def claim_next(book):
+        """
+        Dequeue the oldest hold on the book whose reader can take another loan.
+
+        Must run inside the transaction that returns the book. On backends
+        with SKIP LOCKED the candidate rows are locked without waiting on
+        rows other transactions hold; elsewhere the conditional DELETE acts
+        as the claim. Returns the reader who gets the book, or None.
+        """
+        candidates = ReservationService.get_queue(book)
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True, of=("self",))
+
+        for reservation in candidates[: ReservationService.CLAIM_BATCH_SIZE]:
+            try:
+                with atomic():
+                    deleted, _ = Reservation.objects.filter(pk=reservation.pk).delete()
+                    if not deleted:
+                        continue
+                    acquire_loan(reservation.reader)
+            except ValidationError:
+                # Reader is at their loan limit, keep their place in the queue
+                continue
+            return reservation.reader
+        return None
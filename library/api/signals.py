@@ -1,7 +1,87 @@
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from .models import Reader, Book
+from .branches import on_commit
+from .changefeed import record_change, record_changes
+from .events import availability_event, get_broker
+from .loan_log import record_loan_event
+from .models import Reader, Book, BookChange, LoanEvent
+from .stats import adjust_counters
+from .suggest import suggester
+
+
+@receiver(post_save, sender=Book)
+def record_book_save(sender, instance, created, **kwargs):
+    """Append every created or updated book to the change feed."""
+    record_change(
+        instance.serial_number, BookChange.CREATE if created else BookChange.UPDATE
+    )
+
+
+@receiver(post_delete, sender=Book)
+def record_book_delete(sender, instance, **kwargs):
+    """Append every deleted book to the change feed."""
+    if instance.withdrawn_at:
+        # Left the feed when it was withdrawn, now it's being archived
+        return
+    record_change(instance.serial_number, BookChange.DELETE)
+
+
+def publish_on_commit(event):
+    on_commit(lambda: get_broker().publish(event))
+
+
+@receiver(post_save, sender=Book)
+def publish_book_save(sender, instance, **kwargs):
+    """Push the availability of a created or updated book to subscribers."""
+    publish_on_commit(availability_event(instance))
+
+
+@receiver(post_delete, sender=Book)
+def publish_book_delete(sender, instance, **kwargs):
+    """Push the removal of a book to subscribers."""
+    if instance.withdrawn_at:
+        return
+    publish_on_commit(availability_event(instance, deleted=True))
+
+
+@receiver(post_save, sender=Book)
+def index_book_save(sender, instance, **kwargs):
+    """Update this process's title index once the write commits."""
+    serial_number, title, author = (
+        instance.serial_number,
+        instance.title,
+        instance.author,
+    )
+    on_commit(lambda: suggester.apply(serial_number, title, author))
+
+
+@receiver(post_delete, sender=Book)
+def index_book_delete(sender, instance, **kwargs):
+    """Remove a deleted book from this process's title index."""
+    if instance.withdrawn_at:
+        return
+    serial_number = instance.serial_number
+    on_commit(lambda: suggester.apply(serial_number))
+
+
+@receiver(pre_delete, sender=Reader)
+def record_returns_on_reader_delete(sender, instance, **kwargs):
+    """When a Reader is deleted, log the implicit return of their borrowed books.
+
+    The borrower is cleared with a bulk UPDATE that sends no signals, so the
+    change feed entries, availability events and circulation counters for
+    those books are updated here as well.
+    """
+    serial_numbers = list(
+        Book.objects.filter(borrower=instance).values_list("serial_number", flat=True)
+    )
+    for serial_number in serial_numbers:
+        record_loan_event(serial_number, instance.serial_number, LoanEvent.RETURN)
+    record_changes(serial_numbers, BookChange.UPDATE)
+    adjust_counters(borrowed=-len(serial_numbers))
+    for serial_number in serial_numbers:
+        publish_on_commit({"serial_number": serial_number, "status": "available"})
 
 
 @receiver(post_delete, sender=Reader)
@@ -11,5 +91,5 @@ def clear_borrow_date_on_reader_delete(sender, instance, **kwargs):
     This ONLY handles the specific case of Reader deletion.
     """
     Book.objects.filter(borrower__isnull=True, borrow_date__isnull=False).update(
-        borrow_date=None
+        borrow_date=None, due_date=None
     )
@@ -0,0 +1,212 @@
+import gzip
+import json
+
+from django.core.management.color import no_style
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import changefeed, stats
+from .branches import atomic, connection
+from .models import Book, BookChange, Reader, Reservation
+from .pgcopy import copy_rows
+from .services import reconcile_loan_counters
+
+FORMAT = "library-snapshot"
+VERSION = 2
+# Columns of each record type, the first one is the keyset pagination key
+COLUMNS = {
+    "reader": ["id", "serial_number", "loan_limit"],
+    "book": [
+        "serial_number",
+        "title",
+        "author",
+        "borrower_id",
+        "borrow_date",
+        "due_date",
+    ],
+    "reservation": ["id", "book_id", "reader_id", "created_at"],
+}
+MODELS = {"reader": Reader, "book": Book, "reservation": Reservation}
+DATETIME_COLUMNS = {"borrow_date", "due_date", "created_at"}
+
+
+class SnapshotError(Exception):
+    """The file is not a snapshot this version can restore."""
+
+
+def _chunks(model, columns, chunk_size):
+    """Read all rows of the model in primary key order, chunk_size at a time."""
+    rows = model.objects.order_by(columns[0]).values_list(*columns)
+    last = None
+    while True:
+        page = rows if last is None else rows.filter(**{f"{columns[0]}__gt": last})
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1][0]
+
+
+def _encode(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def snapshot(path, chunk_size=10000, progress=None):
+    """
+    Write the readers, books with their loans, and hold queues to a gzipped
+    JSON Lines file.
+
+    The first line is a header, every other line one [type, *columns] record.
+    All rows are read in one transaction (REPEATABLE READ on PostgreSQL), so
+    the snapshot is consistent, in keyset-paginated chunks, so memory stays
+    bounded. progress(type, rows written so far) is called after each chunk,
+    inside that transaction, which is read-only on PostgreSQL.
+
+    Returns the number of rows written per type.
+    """
+    counts = {}
+    with atomic(), gzip.open(path, "wt", compresslevel=6) as f:
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"
+                )
+        header = {
+            "format": FORMAT,
+            "version": VERSION,
+            "created_at": timezone.now().isoformat(),
+            "columns": COLUMNS,
+        }
+        f.write(json.dumps(header) + "\n")
+        for kind, columns in COLUMNS.items():
+            counts[kind] = 0
+            for chunk in _chunks(MODELS[kind], columns, chunk_size):
+                f.writelines(
+                    json.dumps([kind, *map(_encode, row)]) + "\n" for row in chunk
+                )
+                counts[kind] += len(chunk)
+                if progress:
+                    progress(kind, counts[kind])
+    return counts
+
+
+def _read_header(f):
+    try:
+        header = json.loads(f.readline())
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise SnapshotError("Not a library snapshot.")
+    if header.get("version") != VERSION or header.get("columns") != COLUMNS:
+        raise SnapshotError(
+            f"Unsupported snapshot version {header.get('version')}, "
+            f"expected {VERSION}."
+        )
+    return header
+
+
+def _secondary_indexes(table):
+    """Definitions of the PostgreSQL indexes of the table not backing a constraint."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT i.relname, pg_get_indexdef(i.oid)
+            FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+            WHERE x.indrelid = %s::regclass
+            AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.oid)
+            """,
+            [table],
+        )
+        return cursor.fetchall()
+
+
+def _load(kind, rows):
+    model = MODELS[kind]
+    columns = COLUMNS[kind]
+    if connection.vendor == "postgresql":
+        copy_rows(model._meta.db_table, columns, rows)
+    else:
+        objects = [
+            model(
+                **{
+                    column: (
+                        parse_datetime(value)
+                        if column in DATETIME_COLUMNS and value
+                        else value
+                    )
+                    for column, value in zip(columns, row)
+                }
+            )
+            for row in rows
+        ]
+        model.objects.bulk_create(objects)
+        if kind == "reservation":
+            # bulk_create stamps created_at (auto_now_add) with the current
+            # time, put back the times that order the hold queues
+            for reservation, row in zip(objects, rows):
+                reservation.created_at = parse_datetime(row[3])
+            model.objects.bulk_update(objects, ["created_at"])
+    if kind == "book":
+        changefeed.record_changes([row[0] for row in rows], BookChange.CREATE)
+
+
+def _record_chunks(f, chunk_size):
+    """Group consecutive records of the same type into chunks of rows."""
+    kind, rows = None, []
+    for line in f:
+        record = json.loads(line)
+        if record[0] != kind or len(rows) >= chunk_size:
+            if rows:
+                yield kind, rows
+            kind, rows = record[0], []
+            if kind not in COLUMNS:
+                raise SnapshotError(f"Unknown record type '{kind}'.")
+        rows.append(record[1:])
+    if rows:
+        yield kind, rows
+
+
+def restore(path, chunk_size=10000, progress=None):
+    """
+    Replace all readers, books and reservations with the snapshot's.
+
+    Rows are loaded in chunks with COPY on PostgreSQL, where the secondary
+    indexes are dropped during the load and rebuilt once at the end, and
+    with bulk_create elsewhere. Derived data is rebuilt afterwards: the
+    readers' loan counters, the circulation summaries, and the change feed,
+    which restarts so existing cursors expire. Model signals are not sent.
+
+    Raises SnapshotError if the file is not a compatible snapshot.
+    Returns the number of rows restored per type.
+    """
+    counts = {kind: 0 for kind in COLUMNS}
+    with gzip.open(path, "rt") as f, atomic():
+        _read_header(f)
+        tables = [model._meta.db_table for model in (Reservation, Book, Reader)]
+        connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables))
+        changefeed.restart()
+
+        indexes = []
+        if connection.vendor == "postgresql":
+            for table in tables:
+                indexes += _secondary_indexes(table)
+            with connection.cursor() as cursor:
+                for name, _ in indexes:
+                    cursor.execute(f'DROP INDEX "{name}"')
+
+        for kind, rows in _record_chunks(f, chunk_size):
+            _load(kind, rows)
+            counts[kind] += len(rows)
+            if progress:
+                progress(kind, counts[kind])
+
+        with connection.cursor() as cursor:
+            for _, definition in indexes:
+                cursor.execute(definition)
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [Reader, Reservation]
+            ):
+                cursor.execute(sql)
+        reconcile_loan_counters()
+        stats.rebuild()
+    return counts
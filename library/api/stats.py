@@ -0,0 +1,159 @@
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from .branches import atomic, connection
+from .models import AuthorLoanCount, Book, CirculationCounter, LoanEvent
+
+
+def _bump(name, delta):
+    shard = random.randrange(settings.STATS_COUNTER_SHARDS)
+    counter = CirculationCounter.objects.filter(name=name, shard=shard)
+    if not counter.update(value=F("value") + delta):
+        CirculationCounter.objects.bulk_create(
+            [CirculationCounter(name=name, shard=shard)], ignore_conflicts=True
+        )
+        counter.update(value=F("value") + delta)
+
+
+def adjust_counters(total=0, borrowed=0):
+    """
+    Apply deltas to the circulation counters in the current transaction.
+    """
+    if total:
+        _bump(CirculationCounter.TOTAL, total)
+    if borrowed:
+        _bump(CirculationCounter.BORROWED, borrowed)
+
+
+def record_author_loan(author, loans=1):
+    """
+    Count new loans of a book by the author.
+    """
+    counter = AuthorLoanCount.objects.filter(author=author)
+    if not counter.update(loans=F("loans") + loans):
+        AuthorLoanCount.objects.bulk_create(
+            [AuthorLoanCount(author=author)], ignore_conflicts=True
+        )
+        counter.update(loans=F("loans") + loans)
+
+
+def get_counters():
+    """
+    Return the total, borrowed and available book counts.
+
+    Sums a handful of counter shards instead of counting books.
+    """
+    sums = dict(
+        CirculationCounter.objects.values("name")
+        .annotate(total=Sum("value"))
+        .values_list("name", "total")
+    )
+    total = sums.get(CirculationCounter.TOTAL, 0)
+    borrowed = sums.get(CirculationCounter.BORROWED, 0)
+    return {"total": total, "borrowed": borrowed, "available": total - borrowed}
+
+
+def get_overdue_loans(days):
+    """
+    Retrieve books borrowed more than the given number of days ago.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    return Book.objects.select_related("borrower").filter(borrow_date__lt=cutoff)
+
+
+def count_loans_between(start=None, end=None):
+    """
+    Count current loans that started within [start, end).
+    """
+    loans = Book.objects.filter(borrow_date__isnull=False)
+    if start:
+        loans = loans.filter(borrow_date__gte=start)
+    if end:
+        loans = loans.filter(borrow_date__lt=end)
+    return loans.count()
+
+
+def _count_from_scratch():
+    counters = {
+        CirculationCounter.TOTAL: Book.objects.count(),
+        CirculationCounter.BORROWED: Book.objects.filter(
+            borrower__isnull=False
+        ).count(),
+    }
+    # Loans of books that were deleted since can no longer be attributed
+    author = Book.objects.filter(serial_number=OuterRef("book_serial_number"))
+    authors = dict(
+        LoanEvent.objects.filter(event=LoanEvent.BORROW)
+        .annotate(author=Subquery(author.values("author")[:1]))
+        .filter(author__isnull=False)
+        .values("author")
+        .annotate(loans=Count("pk"))
+        .values_list("author", "loans")
+    )
+    return counters, authors
+
+
+def _lock_summaries(mode):
+    """
+    Lock the summary tables until the transaction ends (PostgreSQL only).
+
+    Waits for transactions that already bumped a summary to commit, so the
+    counts that follow include their changes, and holds back new bumps,
+    which then apply on top of the rebuilt values. SQLite has a single
+    writer at a time anyway.
+    """
+    if connection.vendor != "postgresql":
+        return
+    tables = ", ".join(
+        connection.ops.quote_name(model._meta.db_table)
+        for model in (CirculationCounter, AuthorLoanCount)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {tables} IN {mode} MODE")
+
+
+def rebuild(verify_only=False):
+    """
+    Recompute the circulation counters and author loan counts from scratch.
+
+    Safe to run on a live system: loans and returns wait for the rebuild's
+    transaction instead of bumping counters it is about to replace.
+
+    Returns a list of (name, stored, actual) tuples for every summary that
+    differed. With verify_only, nothing is written.
+    """
+    with atomic():
+        _lock_summaries("SHARE" if verify_only else "EXCLUSIVE")
+        counters, authors = _count_from_scratch()
+        stored_counters = get_counters()
+        stored_authors = dict(AuthorLoanCount.objects.values_list("author", "loans"))
+        mismatches = [
+            (name, stored_counters[name], actual)
+            for name, actual in counters.items()
+            if stored_counters[name] != actual
+        ]
+        mismatches += [
+            (f"author:{author}", stored_authors.get(author, 0), authors.get(author, 0))
+            for author in sorted(set(stored_authors) | set(authors))
+            if stored_authors.get(author, 0) != authors.get(author, 0)
+        ]
+        if verify_only:
+            return mismatches
+
+        CirculationCounter.objects.all().delete()
+        CirculationCounter.objects.bulk_create(
+            [
+                CirculationCounter(name=name, shard=0, value=value)
+                for name, value in counters.items()
+            ]
+        )
+        AuthorLoanCount.objects.all().delete()
+        AuthorLoanCount.objects.bulk_create(
+            [AuthorLoanCount(author=a, loans=n) for a, n in authors.items()],
+            batch_size=1000,
+        )
+    return mismatches
@@ -0,0 +1,301 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max
+
+from .branches import current_branch, use_branch
+from .changefeed import CursorExpired, get_changes
+from .models import Book, BookChange
+
+logger = logging.getLogger(__name__)
+
+# Separates the indexed term from the serial number in an entry, sorts
+# before any character a term can contain
+SEPARATOR = "\0"
+
+
+def normalize(text):
+    return " ".join(text.replace(SEPARATOR, "").casefold().split())
+
+
+class PrefixIndex:
+    """
+    Sorted array of "term\\0serial_number" entries searched with bisect.
+
+    Every title and author is indexed from the start of each of its words,
+    so "pott" finds "Harry Potter". Entries with a common prefix are
+    contiguous, so a lookup is one binary search plus a scan of the matches.
+    Not thread-safe.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._books = {}
+
+    @staticmethod
+    def terms(title, author):
+        terms = set()
+        for text in (title, author):
+            words = normalize(text).split()
+            terms.update(" ".join(words[i:]) for i in range(len(words)))
+        return terms
+
+    @classmethod
+    def build(cls, books):
+        """Build an index from (serial_number, title, author) tuples."""
+        index = cls()
+        for serial_number, title, author in books:
+            index._books[serial_number] = (title, author)
+            index._entries.extend(
+                f"{term}{SEPARATOR}{serial_number}" for term in cls.terms(title, author)
+            )
+        index._entries.sort()
+        return index
+
+    def add(self, serial_number, title, author):
+        if self._books.get(serial_number) == (title, author):
+            return
+        self.remove(serial_number)
+        self._books[serial_number] = (title, author)
+        for term in self.terms(title, author):
+            insort(self._entries, f"{term}{SEPARATOR}{serial_number}")
+
+    def remove(self, serial_number):
+        book = self._books.pop(serial_number, None)
+        if book is None:
+            return
+        for term in self.terms(*book):
+            entry = f"{term}{SEPARATOR}{serial_number}"
+            i = bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+
+    def search(self, prefix, limit):
+        """Return up to limit (serial_number, title, author) matching the prefix."""
+        prefix = normalize(prefix)
+        results = []
+        seen = set()
+        i = bisect_left(self._entries, prefix)
+        while i < len(self._entries) and len(results) < limit:
+            entry = self._entries[i]
+            if not entry.startswith(prefix):
+                break
+            serial_number = entry.rsplit(SEPARATOR, 1)[1]
+            if serial_number not in seen:
+                seen.add(serial_number)
+                results.append((serial_number, *self._books[serial_number]))
+            i += 1
+        return results
+
+    def __len__(self):
+        return len(self._books)
+
+    @property
+    def entry_count(self):
+        return len(self._entries)
+
+
+class IndexNotReady(Exception):
+    """The index is still being built."""
+
+
+class TitleSuggester:
+    """
+    Per-process prefix index over one branch's book titles and authors.
+
+    The index is built from the database on a background thread, started by
+    start() when the worker starts or else by the first lookup; lookups raise
+    IndexNotReady until it is built. Writes made through this process are
+    applied as soon as they commit (see signals); every
+    SUGGEST["REFRESH_INTERVAL"] seconds the book change feed is replayed from
+    where the index left off, which picks up writes of other processes and
+    bulk writes that send no signals. Every SUGGEST["CHECK_INTERVAL"] seconds
+    the number of indexed books is compared with the database and the index
+    is rebuilt in the background if they differ.
+    """
+
+    def __init__(self, branch=None):
+        self.branch = branch or settings.DEFAULT_BRANCH
+        self.reset()
+
+    def reset(self):
+        """Drop the index, it's rebuilt on next use."""
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._builder = None
+        self._index = None
+        self._cursor = 0
+        self._refreshed_at = 0.0
+        self._checked_at = 0.0
+
+    @property
+    def loaded(self):
+        return self._index is not None and self._pid == os.getpid()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # Forked worker, don't share the parent's locks, index or thread
+            self.reset()
+
+    def start(self):
+        """Build the index on a background thread, unless one is building it."""
+        self._check_fork()
+        with self._lock:
+            if self._builder is not None and self._builder.is_alive():
+                return
+            self._builder = threading.Thread(
+                target=self._build,
+                name=f"title-index-{self.branch}",
+                daemon=True,
+            )
+            self._builder.start()
+
+    def wait(self, timeout=None):
+        """Wait until the background build, if any, is done."""
+        builder = self._builder
+        if builder is not None:
+            builder.join(timeout)
+
+    def _build(self):
+        try:
+            with use_branch(self.branch):
+                self.rebuild()
+        except Exception:
+            logger.exception("Failed to build the title index of %s", self.branch)
+        finally:
+            connections.close_all()
+
+    def suggest(self, prefix, limit):
+        """
+        Return up to limit (serial_number, title, author) matching the prefix;
+        raise IndexNotReady while the index is being built.
+        """
+        self._check_fork()
+        if self._index is None:
+            self.start()
+            raise IndexNotReady(f"The title index of {self.branch} is being built.")
+        self._refresh()
+        with self._lock:
+            return self._index.search(prefix, limit)
+
+    def apply(self, serial_number, title=None, author=None):
+        """Apply a committed write, a book without title was deleted."""
+        if not self.loaded:
+            return
+        with self._lock:
+            if title is None:
+                self._index.remove(serial_number)
+            else:
+                self._index.add(serial_number, title, author)
+
+    def rebuild(self):
+        """Build the index in this thread and replace the current one."""
+        # Changes committed while the books are read are replayed afterwards
+        cursor = BookChange.objects.aggregate(last=Max("pk"))["last"] or 0
+        index = PrefixIndex.build(
+            Book.objects.values_list("serial_number", "title", "author").iterator(
+                chunk_size=10000
+            )
+        )
+        now = time.monotonic()
+        with self._lock:
+            self._index = index
+            self._cursor = cursor
+            self._refreshed_at = self._checked_at = now
+        logger.info(
+            "Built title index of %d books, %d entries", len(index), index.entry_count
+        )
+
+    def _refresh(self):
+        config = settings.SUGGEST
+        now = time.monotonic()
+        if now - self._refreshed_at < config["REFRESH_INTERVAL"]:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            # Another thread is refreshing, serve what is indexed
+            return
+        self._refreshed_at = now
+        try:
+            if now - self._checked_at >= config["CHECK_INTERVAL"]:
+                self._checked_at = now
+                if Book.objects.count() != len(self._index):
+                    logger.warning("Title index is out of sync, rebuilding it")
+                    self.start()
+                    return
+            self._catch_up()
+        except CursorExpired:
+            self.start()
+        finally:
+            self._refresh_lock.release()
+
+    def _catch_up(self, batch_size=1000):
+        while True:
+            changes, books = get_changes(self._cursor, batch_size)
+            with self._lock:
+                for change in changes:
+                    book = books.get(change.serial_number)
+                    if book is None:
+                        self._index.remove(change.serial_number)
+                    else:
+                        self._index.add(book.serial_number, book.title, book.author)
+                if changes:
+                    self._cursor = changes[-1].pk
+            if len(changes) < batch_size:
+                return
+
+
+class BranchSuggester:
+    """
+    One TitleSuggester per branch, the current branch's one serves each call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suggesters = {}
+
+    def _get(self, branch):
+        suggester = self._suggesters.get(branch)
+        if suggester is None:
+            with self._lock:
+                suggester = self._suggesters.setdefault(branch, TitleSuggester(branch))
+        return suggester
+
+    def _current(self):
+        return self._get(current_branch())
+
+    def start(self):
+        """Build the index of every branch, each on a background thread."""
+        for branch in settings.BRANCHES:
+            self._get(branch).start()
+
+    def wait(self, timeout=None):
+        """Wait until the background builds are done."""
+        for suggester in list(self._suggesters.values()):
+            suggester.wait(timeout)
+
+    def reset(self):
+        """Drop the index of every branch."""
+        for suggester in list(self._suggesters.values()):
+            suggester.reset()
+
+    @property
+    def loaded(self):
+        return self._current().loaded
+
+    def suggest(self, prefix, limit):
+        return self._current().suggest(prefix, limit)
+
+    def apply(self, serial_number, title=None, author=None):
+        self._current().apply(serial_number, title, author)
+
+    def rebuild(self):
+        self._current().rebuild()
+
+
+suggester = BranchSuggester()
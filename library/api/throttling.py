@@ -0,0 +1,141 @@
+import mmap
+import multiprocessing
+import struct
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+
+def _take(tokens, updated_at, now, cost, rate, capacity):
+    """
+    Refill a token bucket up to now and try to take cost tokens from it.
+
+    Returns the remaining tokens, whether the request is allowed and how many
+    seconds to wait before it would be.
+    """
+    if updated_at == 0:
+        tokens = capacity
+    else:
+        tokens = min(capacity, tokens + max(0.0, now - updated_at) * rate)
+    if tokens >= cost:
+        return tokens - cost, True, 0.0
+    return tokens, False, (cost - tokens) / rate
+
+
+class SharedMemoryBucketStore:
+    """
+    Token buckets in an anonymous shared memory map.
+
+    The map and its locks are inherited by forked processes, so when the
+    store is created before gunicorn forks (preload), all workers on a host
+    share one set of buckets. Clients are hashed into a fixed number of slots,
+    which keeps memory bounded at the cost of rare collisions.
+    """
+
+    SLOT = struct.Struct("dd")  # tokens, updated_at
+
+    def __init__(self, slots=65536, lock_stripes=64):
+        self.slots = slots
+        self.memory = mmap.mmap(-1, slots * self.SLOT.size)
+        self.locks = [multiprocessing.Lock() for _ in range(lock_stripes)]
+
+    def consume(self, key, cost, rate, capacity):
+        slot = zlib.crc32(key.encode()) % self.slots
+        offset = slot * self.SLOT.size
+        with self.locks[slot % len(self.locks)]:
+            tokens, updated_at = self.SLOT.unpack_from(self.memory, offset)
+            now = time.time()
+            tokens, allowed, wait = _take(tokens, updated_at, now, cost, rate, capacity)
+            self.SLOT.pack_into(self.memory, offset, tokens, now)
+        return allowed, wait
+
+
+class CacheBucketStore:
+    """
+    Token buckets in a Django cache, shared by every process using the cache.
+
+    Updates are serialized per client with a short-lived lock key taken with
+    cache.add(). If the lock can't be taken in time the request is allowed,
+    so a slow cache degrades to no limiting rather than to errors.
+    """
+
+    LOCK_ATTEMPTS = 20
+    LOCK_RETRY_DELAY = 0.001
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+
+    def consume(self, key, cost, rate, capacity):
+        cache = caches[self.alias]
+        lock_key = f"{key}:lock"
+        for _ in range(self.LOCK_ATTEMPTS):
+            if cache.add(lock_key, 1, timeout=1):
+                break
+            time.sleep(self.LOCK_RETRY_DELAY)
+        else:
+            return True, 0.0
+        try:
+            tokens, updated_at = cache.get(key, (0.0, 0.0))
+            now = time.time()
+            tokens, allowed, wait = _take(tokens, updated_at, now, cost, rate, capacity)
+            cache.set(key, (tokens, now), timeout=int(capacity / rate) + 1)
+        finally:
+            cache.delete(lock_key)
+        return allowed, wait
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_bucket_store():
+    """
+    Return the bucket store configured in RATE_LIMIT, creating it once.
+    """
+    config = settings.RATE_LIMIT
+    options = config.get("OPTIONS", {})
+    store_key = (config["BACKEND"], tuple(sorted(options.items())))
+    with _stores_lock:
+        if store_key not in _stores:
+            _stores[store_key] = import_string(config["BACKEND"])(**options)
+        return _stores[store_key]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Per-client token bucket rate limiting.
+
+    Each client (user, or IP address for anonymous requests) gets a bucket of
+    RATE_LIMIT["BURST"] tokens refilled at RATE_LIMIT["RATE"] tokens per
+    second. Views can charge expensive actions more through a
+    throttle_costs mapping of action (or HTTP method) name to cost.
+    """
+
+    def get_cache_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"ratelimit:user:{request.user.pk}"
+        return f"ratelimit:ip:{self.get_ident(request)}"
+
+    def get_cost(self, request, view):
+        costs = getattr(view, "throttle_costs", {})
+        action = getattr(view, "action", None) or request.method.lower()
+        return costs.get(action, 1)
+
+    def allow_request(self, request, view):
+        config = settings.RATE_LIMIT
+        if not config["ENABLED"]:
+            return True
+        capacity = config["BURST"]
+        cost = min(self.get_cost(request, view), capacity)
+        allowed, self.wait_seconds = get_bucket_store().consume(
+            self.get_cache_key(request), cost, config["RATE"], capacity
+        )
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,387 @@
+import atexit
+import functools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = "traceparent"
+TRACERESPONSE_HEADER = "traceresponse"
+
+_TRACEPARENT = re.compile(r"([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+
+# The innermost open span of the sampled trace being served, None otherwise
+_current_span = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(value):
+    """
+    (trace id, parent span id, sampled) of a W3C traceparent header value,
+    or None if it is malformed.
+    """
+    value = value.strip()
+    match = _TRACEPARENT.match(value)
+    if not match:
+        return None
+    version, trace_id, parent_id, flags = match.groups()
+    rest = value[match.end() :]
+    if (
+        version == "ff"
+        or (version == "00" and rest)
+        or (rest and not rest.startswith("-"))
+        or trace_id == "0" * 32
+        or parent_id == "0" * 16
+    ):
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+def format_traceparent(trace_id, span_id, sampled=True):
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+
+def new_id(bits):
+    """A random non-zero id of bits bits, in hex."""
+    return f"{random.getrandbits(bits) or 1:0{bits // 4}x}"
+
+
+def should_sample(trace_id, parent_sampled=None):
+    """
+    Whether to record the trace. With PARENT_BASED the caller's decision in
+    traceparent is followed; otherwise SAMPLE_RATE of the traces are kept,
+    picked by trace id so every service keeping that rate keeps the same
+    traces.
+    """
+    config = settings.TRACING
+    if parent_sampled is not None and config["PARENT_BASED"]:
+        return parent_sampled
+    return int(trace_id[16:], 16) < config["SAMPLE_RATE"] * 2**64
+
+
+class Span:
+    """A timed operation of a trace; spans nest by parent_id."""
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "attributes",
+        "status",
+        "start_time",
+        "_started",
+        "duration",
+    )
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_id(64)
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.status = "ok"
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def end(self):
+        self.duration = time.perf_counter() - self._started
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": round(self.start_time, 6),
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+def current_span():
+    """The innermost open span, or None outside a sampled trace."""
+    return _current_span.get()
+
+
+@contextmanager
+def start_trace(name, trace_id=None, parent_id=None, attributes=None):
+    """
+    Open the root span of a sampled trace, continuing trace_id when given.
+    """
+    root = Span(name, trace_id or new_id(128), parent_id, attributes)
+    with _enter(root):
+        yield root
+
+
+@contextmanager
+def span(name, attributes=None):
+    """
+    Time the block as a child of the current span; yields the span, or
+    None outside a sampled trace, where nothing is recorded.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    with _enter(Span(name, parent.trace_id, parent.span_id, attributes)) as child:
+        yield child
+
+
+@contextmanager
+def _enter(span):
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "error"
+        span.attributes["error.type"] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+        get_exporter().export(span)
+
+
+def traced(name):
+    """Decorator running the function in a span; free outside a trace."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return function(*args, **kwargs)
+            with span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def traced_methods(cls):
+    """Class decorator tracing every public method of cls as "Class.method"."""
+    for name, attribute in list(vars(cls).items()):
+        if name.startswith("_"):
+            continue
+        label = f"{cls.__name__}.{name}"
+        if isinstance(attribute, (staticmethod, classmethod)):
+            wrapped = type(attribute)(traced(label)(attribute.__func__))
+        elif callable(attribute):
+            wrapped = traced(label)(attribute)
+        else:
+            continue
+        setattr(cls, name, wrapped)
+    return cls
+
+
+def trace_sql(execute, sql, params, many, context):
+    """Database execute wrapper recording each statement as a span."""
+    if _current_span.get() is None:
+        return execute(sql, params, many, context)
+    connection = context["connection"]
+    attributes = {
+        "db.system": connection.vendor,
+        "db.alias": connection.alias,
+        "db.statement": sql,
+    }
+    if many:
+        attributes["db.executemany"] = True
+    with span("sql", attributes):
+        return execute(sql, params, many, context)
+
+
+_instrumented = False
+
+
+def instrument_drf():
+    """
+    Trace is_valid() and data of every serializer, and response rendering.
+
+    Patches Django REST framework's base classes once, so each call costs a
+    context variable lookup outside a sampled trace.
+    """
+    global _instrumented
+    if _instrumented:
+        return
+    _instrumented = True
+    from rest_framework.response import Response
+    from rest_framework.serializers import BaseSerializer, ListSerializer, Serializer
+
+    def label(serializer):
+        if isinstance(serializer, ListSerializer):
+            return f"{type(serializer.child).__name__}(many=True)"
+        return type(serializer).__name__
+
+    def traced_is_valid(is_valid):
+        @functools.wraps(is_valid)
+        def wrapper(self, *args, **kwargs):
+            if _current_span.get() is None:
+                return is_valid(self, *args, **kwargs)
+            with span(f"{label(self)}.is_valid"):
+                return is_valid(self, *args, **kwargs)
+
+        return wrapper
+
+    def traced_property(prop, name):
+        @functools.wraps(prop.fget)
+        def getter(self):
+            if _current_span.get() is None:
+                return prop.fget(self)
+            with span(name(self)):
+                return prop.fget(self)
+
+        return property(getter)
+
+    BaseSerializer.is_valid = traced_is_valid(BaseSerializer.is_valid)
+    ListSerializer.is_valid = traced_is_valid(ListSerializer.is_valid)
+    for cls in (Serializer, ListSerializer):
+        cls.data = traced_property(cls.data, lambda self: f"{label(self)}.data")
+    Response.rendered_content = traced_property(
+        Response.rendered_content, lambda self: "render"
+    )
+
+
+class SpanExporter:
+    """
+    Destination of finished spans, set by TRACING["EXPORTER"].
+
+    export() is called on the request thread as each span ends and must not
+    block on I/O.
+    """
+
+    def export(self, span):
+        raise NotImplementedError
+
+    def flush(self):
+        """Deliver the spans still held back."""
+
+
+class BatchExporter(SpanExporter):
+    """
+    Queues spans in memory and hands them to write() from a background
+    thread, every flush_interval seconds or as soon as batch_size are
+    waiting. Spans arriving while max_queue_size are waiting are dropped
+    and counted in dropped; a flush_interval of 0 writes each full batch
+    on the request thread instead, for tests.
+    """
+
+    def __init__(self, batch_size=512, flush_interval=1.0, max_queue_size=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.dropped = 0
+        self._reset()
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._spans = []
+        self._wakeup = threading.Event()
+        self._flusher = None
+
+    def export(self, span):
+        if self._pid != os.getpid():
+            # Forked worker, don't share the parent's queue or thread
+            self._reset()
+        with self._lock:
+            if len(self._spans) >= self.max_queue_size:
+                self.dropped += 1
+                return
+            self._spans.append(span)
+            full = len(self._spans) >= self.batch_size
+        if self.flush_interval <= 0:
+            if full:
+                self.flush()
+            return
+        self._ensure_flusher()
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            spans, self._spans = self._spans, []
+        for start in range(0, len(spans), self.batch_size):
+            self.write([s.to_dict() for s in spans[start : start + self.batch_size]])
+
+    def write(self, spans):
+        """Deliver a batch of spans, as dicts."""
+        raise NotImplementedError
+
+    def _ensure_flusher(self):
+        with self._lock:
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(
+                    target=self._run_flusher, name="span-exporter", daemon=True
+                )
+                self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to export spans")
+
+
+class JsonLinesExporter(BatchExporter):
+    """
+    Appends spans to a file, one JSON object per line.
+
+    Each batch is written with a single append, so the workers of a host
+    can share the file without interleaving their lines.
+    """
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def write(self, spans):
+        data = "".join(json.dumps(s, default=str) + "\n" for s in spans).encode()
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter():
+    """Return the exporter configured in TRACING["EXPORTER"], creating it once."""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            config = settings.TRACING["EXPORTER"]
+            _exporter = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+        return _exporter
+
+
+@receiver(setting_changed)
+def _reset_exporter(setting, **kwargs):
+    global _exporter
+    if setting == "TRACING":
+        with _exporter_lock:
+            if _exporter is not None:
+                _exporter.flush()
+            _exporter = None
@@ -1,13 +1,46 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ReaderCreateAPIView, BookViewSet
+from .views import (
+    ArchivedBookListAPIView,
+    BatchAPIView,
+    ReaderListCreateAPIView,
+    ReaderDetailAPIView,
+    ReaderBooksAPIView,
+    ReaderHistoryAPIView,
+    BookViewSet,
+    JobDetailAPIView,
+    StatsViewSet,
+    book_events,
+)
 
-# Create a router and register the ViewSet
+# Create a router and register the ViewSets
 router = DefaultRouter()
 router.register(r"books", BookViewSet, basename="book")
+router.register(r"stats", StatsViewSet, basename="stats")
 
 # The API URLs are determined automatically by the router
 urlpatterns = [
-    path("readers/", ReaderCreateAPIView.as_view(), name="reader-create"),
+    path("readers/", ReaderListCreateAPIView.as_view(), name="reader-create"),
+    path(
+        "readers/<str:serial_number>/",
+        ReaderDetailAPIView.as_view(),
+        name="reader-detail",
+    ),
+    path(
+        "readers/<str:serial_number>/books/",
+        ReaderBooksAPIView.as_view(),
+        name="reader-books",
+    ),
+    path(
+        "readers/<str:serial_number>/history/",
+        ReaderHistoryAPIView.as_view(),
+        name="reader-history",
+    ),
+    path("books/events/", book_events, name="book-events"),
+    path(
+        "archive/books/", ArchivedBookListAPIView.as_view(), name="archived-book-list"
+    ),
+    path("batch/", BatchAPIView.as_view(), name="batch"),
+    path("jobs/<int:pk>/", JobDetailAPIView.as_view(), name="job-detail"),
     path("", include(router.urls)),
 ]
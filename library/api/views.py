@@ -1,29 +1,79 @@
+import os
+
 from rest_framework import status, viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.db import transaction
-from rest_framework.exceptions import NotFound
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ParseError
 
+from .branches import atomic, current_branch
+from .models import AuthorLoanCount, Book, Job, Reader
 from .serializers import (
+    ArchivedBookSerializer,
+    AuthorLoanCountSerializer,
+    BatchSerializer,
     ReaderCreateSerializer,
+    ReaderLoanSerializer,
+    ReaderLoansSerializer,
+    ReaderSerializer,
     BookSerializer,
     BookStatusSerializer,
+    BookChangeSerializer,
     BookListSerializer,
+    JobSerializer,
+    LoanEventSerializer,
+    ReservationSerializer,
+)
+from .archive import get_archived_books
+from .batch import BatchOperation, run_batch
+from .changefeed import CursorExpired, get_changes
+from .events import get_broker, stream_events
+from .idempotency import idempotent
+from .jobs import enqueue
+from .loan_log import get_book_history, get_reader_history
+from .pooling import get_pool_stats
+from .pagination import (
+    ArchivedBookPagination,
+    LoanHistoryPagination,
+    OverdueLoanPagination,
+    ReaderLoanPagination,
+    ReaderPagination,
 )
-from .services import BookService
+from . import stats
+from .services import (
+    BookService,
+    ReservationService,
+    get_reader,
+    get_reader_loans,
+    get_readers,
+)
+from .suggest import IndexNotReady, suggester
+from .validators import six_number_digits_validator
 
 
-class ReaderCreateAPIView(APIView):
+class ReaderListCreateAPIView(APIView):
     """
-    API view for creating a single reader with a serial number.
+    API view for listing readers and creating a single reader with a serial number.
     """
 
+    def get(self, request):
+        """GET readers with their current loans, by serial number"""
+        paginator = ReaderPagination()
+        page = paginator.paginate_queryset(get_readers(), request, view=self)
+        return paginator.get_paginated_response(ReaderSerializer(page, many=True).data)
+
+    @idempotent
     def post(self, request):
         """POST to create a new reader with autogen serial number (if not provided)"""
         serializer = ReaderCreateSerializer(data=request.data)
         if serializer.is_valid():
-            with transaction.atomic():
+            with atomic():
                 reader = serializer.save()
             return Response(
                 {"serial_number": reader.serial_number},
@@ -35,6 +85,171 @@ class ReaderCreateAPIView(APIView):
         )
 
 
+class ReaderDetailAPIView(APIView):
+    """
+    API view for retrieving a reader with their current loans.
+    """
+
+    def get(self, request, serial_number):
+        """GET the reader by serial number"""
+        reader = get_reader(serial_number)
+        if reader is None:
+            raise NotFound(f"Reader with serial number {serial_number} not found")
+        return Response(ReaderSerializer(reader).data)
+
+
+class ReaderBooksAPIView(APIView):
+    """
+    API view for listing the books a reader currently has borrowed.
+    """
+
+    def get(self, request, serial_number):
+        """GET the reader's current loans, oldest loan first"""
+        reader = Reader.objects.filter(serial_number=serial_number).first()
+        if reader is None:
+            raise NotFound(f"Reader with serial number {serial_number} not found")
+        paginator = ReaderLoanPagination()
+        page = paginator.paginate_queryset(get_reader_loans(reader), request, view=self)
+        return paginator.get_paginated_response(
+            ReaderLoanSerializer(page, many=True).data
+        )
+
+
+class BatchAPIView(APIView):
+    """
+    API view for executing several API operations in one request.
+    """
+
+    batchable = False
+
+    @idempotent
+    def post(self, request):
+        """POST a list of operations, returns one status and body per operation"""
+        serializer = BatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        operations = [
+            BatchOperation(**operation)
+            for operation in serializer.validated_data["operations"]
+        ]
+        results, committed = run_batch(
+            request, operations, atomic=serializer.validated_data["atomic"]
+        )
+        return Response(
+            {
+                "committed": committed,
+                "results": [
+                    {"status": status_code, "body": body}
+                    for status_code, body in results
+                ],
+            }
+        )
+
+
+class JobDetailAPIView(APIView):
+    """
+    API view for following a background job.
+    """
+
+    def get(self, request, pk):
+        """GET the job's status, progress and result"""
+        job = Job.objects.filter(pk=pk).first()
+        if job is None:
+            raise NotFound(f"Job {pk} not found")
+        return Response(JobSerializer(job).data)
+
+
+def accepted(job):
+    """202 response pointing at the status of a queued job"""
+    return Response(
+        JobSerializer(job).data,
+        status=status.HTTP_202_ACCEPTED,
+        headers={"Location": reverse("job-detail", args=[job.pk])},
+    )
+
+
+class ReaderHistoryAPIView(APIView):
+    """
+    API view for listing a reader's borrow and return events.
+    """
+
+    def get(self, request, serial_number):
+        """GET the reader's loan history, newest first"""
+        paginator = LoanHistoryPagination()
+        page = paginator.paginate_queryset(
+            get_reader_history(serial_number), request, view=self
+        )
+        return paginator.get_paginated_response(
+            LoanEventSerializer(page, many=True).data
+        )
+
+
+class ArchivedBookListAPIView(APIView):
+    """
+    API view for querying withdrawn books moved to the archive.
+    """
+
+    def get(self, request):
+        """GET archived books, most recently withdrawn first"""
+        filters = {}
+        serial_number = request.query_params.get("serial_number")
+        if serial_number:
+            try:
+                six_number_digits_validator(serial_number)
+            except ValidationError as e:
+                raise ParseError({"serial_number": e.messages})
+            filters["serial_number"] = serial_number
+        for param in ("withdrawn_after", "withdrawn_before"):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    filters[param] = parse_datetime(value)
+                except ValueError:
+                    # Well formed but impossible, e.g. February 30th
+                    filters[param] = None
+                if filters[param] is None:
+                    raise ParseError(f"{param} must be an ISO 8601 date and time")
+        paginator = ArchivedBookPagination()
+        page = paginator.paginate_queryset(
+            get_archived_books(**filters), request, view=self
+        )
+        return paginator.get_paginated_response(
+            ArchivedBookSerializer(page, many=True).data
+        )
+
+
+async def book_events(request):
+    """
+    Stream book availability changes as Server-Sent Events.
+
+    Subscribes to ?serials=<serial>,<serial> or to all books when omitted,
+    of the request's branch.
+    Only the ASGI application can serve it, where an idle stream costs a
+    suspended coroutine: a WSGI server would drain the endless stream
+    before sending its first byte, holding a worker thread forever.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"detail": "Event streams are only served by the ASGI application."},
+            status=501,
+        )
+    serial_numbers = [sn for sn in request.GET.get("serials", "").split(",") if sn]
+    for serial_number in serial_numbers:
+        try:
+            six_number_digits_validator(serial_number)
+        except ValidationError as e:
+            return JsonResponse({"serials": e.messages}, status=400)
+
+    subscription = get_broker().subscribe(serial_numbers, current_branch())
+    response = StreamingHttpResponse(
+        stream_events(subscription, settings.EVENT_STREAM_HEARTBEAT),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 class BookViewSet(viewsets.ViewSet):
     """
     ViewSet for book operations.
@@ -53,32 +268,99 @@ class BookViewSet(viewsets.ViewSet):
 
     update_status:
     Update a book's borrowing status
+
+    reservations:
+    List the hold queue of a book or place a hold on it
+
+    cancel_reservation:
+    Cancel a reader's hold on a book
+
+    history:
+    Return the borrow and return events of a book
+
+    changes:
+    Return the changes to books after a cursor
+
+    suggest:
+    Return books whose title or author matches a typed prefix
+
+    export:
+    Queue a CSV export of the catalog, returns the job to follow
     """
 
-    def get_object(self, serial_number):
+    # Token bucket cost per action, the list serializes the whole catalog
+    throttle_costs = {"list": 20}
+
+    def get_object(self, serial_number, columns=None):
         """Helper method to get book object or raise 404 if not found"""
-        book = BookService.get_by_serial(serial_number)
+        book = BookService.get_by_serial(serial_number, columns)
         if not book:
             raise NotFound(f"Book with serial number {serial_number} not found")
         return book
 
+    def get_fields(self, request, serializer_class):
+        """Parse the ?fields= sparse fieldset, None if all fields are wanted"""
+        value = request.query_params.get("fields")
+        if value is None:
+            return None
+        fields = [name.strip() for name in value.split(",") if name.strip()]
+        if not fields:
+            raise ParseError("fields must name at least one field")
+        unknown = [name for name in fields if name not in serializer_class.Meta.fields]
+        if unknown:
+            raise ParseError(f"Unknown fields: {', '.join(unknown)}")
+        return fields
+
     def list(self, request):
         """Get a list of all books"""
-        books = BookService.get_all()
-        serializer = BookListSerializer(books, many=True)
+        fields = self.get_fields(request, BookListSerializer)
+        columns = BookListSerializer.get_columns(fields) if fields else None
+        books = BookService.get_all(columns)
+        serializer = BookListSerializer(books, many=True, fields=fields)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        """Get created, updated and deleted books after the ?since= cursor"""
+        config = settings.CHANGE_FEED
+        try:
+            since = int(request.query_params.get("since", 0))
+            limit = int(request.query_params.get("limit", config["PAGE_SIZE"]))
+        except ValueError:
+            raise ParseError("since and limit must be integers")
+        limit = max(1, min(limit, config["MAX_PAGE_SIZE"]))
+
+        try:
+            changes, books = get_changes(since, limit)
+        except CursorExpired:
+            return Response(
+                {"detail": "Cursor has expired, resync from cursor 0."},
+                status=status.HTTP_410_GONE,
+            )
+        return Response(
+            {
+                "results": BookChangeSerializer(
+                    changes, many=True, context={"books": books}
+                ).data,
+                "next_cursor": changes[-1].pk if changes else since,
+                "has_more": len(changes) == limit,
+            }
+        )
+
     def retrieve(self, request, pk=None):
         """Get a specific book by serial number"""
-        book = self.get_object(pk)
-        serializer = BookSerializer(book)
+        fields = self.get_fields(request, BookSerializer)
+        columns = BookSerializer.get_columns(fields) if fields else None
+        book = self.get_object(pk, columns)
+        serializer = BookSerializer(book, fields=fields)
         return Response(serializer.data)
 
+    @idempotent
     def create(self, request):
         """Create a new book"""
         serializer = BookSerializer(data=request.data)
         if serializer.is_valid():
-            with transaction.atomic():
+            with atomic():
                 # Use the data from the serializer to call the service function
                 book = BookService.create_book(
                     serial_number=serializer.validated_data["serial_number"],
@@ -96,17 +378,192 @@ class BookViewSet(viewsets.ViewSet):
         raise NotFound(f"Book with serial number {pk} not found")
 
     @action(detail=True, methods=["patch"])
+    @idempotent
     def status(self, request, pk=None):
         """Update book's borrow status"""
         book = self.get_object(pk)
         serializer = BookStatusSerializer(book, data=request.data, partial=True)
 
         if serializer.is_valid():
-            with transaction.atomic():
-                updated_book = BookService.update_borrow_status(
-                    book=book, borrower=serializer.validated_data.get("borrower")
+            try:
+                with atomic():
+                    updated_book = BookService.update_borrow_status(
+                        book=book, borrower=serializer.validated_data.get("borrower")
+                    )
+            except ValidationError as e:
+                return Response(
+                    {"borrower": e.messages}, status=status.HTTP_400_BAD_REQUEST
                 )
+            except Book.DoesNotExist:
+                raise NotFound(f"Book with serial number {pk} not found")
 
             return Response(BookListSerializer(updated_book).data)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=True, methods=["get", "post"])
+    @idempotent
+    def reservations(self, request, pk=None):
+        """List a book's hold queue or place a hold for a reader"""
+        book = self.get_object(pk)
+        if request.method == "GET":
+            queue = ReservationService.get_queue(book)
+            return Response(ReservationSerializer(queue, many=True).data)
+
+        serializer = ReservationSerializer(data=request.data)
+        if serializer.is_valid():
+            try:
+                reservation = ReservationService.place(
+                    book=book, reader=serializer.validated_data["reader"]
+                )
+            except ValidationError as e:
+                return Response(
+                    {"non_field_errors": e.messages},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return Response(
+                ReservationSerializer(reservation).data,
+                status=status.HTTP_201_CREATED,
+            )
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @reservations.mapping.delete
+    def cancel_reservation(self, request, pk=None):
+        """Cancel a reader's hold, given as ?reader=<serial_number>"""
+        book = self.get_object(pk)
+        reader_serial = request.query_params.get("reader")
+        if reader_serial and ReservationService.cancel(book, reader_serial):
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        raise NotFound(f"Reservation for reader {reader_serial} on book {pk} not found")
+
+    @action(detail=False, methods=["get"])
+    def suggest(self, request):
+        """Get books whose title or author has a word starting with ?prefix="""
+        config = settings.SUGGEST
+        prefix = request.query_params.get("prefix", "").strip()
+        if len(prefix) < config["MIN_PREFIX"]:
+            raise ParseError(
+                f"prefix must be at least {config['MIN_PREFIX']} characters long"
+            )
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            raise ParseError("limit must be an integer")
+        limit = max(1, min(limit, config["MAX_RESULTS"]))
+        try:
+            results = suggester.suggest(prefix, limit)
+        except IndexNotReady:
+            return Response(
+                {"detail": "Suggestions are being loaded, try again later."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(config["RETRY_AFTER"])},
+            )
+        return Response(
+            [
+                {"serial_number": serial_number, "title": title, "author": author}
+                for serial_number, title, author in results
+            ]
+        )
+
+    @action(detail=False, methods=["post"])
+    @idempotent
+    def export(self, request):
+        """Queue a CSV export of all books, run by a background worker"""
+        return accepted(enqueue("export_books"))
+
+    @action(detail=True, methods=["get"])
+    def history(self, request, pk=None):
+        """Get a book's loan history, newest first"""
+        paginator = LoanHistoryPagination()
+        page = paginator.paginate_queryset(get_book_history(pk), request, view=self)
+        return paginator.get_paginated_response(
+            LoanEventSerializer(page, many=True).data
+        )
+
+
+class StatsViewSet(viewsets.ViewSet):
+    """
+    ViewSet for circulation statistics.
+
+    list:
+    Return the total, borrowed and available book counts
+
+    overdue:
+    Return loans older than ?days= days, oldest first
+
+    loans:
+    Return the number of current loans started between ?from= and ?to=
+
+    readers:
+    Return the readers with the most current loans
+
+    authors:
+    Return the most borrowed authors
+
+    pool:
+    Return the database connection pool statistics of the serving process
+    """
+
+    def get_limit(self, request, default=10, maximum=100):
+        try:
+            return max(1, min(int(request.query_params.get("limit", default)), maximum))
+        except ValueError:
+            raise ParseError("limit must be an integer")
+
+    def list(self, request):
+        """Get the circulation counters"""
+        return Response(stats.get_counters())
+
+    @action(detail=False, methods=["get"])
+    def overdue(self, request):
+        """Get loans older than the given number of days"""
+        try:
+            days = int(request.query_params.get("days", settings.OVERDUE_AFTER_DAYS))
+        except ValueError:
+            raise ParseError("days must be an integer")
+        paginator = OverdueLoanPagination()
+        page = paginator.paginate_queryset(
+            stats.get_overdue_loans(days), request, view=self
+        )
+        return paginator.get_paginated_response(
+            BookListSerializer(page, many=True).data
+        )
+
+    @action(detail=False, methods=["get"])
+    def loans(self, request):
+        """Count current loans that started in the given date range"""
+        bounds = {}
+        for param in ("from", "to"):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    bounds[param] = parse_datetime(value)
+                except ValueError:
+                    # Well formed but impossible, e.g. February 30th
+                    bounds[param] = None
+                if bounds[param] is None:
+                    raise ParseError(f"{param} must be an ISO 8601 date and time")
+        return Response(
+            {"count": stats.count_loans_between(bounds.get("from"), bounds.get("to"))}
+        )
+
+    @action(detail=False, methods=["get"])
+    def readers(self, request):
+        """Get the readers with the most current loans"""
+        readers = Reader.objects.filter(active_loans__gt=0).order_by(
+            "-active_loans", "serial_number"
+        )[: self.get_limit(request)]
+        return Response(ReaderLoansSerializer(readers, many=True).data)
+
+    @action(detail=False, methods=["get"])
+    def authors(self, request):
+        """Get the most borrowed authors"""
+        authors = AuthorLoanCount.objects.order_by("-loans", "author")[
+            : self.get_limit(request)
+        ]
+        return Response(AuthorLoanCountSerializer(authors, many=True).data)
+
+    @action(detail=False, methods=["get"])
+    def pool(self, request):
+        """Get the connection pool statistics of this process"""
+        return Response({"pid": os.getpid(), "databases": get_pool_stats()})
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+from django.utils import translation
+from rest_framework import serializers
+
+from .branches import database_aliases
+from .pooling import get_pool
+
+
+def warm_up_app():
+    """
+    Build what the first request would otherwise build: the URL resolver
+    (which imports every view), the translation catalog and the fields of
+    every api serializer.
+
+    Touches no database, so a preloading server runs it once before forking
+    and every worker starts warm.
+    """
+    from . import serializers as api_serializers
+
+    get_resolver().reverse_dict
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.deactivate()
+    for cls in vars(api_serializers).values():
+        if (
+            isinstance(cls, type)
+            and issubclass(cls, serializers.Serializer)
+            and cls.__module__ == api_serializers.__name__
+        ):
+            cls().fields
+
+
+def warm_up_connections():
+    """
+    Open this thread's connections to the default and branch databases.
+
+    With persistent connections (CONN_MAX_AGE) the thread's first request
+    then skips connection setup. Pooled databases instead have their pool
+    opened and filled to its minimum size; no connection is held.
+    """
+    for alias in database_aliases():
+        pool = get_pool(alias)
+        if pool is not None:
+            pool.open(wait=True)
+            continue
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1")
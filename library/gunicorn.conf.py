@@ -0,0 +1,105 @@
+"""
+Gunicorn settings for production.
+
+Gunicorn reads ./gunicorn.conf.py when started from this directory. The
+environment variables below, or GUNICORN_CMD_ARGS, override the defaults.
+"""
+
+import os
+import threading
+import time
+from concurrent import futures
+
+_started = time.monotonic()
+
+wsgi_app = "library.wsgi:application"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Requests mostly wait on PostgreSQL, so each process serves requests from a
+# pool of threads; processes scale with the CPUs for the Python work. Each
+# thread keeps its own database connection: a host opens up to
+# workers * threads. The event stream (/api/books/events/) can't be served
+# over WSGI, see gunicorn_events.conf.py.
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", max(2, os.process_cpu_count() or 1)))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+
+# Import and warm the app in the master, so workers fork from a warm image
+# and share its copy-on-write pages and the rate limit store
+preload_app = True
+
+# Restart workers after this many requests (plus up to the jitter, so they
+# don't all restart at once) to bound memory growth; 0 disables
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", max_requests // 10))
+
+# Heartbeat files on tmpfs: a container's overlay filesystem can block them
+worker_tmp_dir = os.getenv("GUNICORN_WORKER_TMP_DIR", "/dev/shm")
+
+# Seconds a worker may spend opening its database connections before it
+# starts serving anyway
+WARM_UP_TIMEOUT = 10
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from django.db import connections
+
+        from api.warmup import warm_up_app
+
+        warm_up_app()
+        # Workers must not inherit the master's database sockets
+        connections.close_all()
+    server.log.info("Master ready in %.2fs", time.monotonic() - _started)
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.monotonic()
+
+
+def post_worker_init(worker):
+    """
+    Connect every request thread of a new worker to the databases before
+    it takes requests.
+
+    Connections belong to the thread that opened them, so each pool thread
+    opens its own. Every warm-up task waits on a barrier until all of them
+    have started, which makes the pool start all of its threads.
+
+    The title suggest index of every branch is built meanwhile on background
+    threads; suggest requests get 503 until it is ready.
+    """
+    from api.suggest import suggester
+    from api.warmup import warm_up_connections
+
+    suggester.start()
+
+    pool = getattr(worker, "tpool", None)
+    if pool is None:
+        # Sync workers serve requests in this thread
+        try:
+            warm_up_connections()
+        except Exception as e:
+            worker.log.warning("Database warm-up failed: %r", e)
+    else:
+        barrier = threading.Barrier(worker.cfg.threads, timeout=WARM_UP_TIMEOUT)
+
+        def warm_up():
+            try:
+                warm_up_connections()
+            finally:
+                barrier.wait()
+
+        tasks = [pool.submit(warm_up) for _ in range(worker.cfg.threads)]
+        done, _ = futures.wait(tasks, timeout=WARM_UP_TIMEOUT)
+        for task in done:
+            if task.exception() is not None:
+                worker.log.warning("Database warm-up failed: %r", task.exception())
+    worker.log.info(
+        "Worker %s ready in %.2fs",
+        worker.pid,
+        time.monotonic() - getattr(worker, "forked_at", _started),
+    )
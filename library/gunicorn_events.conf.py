@@ -0,0 +1,27 @@
+"""
+Gunicorn settings for the book availability event stream.
+
+Serves the ASGI application with uvicorn workers, where each open
+/api/books/events/ stream is a suspended coroutine, so a process holds
+thousands of idle subscribers. The WSGI server (gunicorn.conf.py) can't
+serve the stream; the proxy in front routes it here:
+
+    gunicorn --config gunicorn_events.conf.py
+"""
+
+import os
+
+wsgi_app = "library.asgi:application"
+bind = os.getenv("EVENTS_BIND", "0.0.0.0:8001")
+
+# Subscribers of every process get every event through the PostgreSQL
+# broker (EVENT_BROKER_BACKEND=api.events.PostgresBroker)
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.getenv("EVENTS_WORKERS", 1))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+
+# Streams never finish on their own, so don't wait long for them on restarts
+graceful_timeout = int(os.getenv("EVENTS_GRACEFUL_TIMEOUT", 5))
+
+# Heartbeat files on tmpfs: a container's overlay filesystem can block them
+worker_tmp_dir = os.getenv("GUNICORN_WORKER_TMP_DIR", "/dev/shm")
@@ -2,6 +2,8 @@
 ASGI config for library project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The book availability event stream (/api/books/events/) is only served
+through it, e.g. ``gunicorn --config gunicorn_events.conf.py``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -1,4 +1,5 @@
 from pathlib import Path
+import json
 import os
 from dotenv import load_dotenv
 
@@ -18,7 +19,7 @@ ALLOWED_HOSTS = []
 
 
 INSTALLED_APPS = [
-    "django.contrib.admin",
+    "api.apps.LibraryAdminConfig",
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
@@ -30,6 +31,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "api.middleware.TracingMiddleware",
+    "api.middleware.ProfilerMiddleware",
+    "api.middleware.BranchMiddleware",
+    "api.middleware.ConcurrencyLimitMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -79,8 +84,46 @@ else:
             "PASSWORD": os.getenv("POSTGRES_PASSWORD", "postgres"),
             "HOST": os.getenv("POSTGRES_HOST", "db"),
             "PORT": os.getenv("POSTGRES_PORT", "5432"),
+            # Keep each thread's connection open for this many seconds instead
+            # of reconnecting on every request (0 closes it after each one),
+            # and check a reused connection before a request's first query
+            "CONN_MAX_AGE": int(os.getenv("POSTGRES_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
         }
     }
+    # Connection pool per process and database, instead of a connection per
+    # thread. Threads borrow a connection for each request, so a process holds
+    # at most POSTGRES_POOL_MAX_SIZE. Needs psycopg 3 with its pool
+    # (poetry install --extras pool); replaces CONN_MAX_AGE.
+    if os.getenv("POSTGRES_POOL", "False") == "True":
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": int(os.getenv("POSTGRES_POOL_MIN_SIZE", "2")),
+                "max_size": int(os.getenv("POSTGRES_POOL_MAX_SIZE", "4")),
+                # Seconds a request waits for a free connection before failing
+                "timeout": float(os.getenv("POSTGRES_POOL_TIMEOUT", "10")),
+                # Idle connections above min_size are closed after this long
+                "max_idle": float(os.getenv("POSTGRES_POOL_MAX_IDLE", "600")),
+                # Connections are replaced after this long
+                "max_lifetime": float(os.getenv("POSTGRES_POOL_MAX_LIFETIME", "3600")),
+            }
+        }
+
+# Library branches (api.branches)
+# Maps each branch code to the DATABASES alias holding its books, readers and
+# loans, e.g. BRANCHES='{"north": "default", "south": "south"}'. Branches
+# can't share an alias. Aliases other than default copy its settings, on
+# PostgreSQL with NAME from POSTGRES_DB_<ALIAS> (default: the alias).
+# Requests choose their branch with the X-Library-Branch header; requests
+# without one, the admin and management commands use DEFAULT_BRANCH.
+BRANCHES = json.loads(os.getenv("BRANCHES", '{"main": "default"}'))
+DEFAULT_BRANCH = os.getenv("DEFAULT_BRANCH", next(iter(BRANCHES)))
+for alias in set(BRANCHES.values()) - set(DATABASES):
+    DATABASES[alias] = dict(DATABASES["default"])
+    if DATABASES[alias]["ENGINE"] == "django.db.backends.postgresql":
+        DATABASES[alias]["NAME"] = os.getenv(f"POSTGRES_DB_{alias.upper()}", alias)
+DATABASE_ROUTERS = ["api.branches.BranchRouter"]
 
 
 # Password validation
@@ -118,3 +161,178 @@ STATIC_ROOT = BASE_DIR / "static"
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Circulation
+# Default number of books a reader may hold at once (overridable per reader)
+READER_LOAN_LIMIT = int(os.getenv("READER_LOAN_LIMIT", "5"))
+# Days a book may be kept, the due date is the borrow date plus this
+LOAN_PERIOD_DAYS = int(os.getenv("LOAN_PERIOD_DAYS", "14"))
+
+# Overdue notices (api.notifications)
+OVERDUE_NOTICES = {
+    "SINK": os.getenv("OVERDUE_NOTICES_SINK", "api.notifications.DatabaseSink"),
+    "OPTIONS": {},
+    "CHUNK_SIZE": int(os.getenv("OVERDUE_NOTICES_CHUNK_SIZE", "1000")),
+}
+
+# REST framework
+REST_FRAMEWORK = {
+    "DEFAULT_THROTTLE_CLASSES": ["api.throttling.TokenBucketThrottle"],
+    # Reverse proxies in front of the app. Anonymous clients are rate limited
+    # by the address the proxy facing them added to X-Forwarded-For, or with
+    # 0 by the connection's address: clients can write X-Forwarded-For
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", "0")),
+}
+
+# Admin changelists estimate the row count of larger tables (PostgreSQL only)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(
+    os.getenv("ADMIN_ESTIMATED_COUNT_THRESHOLD", "100000")
+)
+
+# Title typeahead (api.suggest), each worker keeps its own in-memory index
+SUGGEST = {
+    # Seconds between replays of the change feed into the index
+    "REFRESH_INTERVAL": float(os.getenv("SUGGEST_REFRESH_INTERVAL", "5")),
+    # Seconds between comparisons of the index with the books table
+    "CHECK_INTERVAL": float(os.getenv("SUGGEST_CHECK_INTERVAL", "300")),
+    "MIN_PREFIX": 2,
+    "MAX_RESULTS": 50,
+    # Seconds clients are told to wait while the index is being built
+    "RETRY_AFTER": 1,
+}
+
+# Background jobs (api.jobs), run by `manage.py run_worker`
+JOBS = {
+    # Seconds an idle worker waits before looking for queued jobs again
+    "POLL_INTERVAL": float(os.getenv("JOBS_POLL_INTERVAL", "1")),
+    # Seconds a running job may go without reporting progress before its
+    # worker is presumed lost and the job is queued again
+    "LEASE_SECONDS": int(os.getenv("JOBS_LEASE_SECONDS", "600")),
+    # Attempts per job, retries wait RETRY_DELAY seconds, doubled each time
+    "MAX_ATTEMPTS": int(os.getenv("JOBS_MAX_ATTEMPTS", "3")),
+    "RETRY_DELAY": float(os.getenv("JOBS_RETRY_DELAY", "30")),
+    # Directory the files of export jobs are written to
+    "EXPORT_DIR": os.getenv("JOBS_EXPORT_DIR", str(BASE_DIR / "exports")),
+}
+
+# Maximum number of operations in one POST /api/batch/ request
+BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "50"))
+
+# Per-client token bucket rate limiting (api.throttling)
+# Buckets hold BURST tokens refilled at RATE tokens per second. The default
+# shared memory backend is shared by all gunicorn workers when the app is
+# preloaded; use api.throttling.CacheBucketStore to share through a cache.
+RATE_LIMIT = {
+    "ENABLED": os.getenv("RATE_LIMIT_ENABLED", "True") == "True",
+    "RATE": float(os.getenv("RATE_LIMIT_RATE", "20")),
+    "BURST": float(os.getenv("RATE_LIMIT_BURST", "100")),
+    "BACKEND": os.getenv(
+        "RATE_LIMIT_BACKEND", "api.throttling.SharedMemoryBucketStore"
+    ),
+    "OPTIONS": {},
+}
+
+# Adaptive limit of in-flight API requests per worker process. A process
+# never has more requests in flight than threads (GUNICORN_THREADS), so the
+# limit starts there and only sheds once slow requests shrink it below.
+CONCURRENCY_LIMIT = {
+    "ENABLED": os.getenv("CONCURRENCY_LIMIT_ENABLED", "True") == "True",
+    "INITIAL_LIMIT": int(
+        os.getenv("CONCURRENCY_LIMIT_INITIAL", os.getenv("GUNICORN_THREADS", "4"))
+    ),
+    "MIN_LIMIT": int(os.getenv("CONCURRENCY_LIMIT_MIN", "1")),
+    "MAX_LIMIT": int(
+        os.getenv("CONCURRENCY_LIMIT_MAX", os.getenv("GUNICORN_THREADS", "4"))
+    ),
+    # Requests slower than this (seconds), counting the time they queued for
+    # a thread, shrink the limit
+    "LATENCY_TARGET": float(os.getenv("CONCURRENCY_LIMIT_LATENCY_TARGET", "0.5")),
+    # Header in which a trusted proxy sets when it received the request
+    # (t=<unix time>), e.g. X-Request-Start; without it queueing goes unseen
+    "QUEUE_START_HEADER": os.getenv("CONCURRENCY_LIMIT_QUEUE_START_HEADER", ""),
+    "RETRY_AFTER": 1,
+}
+
+# Loan history (api.loan_log)
+# Events are buffered in memory and written in batches of BATCH_SIZE at least
+# every FLUSH_INTERVAL seconds; DURABLE writes them in the borrow/return
+# transaction instead.
+LOAN_EVENTS = {
+    "DURABLE": os.getenv("LOAN_EVENTS_DURABLE", "False") == "True",
+    "BATCH_SIZE": int(os.getenv("LOAN_EVENTS_BATCH_SIZE", "500")),
+    "FLUSH_INTERVAL": float(os.getenv("LOAN_EVENTS_FLUSH_INTERVAL", "2")),
+    # Events kept for the next flush after failed writes, the oldest beyond
+    # this are dropped
+    "MAX_PENDING": int(os.getenv("LOAN_EVENTS_MAX_PENDING", "100000")),
+}
+
+# Book change feed (api.changefeed)
+CHANGE_FEED = {
+    # Changes younger than this are held back until concurrent transactions settle
+    "SETTLE_SECONDS": float(os.getenv("CHANGE_FEED_SETTLE_SECONDS", "1")),
+    "PAGE_SIZE": int(os.getenv("CHANGE_FEED_PAGE_SIZE", "500")),
+    "MAX_PAGE_SIZE": 5000,
+    # Delete markers older than this are purged by compact_book_changes
+    "RETENTION_DAYS": int(os.getenv("CHANGE_FEED_RETENTION_DAYS", "30")),
+}
+
+# Book availability events (api.events)
+# The in-process broker only reaches subscribers of the publishing process;
+# use api.events.PostgresBroker (LISTEN/NOTIFY) with several processes.
+EVENT_BROKER = {
+    "BACKEND": os.getenv("EVENT_BROKER_BACKEND", "api.events.InProcessBroker"),
+    "OPTIONS": {},
+}
+# Seconds between keep-alive comments on idle event streams
+EVENT_STREAM_HEARTBEAT = float(os.getenv("EVENT_STREAM_HEARTBEAT", "15"))
+
+# Circulation statistics (api.stats)
+# Number of rows each summary counter is spread over to avoid lock contention
+STATS_COUNTER_SHARDS = int(os.getenv("STATS_COUNTER_SHARDS", "8"))
+# Default age in days after which /api/stats/overdue/ reports a loan
+OVERDUE_AFTER_DAYS = int(os.getenv("OVERDUE_AFTER_DAYS", "14"))
+
+# Idempotency-Key support for POST/PATCH endpoints
+# How long a stored response is replayed, in seconds
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", str(24 * 60 * 60)))
+# How long a retry waits for the in-flight request with the same key
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", "10"))
+# How long a request may hold a key before a retry takes over, in seconds;
+# keep it above the longest a request can run (GUNICORN_TIMEOUT)
+IDEMPOTENCY_LEASE = float(os.getenv("IDEMPOTENCY_LEASE", "60"))
+
+# Request profiler (api.middleware.ProfilerMiddleware)
+# Profiles SAMPLE_RATE of the requests at random, and requests sending the
+# X-Profile-Token header with TOKEN (empty: no request can ask for a
+# profile). The last CAPACITY profiles are kept in DIR, each with at most
+# MAX_STACKS different stacks sampled every INTERVAL seconds.
+PROFILER = {
+    "ENABLED": os.getenv("PROFILER_ENABLED", "False") == "True",
+    "SAMPLE_RATE": float(os.getenv("PROFILER_SAMPLE_RATE", "0")),
+    "TOKEN": os.getenv("PROFILER_TOKEN", ""),
+    "INTERVAL": float(os.getenv("PROFILER_INTERVAL", "0.001")),
+    "DIR": os.getenv("PROFILER_DIR", str(BASE_DIR / "profiles")),
+    "CAPACITY": int(os.getenv("PROFILER_CAPACITY", "100")),
+    "MAX_STACKS": int(os.getenv("PROFILER_MAX_STACKS", "2000")),
+}
+
+# Request tracing (api.tracing)
+# Records SAMPLE_RATE of the traces started here; with PARENT_BASED, requests
+# carrying a traceparent header follow the caller's sampling decision. Spans
+# go to the EXPORTER backend, created with OPTIONS: JsonLinesExporter
+# appends them to path in batches of batch_size at least every
+# flush_interval seconds, dropping spans while max_queue_size are waiting.
+TRACING = {
+    "ENABLED": os.getenv("TRACING_ENABLED", "False") == "True",
+    "SAMPLE_RATE": float(os.getenv("TRACING_SAMPLE_RATE", "0.01")),
+    "PARENT_BASED": os.getenv("TRACING_PARENT_BASED", "True") == "True",
+    "EXPORTER": {
+        "BACKEND": os.getenv("TRACING_EXPORTER", "api.tracing.JsonLinesExporter"),
+        "OPTIONS": {
+            "path": os.getenv("TRACING_FILE", str(BASE_DIR / "traces" / "spans.jsonl")),
+            "batch_size": int(os.getenv("TRACING_BATCH_SIZE", "512")),
+            "flush_interval": float(os.getenv("TRACING_FLUSH_INTERVAL", "1")),
+            "max_queue_size": int(os.getenv("TRACING_MAX_QUEUE_SIZE", "10000")),
+        },
+    },
+}
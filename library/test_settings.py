@@ -6,9 +6,15 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": ":memory:",
-    }
+    },
+    "east": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"},
+    "west": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"},
 }
 
+# Branches on their own databases, tests use them explicitly
+BRANCHES = {"main": "default", "east": "east", "west": "west"}
+DEFAULT_BRANCH = "main"
+
 # Don't use whitenoise in tests
 MIDDLEWARE = [m for m in MIDDLEWARE if not m.startswith("whitenoise")]
 
@@ -19,3 +25,13 @@ PASSWORD_HASHERS = [
 
 # Turn off all debugging for tests
 DEBUG = False
+
+# Rate limiting is exercised explicitly by its own tests
+RATE_LIMIT = {**RATE_LIMIT, "ENABLED": False}
+
+# A background flusher would open its own connection, which can't see the
+# in-memory test database; buffered loan events are flushed explicitly
+LOAN_EVENTS = {**LOAN_EVENTS, "FLUSH_INTERVAL": 0}
+
+# Serve changes as soon as they are written
+CHANGE_FEED = {**CHANGE_FEED, "SETTLE_SECONDS": 0}
@@ -0,0 +1,129 @@
+from unittest import mock
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from api import stats
+from api.admin import EstimatedCountPaginator
+from api.models import Book, Reader
+from api.services import BookService, create_reader
+
+
+@pytest.mark.django_db
+class TestBookAdmin:
+    @pytest.fixture(autouse=True)
+    def setup(self, admin_client):
+        self.client = admin_client
+        self.url = reverse("admin:api_book_changelist")
+        self.reader = create_reader("654321")
+        self.books = [
+            BookService.create_book(f"12345{i}", f"Book {i}", "Author")
+            for i in range(4)
+        ]
+
+    def lend_or_return(self, action, serial_numbers, reader=""):
+        return self.client.post(
+            self.url,
+            {"action": action, "_selected_action": serial_numbers, "reader": reader},
+            follow=True,
+        )
+
+    def test_changelist_query_count_is_constant(self):
+        def changelist_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(self.url)
+            assert response.status_code == 200
+            return len(context)
+
+        BookService.update_borrow_status(self.books[0], self.reader)
+        queries = changelist_queries()
+        for i in range(10):
+            book = BookService.create_book(f"23456{i}", "Book", "Author")
+            BookService.update_borrow_status(book, create_reader(f"66000{i}"))
+
+        assert changelist_queries() == queries
+
+    def test_filters_and_search(self):
+        BookService.update_borrow_status(self.books[0], self.reader)
+
+        response = self.client.get(self.url, {"status": "borrowed"})
+        assert list(response.context["cl"].result_list) == [self.books[0]]
+
+        response = self.client.get(self.url, {"q": "654321"})
+        assert list(response.context["cl"].result_list) == [self.books[0]]
+
+    def test_lend_and_return_actions(self):
+        self.lend_or_return("lend_books", ["123450", "123451"], "654321")
+
+        assert Book.objects.filter(borrower=self.reader).count() == 2
+        assert Reader.objects.get(pk=self.reader.pk).active_loans == 2
+        assert stats.get_counters()["borrowed"] == 2
+
+        self.lend_or_return("return_books", ["123450", "123451", "123452"])
+
+        assert not Book.objects.filter(borrower__isnull=False).exists()
+        assert Reader.objects.get(pk=self.reader.pk).active_loans == 0
+        assert stats.get_counters()["borrowed"] == 0
+
+    def test_lend_over_limit(self):
+        self.reader.loan_limit = 1
+        self.reader.save()
+
+        response = self.lend_or_return("lend_books", ["123450", "123451"], "654321")
+
+        assert b"loan limit" in response.content
+        assert not Book.objects.filter(borrower__isnull=False).exists()
+
+    def test_lend_to_unknown_reader(self):
+        response = self.lend_or_return("lend_books", ["123450"], "999999")
+
+        assert b"not found" in response.content
+
+    def test_change_form_borrows_through_service(self):
+        url = reverse("admin:api_book_change", args=["123450"])
+
+        response = self.client.post(
+            url,
+            {
+                "serial_number": "123450",
+                "title": "Renamed",
+                "author": "Author",
+                "borrower": self.reader.pk,
+            },
+        )
+
+        assert response.status_code == 302
+        book = Book.objects.get(pk="123450")
+        assert book.title == "Renamed"
+        assert book.borrower == self.reader
+        assert book.due_date is not None
+        assert Reader.objects.get(pk=self.reader.pk).active_loans == 1
+
+    def test_add_and_delete_through_service(self):
+        self.client.post(
+            reverse("admin:api_book_add"),
+            {"serial_number": "123459", "title": "New", "author": "Author"},
+        )
+        assert stats.get_counters()["total"] == 5
+
+        self.client.post(
+            reverse("admin:api_book_delete", args=["123459"]), {"post": "yes"}
+        )
+        assert stats.get_counters()["total"] == 4
+
+
+@pytest.mark.django_db
+class TestEstimatedCountPaginator:
+    def test_uses_estimate_above_threshold(self, settings):
+        settings.ADMIN_ESTIMATED_COUNT_THRESHOLD = 1000
+        BookService.create_book("123456", "Book", "Author")
+
+        with mock.patch.object(EstimatedCountPaginator, "_estimate", return_value=5000):
+            assert EstimatedCountPaginator(Book.objects.all(), 100).count == 5000
+            filtered = Book.objects.filter(author="Author")
+            assert EstimatedCountPaginator(filtered, 100).count == 1
+
+        with mock.patch.object(EstimatedCountPaginator, "_estimate", return_value=10):
+            assert EstimatedCountPaginator(Book.objects.all(), 100).count == 1
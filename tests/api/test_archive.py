@@ -0,0 +1,176 @@
+import csv
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import stats
+from api.archive import archive_withdrawn_books
+from api.importer import import_books
+from api.jobs import enqueue, run_worker
+from api.models import ArchivedBook, Book, BookChange, Reader, Reservation
+from api.services import BookService, ReservationService, create_reader
+
+
+@pytest.mark.django_db
+class TestWithdraw:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.reader = create_reader("654321")
+        self.book = BookService.create_book("123456", "Book", "Author")
+        BookService.update_borrow_status(self.book, self.reader)
+        self.holder = create_reader("654322")
+        ReservationService.place(self.book, self.holder)
+
+    def test_withdrawn_book_leaves_the_catalog(self):
+        assert BookService.delete("123456")
+
+        assert BookService.get_by_serial("123456") is None
+        assert not BookService.get_all().exists()
+        book = Book.all_objects.get(pk="123456")
+        assert book.withdrawn_at is not None
+        assert book.borrower is None
+        assert not Reservation.objects.exists()
+        assert Reader.objects.get(pk=self.reader.pk).active_loans == 0
+        assert stats.get_counters()["total"] == 0
+        assert stats.get_counters()["borrowed"] == 0
+        assert not BookService.delete("123456")
+
+    def test_withdraw_is_recorded_as_delete(self):
+        BookService.delete("123456")
+        archive_withdrawn_books()
+
+        assert list(
+            BookChange.objects.filter(serial_number="123456")
+            .order_by("pk")
+            .values_list("op", flat=True)
+        ) == [BookChange.CREATE, BookChange.UPDATE, BookChange.DELETE]
+
+    def test_serial_number_of_withdrawn_book_can_be_reused(self):
+        BookService.delete("123456")
+
+        book = BookService.create_book("123456", "New book", "New author")
+
+        assert book.withdrawn_at is None
+        assert BookService.get_by_serial("123456").title == "New book"
+        assert ArchivedBook.objects.get().title == "Book"
+        assert stats.get_counters()["total"] == 1
+
+    def test_import_replaces_withdrawn_book(self, tmp_path):
+        BookService.delete("123456")
+        path = tmp_path / "books.csv"
+        with open(path, "w", newline="") as f:
+            csv.writer(f).writerows(
+                [("serial_number", "title", "author"), ("123456", "New", "Author")]
+            )
+
+        counts = import_books(path)
+
+        assert counts["created"] == 1
+        assert BookService.get_by_serial("123456").title == "New"
+        assert ArchivedBook.objects.get().title == "Book"
+
+
+@pytest.mark.django_db
+class TestArchiveWithdrawnBooks:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        for i in range(5):
+            BookService.create_book(f"12345{i}", f"Book {i}", "Author")
+        for i in range(4):
+            BookService.delete(f"12345{i}")
+
+    def test_moves_withdrawn_books_in_batches(self):
+        progress = []
+
+        archived = archive_withdrawn_books(batch_size=3, progress=progress.append)
+
+        assert archived == 4
+        assert progress == [3, 4]
+        assert list(Book.all_objects.values_list("pk", flat=True)) == ["123454"]
+        assert sorted(ArchivedBook.objects.values_list("serial_number", flat=True)) == [
+            "123450",
+            "123451",
+            "123452",
+            "123453",
+        ]
+        assert archive_withdrawn_books() == 0
+
+    def test_command(self):
+        out = StringIO()
+
+        call_command("archive_books", "--batch-size", "2", stdout=out)
+
+        assert "Archived 4 book(s)." in out.getvalue()
+
+    def test_job(self):
+        job = enqueue("archive_books")
+
+        run_worker("worker-1", once=True)
+
+        job.refresh_from_db()
+        assert job.result == {"archived": 4}
+
+
+@pytest.mark.django_db
+class TestArchiveEndpoint:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.client = APIClient()
+        self.url = reverse("archived-book-list")
+        now = timezone.now()
+        for i in range(3):
+            ArchivedBook.objects.create(
+                serial_number=f"12345{i}",
+                title=f"Book {i}",
+                author="Author",
+                withdrawn_at=now - timedelta(days=i),
+            )
+        self.now = now
+
+    def test_list_archived_books(self):
+        """Test that archived books are listed most recently withdrawn first"""
+        response = self.client.get(self.url)
+
+        assert response.status_code == 200
+        assert [book["serial_number"] for book in response.data["results"]] == [
+            "123450",
+            "123451",
+            "123452",
+        ]
+
+    def test_filter_by_serial_number(self):
+        """Test that the archive can be queried by serial number"""
+        response = self.client.get(self.url, {"serial_number": "123451"})
+
+        assert [book["title"] for book in response.data["results"]] == ["Book 1"]
+
+    def test_filter_by_withdrawal_date(self):
+        """Test that the archive can be queried by withdrawal period"""
+        response = self.client.get(
+            self.url,
+            {"withdrawn_after": (self.now - timedelta(days=1, hours=1)).isoformat()},
+        )
+
+        assert [book["serial_number"] for book in response.data["results"]] == [
+            "123450",
+            "123451",
+        ]
+
+    @pytest.mark.parametrize(
+        "params",
+        [
+            {"serial_number": "12345"},
+            {"withdrawn_before": "yesterday"},
+            {"withdrawn_after": "2024-02-30T00:00:00"},
+        ],
+    )
+    def test_invalid_filters(self, params):
+        """Test that invalid filters return 400"""
+        response = self.client.get(self.url, params)
+
+        assert response.status_code == 400
@@ -0,0 +1,188 @@
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from api.models import Book, Reader
+from api.services import BookService, create_reader
+
+
+@pytest.mark.django_db
+class TestBatchAPIView:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.client = APIClient()
+        self.url = reverse("batch")
+
+    def post(self, operations, **data):
+        return self.client.post(
+            self.url, {"operations": operations, **data}, format="json"
+        )
+
+    def test_batch_chains_operations(self):
+        """
+        POST /batch/ runs create reader, create book and borrow in one request
+        """
+        response = self.post(
+            [
+                {
+                    "method": "POST",
+                    "path": "/api/readers/",
+                    "body": {"serial_number": "654321"},
+                },
+                {
+                    "method": "POST",
+                    "path": "/api/books/",
+                    "body": {
+                        "serial_number": "123456",
+                        "title": "Book",
+                        "author": "Author",
+                    },
+                },
+                {
+                    "method": "PATCH",
+                    "path": "/api/books/123456/status/",
+                    "body": {"borrower": "654321"},
+                },
+                {"method": "GET", "path": "/api/books/123456/?fields=borrower"},
+            ]
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["committed"] is True
+        assert [result["status"] for result in response.data["results"]] == [
+            201,
+            201,
+            200,
+            200,
+        ]
+        assert response.data["results"][3]["body"] == {"borrower": "654321"}
+        assert Book.objects.get(pk="123456").borrower.serial_number == "654321"
+
+    def test_failed_operation_is_rolled_back_alone(self):
+        """
+        POST /batch/ without atomic commits the operations that succeeded
+        """
+        response = self.post(
+            [
+                {
+                    "method": "POST",
+                    "path": "/api/readers/",
+                    "body": {"serial_number": "654321"},
+                },
+                {
+                    "method": "POST",
+                    "path": "/api/readers/",
+                    "body": {"serial_number": "bad"},
+                },
+                {"method": "GET", "path": "/api/nothing/"},
+            ]
+        )
+
+        assert response.data["committed"] is True
+        assert [result["status"] for result in response.data["results"]] == [
+            201,
+            400,
+            404,
+        ]
+        assert "serial_number" in response.data["results"][1]["body"]
+        assert Reader.objects.filter(serial_number="654321").exists()
+
+    def test_atomic_batch_is_all_or_nothing(self):
+        """
+        POST /batch/ with atomic rolls everything back on the first failure
+        """
+        BookService.create_book("123456", "Book", "Author")
+        reader = create_reader("654321")
+        reader.loan_limit = 0
+        reader.save()
+
+        response = self.post(
+            [
+                {
+                    "method": "POST",
+                    "path": "/api/readers/",
+                    "body": {"serial_number": "654322"},
+                },
+                {
+                    "method": "PATCH",
+                    "path": "/api/books/123456/status/",
+                    "body": {"borrower": "654321"},
+                },
+                {"method": "DELETE", "path": "/api/books/123456/"},
+            ],
+            atomic=True,
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["committed"] is False
+        assert [result["status"] for result in response.data["results"]] == [
+            201,
+            400,
+            424,
+        ]
+        assert not Reader.objects.filter(serial_number="654322").exists()
+        assert Book.objects.filter(pk="123456").exists()
+
+    def test_unbatchable_endpoints(self):
+        """
+        POST /batch/ refuses nested batches and event streams
+        """
+        response = self.post(
+            [
+                {"method": "POST", "path": "/api/batch/", "body": {}},
+                {"method": "GET", "path": "/api/books/events/"},
+            ]
+        )
+
+        assert [result["status"] for result in response.data["results"]] == [
+            400,
+            400,
+        ]
+
+    def test_invalid_batch(self, settings):
+        """
+        POST /batch/ with no, too many or malformed operations returns 400
+        """
+        settings.BATCH_MAX_OPERATIONS = 1
+        operation = {"method": "GET", "path": "/api/books/"}
+
+        assert self.post([]).status_code == status.HTTP_400_BAD_REQUEST
+        assert self.post([operation] * 2).status_code == status.HTTP_400_BAD_REQUEST
+        response = self.post([{"method": "TRACE", "path": "/admin/"}])
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "operations" in response.data
+
+    def test_idempotent_batch(self):
+        """
+        POST /batch/ with an Idempotency-Key replays the whole batch on retry
+        """
+        operations = [
+            {
+                "method": "POST",
+                "path": "/api/readers/",
+                "body": {"serial_number": "654321"},
+            },
+            {
+                "method": "POST",
+                "path": "/api/readers/",
+                "body": {"serial_number": "654322"},
+            },
+        ]
+        first = self.client.post(
+            self.url,
+            {"operations": operations},
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="batch-1",
+        )
+        retry = self.client.post(
+            self.url,
+            {"operations": operations},
+            format="json",
+            HTTP_IDEMPOTENCY_KEY="batch-1",
+        )
+
+        assert [result["status"] for result in first.data["results"]] == [201, 201]
+        assert retry["Idempotent-Replayed"] == "true"
+        assert retry.data == first.data
+        assert Reader.objects.count() == 2
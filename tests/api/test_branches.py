@@ -0,0 +1,146 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api import loan_log
+from api.branches import CrossBranchError, atomic, use_branch
+from api.jobs import enqueue
+from api.models import Book, Job, LoanEvent
+from api.services import BookService, create_reader
+from api.suggest import suggester
+
+DATABASES = ["default", "east", "west"]
+
+
+@pytest.mark.django_db(databases=DATABASES)
+class TestBranchRouter:
+    def test_books_are_stored_in_their_branch(self):
+        with use_branch("east"):
+            BookService.create_book("123456", "East book", "Author")
+
+        assert Book.objects.using("east").filter(pk="123456").exists()
+        assert not Book.objects.using("west").exists()
+        assert not Book.objects.exists()
+
+    def test_branches_have_their_own_serial_numbers(self):
+        with use_branch("east"):
+            BookService.create_book("123456", "East book", "Author")
+        with use_branch("west"):
+            BookService.create_book("123456", "West book", "Author")
+
+        with use_branch("east"):
+            assert BookService.get_by_serial("123456").title == "East book"
+        with use_branch("west"):
+            assert BookService.get_by_serial("123456").title == "West book"
+
+    def test_atomic_rolls_back_the_branch_database(self):
+        with use_branch("east"):
+            with pytest.raises(RuntimeError):
+                with atomic():
+                    Book.objects.create(serial_number="123456", title="T", author="A")
+                    raise RuntimeError
+
+            assert not Book.objects.exists()
+
+    def test_object_of_another_branch_is_not_saved(self):
+        with use_branch("east"):
+            book = BookService.create_book("123456", "East book", "Author")
+
+        with use_branch("west"), pytest.raises(CrossBranchError):
+            book.save()
+
+    def test_cross_branch_loan_is_rejected(self):
+        with use_branch("east"):
+            book = BookService.create_book("123456", "East book", "Author")
+        with use_branch("west"):
+            reader = create_reader("654321")
+
+        with use_branch("east"), pytest.raises(CrossBranchError):
+            BookService.update_borrow_status(book, reader)
+
+        assert Book.objects.using("east").get().borrower_id is None
+
+    def test_unknown_branch(self):
+        with pytest.raises(LookupError):
+            with use_branch("north"):
+                pass
+
+    def test_loan_events_are_written_to_their_branch(
+        self, django_capture_on_commit_callbacks
+    ):
+        with use_branch("east"):
+            book = BookService.create_book("123456", "East book", "Author")
+            reader = create_reader("654321")
+            with django_capture_on_commit_callbacks(using="east", execute=True):
+                BookService.update_borrow_status(book, reader)
+        loan_log.buffer.flush()
+
+        assert LoanEvent.objects.using("east").count() == 1
+        assert not LoanEvent.objects.exists()
+
+    def test_worker_runs_the_jobs_of_its_branch(self):
+        with use_branch("east"):
+            job = enqueue("archive_books")
+        out = StringIO()
+
+        call_command("run_worker", "--once", stdout=out)
+        assert "ran 0 job(s)." in out.getvalue()
+        call_command("run_worker", "--once", "--branch", "east", stdout=out)
+
+        assert "ran 1 job(s)." in out.getvalue()
+        assert Job.objects.using("east").get(pk=job.pk).status == Job.SUCCEEDED
+
+
+@pytest.mark.django_db(databases=DATABASES)
+class TestBranchRequests:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.client = APIClient()
+        self.url = reverse("book-list")
+        suggester.reset()
+        yield
+        suggester.reset()
+
+    def create(self, branch, serial_number, title):
+        return self.client.post(
+            self.url,
+            {"serial_number": serial_number, "title": title, "author": "Author"},
+            format="json",
+            HTTP_X_LIBRARY_BRANCH=branch,
+        )
+
+    def test_requests_are_served_by_their_branch(self):
+        """Test that the branch header selects the branch's books"""
+        assert self.create("east", "123456", "East book").status_code == 201
+
+        east = self.client.get(self.url, HTTP_X_LIBRARY_BRANCH="east")
+        west = self.client.get(self.url, HTTP_X_LIBRARY_BRANCH="west")
+        main = self.client.get(self.url)
+
+        assert [book["title"] for book in east.data] == ["East book"]
+        assert west.data == []
+        assert main.data == []
+        assert "X-Library-Branch" in east["Vary"]
+
+    def test_unknown_branch(self):
+        """Test that an unknown branch returns 400"""
+        response = self.client.get(self.url, HTTP_X_LIBRARY_BRANCH="north")
+
+        assert response.status_code == 400
+
+    def test_suggestions_are_per_branch(self):
+        """Test that each branch suggests only its own books"""
+        self.create("east", "123456", "Dune")
+        self.create("west", "123457", "Dubliners")
+        for branch in ("east", "west"):
+            with use_branch(branch):
+                suggester.rebuild()
+
+        response = self.client.get(
+            reverse("book-suggest"), {"prefix": "du"}, HTTP_X_LIBRARY_BRANCH="east"
+        )
+
+        assert [book["title"] for book in response.data] == ["Dune"]
@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from api.changefeed import CursorExpired, compact, get_changes, get_horizon
+from api.models import BookChange
+from api.services import create_reader, BookService
+
+
+def ops(changes):
+    return [(change.serial_number, change.op) for change in changes]
+
+
+@pytest.mark.django_db
+class TestChangeFeed:
+    def test_service_writes_are_recorded_in_order(self):
+        book = BookService.create_book("123456", "Test Book", "Test Author")
+        reader = create_reader("654321")
+        BookService.update_borrow_status(book, reader)
+        BookService.delete("123456")
+
+        changes, books = get_changes(0, 10)
+
+        assert ops(changes) == [
+            ("123456", BookChange.CREATE),
+            ("123456", BookChange.UPDATE),
+            ("123456", BookChange.DELETE),
+        ]
+        assert books == {}
+
+    def test_reader_delete_records_borrower_clear(self):
+        book = BookService.create_book("123456", "Test Book", "Test Author")
+        reader = create_reader("654321")
+        BookService.update_borrow_status(book, reader)
+        cursor = BookChange.objects.latest("pk").pk
+
+        reader.delete()
+
+        changes, books = get_changes(cursor, 10)
+        assert ops(changes) == [("123456", BookChange.UPDATE)]
+        assert books["123456"].borrower is None
+
+    def test_pages_by_cursor(self):
+        for i in range(3):
+            BookService.create_book(f"12345{i}", "Book", "Author")
+
+        first, _ = get_changes(0, 2)
+        second, _ = get_changes(first[-1].pk, 2)
+
+        assert ops(first) == [("123450", "create"), ("123451", "create")]
+        assert ops(second) == [("123452", "create")]
+
+    def test_unsettled_changes_are_held_back(self, settings):
+        settings.CHANGE_FEED = {**settings.CHANGE_FEED, "SETTLE_SECONDS": 60}
+        BookService.create_book("123456", "Book", "Author")
+        BookChange.objects.update(changed_at=timezone.now() - timedelta(minutes=5))
+        BookService.create_book("123457", "Book", "Author")
+
+        changes, _ = get_changes(0, 10)
+
+        assert ops(changes) == [("123456", "create")]
+
+    def test_compact_keeps_latest_change_per_book(self):
+        book = BookService.create_book("123456", "Book", "Author")
+        BookService.update_borrow_status(book, create_reader("654321"))
+        BookService.create_book("123457", "Book", "Author")
+
+        assert compact(retention_days=30, batch_size=1) == 1
+
+        changes, _ = get_changes(0, 10)
+        assert ops(changes) == [("123456", "update"), ("123457", "create")]
+
+    def test_compact_expires_old_delete_markers(self):
+        BookService.create_book("123456", "Book", "Author")
+        BookService.delete("123456")
+        BookService.create_book("123457", "Book", "Author")
+        BookChange.objects.update(changed_at=timezone.now() - timedelta(days=31))
+        marker = BookChange.objects.get(op=BookChange.DELETE).pk
+
+        compact(retention_days=30)
+
+        assert get_horizon() == marker
+        with pytest.raises(CursorExpired):
+            get_changes(marker - 1, 10)
+        changes, _ = get_changes(0, 10)
+        assert ops(changes) == [("123457", "create")]
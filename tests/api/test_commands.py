@@ -0,0 +1,117 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+
+from api.models import Book, BookChange, IdempotencyKey, Reader
+
+
+@pytest.mark.django_db
+class TestReconcileLoanCountersCommand:
+    def test_reconciles_drifted_counters(self):
+        reader = Reader.objects.create(serial_number="654321")
+        Book.objects.create(
+            serial_number="123456", title="Book", author="Author", borrower=reader
+        )
+        out = StringIO()
+
+        call_command("reconcile_loan_counters", stdout=out)
+
+        reader.refresh_from_db()
+        assert reader.active_loans == 1
+        assert "Reconciled 1" in out.getvalue()
+
+    def test_dry_run_does_not_write(self):
+        reader = Reader.objects.create(serial_number="654321")
+        Book.objects.create(
+            serial_number="123456", title="Book", author="Author", borrower=reader
+        )
+        out = StringIO()
+
+        call_command("reconcile_loan_counters", "--dry-run", stdout=out)
+
+        reader.refresh_from_db()
+        assert reader.active_loans == 0
+        assert "1 reader(s)" in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestPurgeIdempotencyKeysCommand:
+    def test_purges_only_expired_keys(self):
+        now = timezone.now()
+        for key, expires_at in [("old", now - timedelta(hours=1)), ("new", now)]:
+            IdempotencyKey.objects.create(
+                key=key,
+                method="POST",
+                path="/api/books/",
+                fingerprint="",
+                expires_at=expires_at + timedelta(minutes=30),
+            )
+        out = StringIO()
+
+        call_command("purge_idempotency_keys", stdout=out)
+
+        assert list(IdempotencyKey.objects.values_list("key", flat=True)) == ["new"]
+        assert "Purged 1" in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestCompactBookChangesCommand:
+    def test_removes_superseded_changes(self):
+        Book.objects.create(serial_number="123456", title="Book", author="Author")
+        Book.objects.filter(pk="123456").get().save()
+        out = StringIO()
+
+        call_command("compact_book_changes", stdout=out)
+
+        assert BookChange.objects.count() == 1
+        assert "Removed 1" in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestRebuildStatsCommand:
+    def test_verify_reports_drift(self):
+        Book.objects.create(serial_number="123456", title="Book", author="Author")
+        out = StringIO()
+
+        with pytest.raises(CommandError):
+            call_command("rebuild_stats", "--verify", stdout=out)
+
+        assert "total: stored 0, actual 1" in out.getvalue()
+
+    def test_rebuild_then_verify(self):
+        Book.objects.create(serial_number="123456", title="Book", author="Author")
+
+        call_command("rebuild_stats", stdout=StringIO())
+        out = StringIO()
+        call_command("rebuild_stats", "--verify", stdout=out)
+
+        assert "consistent" in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestSendOverdueNoticesCommand:
+    def test_sends_notices_once_per_day(self):
+        reader = Reader.objects.create(serial_number="654321")
+        now = timezone.now()
+        Book.objects.create(
+            serial_number="123456",
+            title="Book",
+            author="Author",
+            borrower=reader,
+            borrow_date=now - timedelta(days=20),
+            due_date=now - timedelta(days=6),
+        )
+
+        out = StringIO()
+        call_command("send_overdue_notices", "--date", "2026-01-01", stdout=out)
+        call_command("send_overdue_notices", "--date", "2026-01-01", stdout=out)
+
+        assert "Sent 1 overdue notice(s)." in out.getvalue()
+        assert "Sent 0 overdue notice(s)." in out.getvalue()
+
+    def test_rejects_invalid_date(self):
+        with pytest.raises(CommandError):
+            call_command("send_overdue_notices", "--date", "2026-13-01")
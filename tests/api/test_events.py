@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from django.test import AsyncClient, Client
+
+from api.branches import use_branch
+from api.events import InProcessBroker, availability_event, get_broker
+from api.models import Book
+from api.services import create_reader, BookService
+
+
+def test_availability_event():
+    book = Book(serial_number="123456", borrower_id=1)
+
+    assert availability_event(book) == {"serial_number": "123456", "status": "borrowed"}
+    assert availability_event(book, deleted=True)["status"] == "deleted"
+
+
+class TestInProcessBroker:
+    def test_delivers_to_matching_subscribers(self):
+        async def scenario():
+            broker = InProcessBroker()
+            one = broker.subscribe(["123456"])
+            other = broker.subscribe(["654321"])
+            everything = broker.subscribe()
+
+            broker.publish({"serial_number": "123456", "status": "borrowed"})
+            await asyncio.sleep(0)
+
+            return one.queue.qsize(), other.queue.qsize(), everything.queue.qsize()
+
+        assert asyncio.run(scenario()) == (1, 0, 1)
+
+    def test_delivers_only_events_of_the_subscribed_branch(self):
+        async def scenario():
+            broker = InProcessBroker()
+            east = broker.subscribe(["123456"], branch="east")
+            west = broker.subscribe(["123456"], branch="west")
+
+            with use_branch("east"):
+                broker.publish({"serial_number": "123456", "status": "borrowed"})
+            await asyncio.sleep(0)
+
+            return east.queue.qsize(), west.queue.qsize()
+
+        assert asyncio.run(scenario()) == (1, 0)
+
+    def test_unsubscribe(self):
+        async def scenario():
+            broker = InProcessBroker()
+            subscription = broker.subscribe(["123456"])
+            broker.unsubscribe(subscription)
+
+            broker.publish({"serial_number": "123456", "status": "borrowed"})
+            await asyncio.sleep(0)
+
+            return subscription.queue.qsize(), broker.subscriber_count
+
+        assert asyncio.run(scenario()) == (0, 0)
+
+    def test_full_queue_flags_overflow(self):
+        async def scenario():
+            broker = InProcessBroker(max_queue=1)
+            subscription = broker.subscribe()
+            for _ in range(2):
+                broker.publish({"serial_number": "123456", "status": "borrowed"})
+            await asyncio.sleep(0)
+            return subscription.overflowed
+
+        assert asyncio.run(scenario()) is True
+
+    def test_publish_from_another_thread(self):
+        async def scenario():
+            broker = InProcessBroker()
+            subscription = broker.subscribe(["123456"])
+            await asyncio.to_thread(
+                broker.publish, {"serial_number": "123456", "status": "available"}
+            )
+            return await asyncio.wait_for(subscription.queue.get(), 1)
+
+        assert asyncio.run(scenario())["status"] == "available"
+
+
+@pytest.mark.django_db
+def test_status_change_publishes_on_commit(django_capture_on_commit_callbacks):
+    book = BookService.create_book("123456", "Test Book", "Test Author")
+    reader = create_reader("654321")
+    published = []
+    broker = get_broker()
+    original, broker.publish = broker.publish, published.append
+    try:
+        with django_capture_on_commit_callbacks(execute=True):
+            BookService.update_borrow_status(book, reader)
+    finally:
+        broker.publish = original
+
+    assert published == [{"serial_number": "123456", "status": "borrowed"}]
+
+
+class TestBookEventsView:
+    def test_streams_subscribed_events(self):
+        async def scenario():
+            response = await AsyncClient().get("/api/books/events/?serials=123456")
+            chunks = aiter(response.streaming_content)
+            first = await anext(chunks)
+
+            get_broker().publish({"serial_number": "654321", "status": "borrowed"})
+            get_broker().publish({"serial_number": "123456", "status": "borrowed"})
+            second = await asyncio.wait_for(anext(chunks), 1)
+            await chunks.aclose()
+            return response, first, second
+
+        response, first, second = asyncio.run(scenario())
+
+        assert response.status_code == 200
+        assert response["Content-Type"] == "text/event-stream"
+        assert first.startswith(b"retry:")
+        assert second == (
+            b"event: availability\n"
+            b'data: {"serial_number": "123456", "status": "borrowed"}\n\n'
+        )
+
+    def test_heartbeat_on_idle_stream(self, settings):
+        settings.EVENT_STREAM_HEARTBEAT = 0.01
+
+        async def scenario():
+            response = await AsyncClient().get("/api/books/events/")
+            chunks = aiter(response.streaming_content)
+            await anext(chunks)
+            heartbeat = await asyncio.wait_for(anext(chunks), 1)
+            await chunks.aclose()
+            return heartbeat
+
+        assert asyncio.run(scenario()) == b": keep-alive\n\n"
+
+    def test_rejects_invalid_serials(self):
+        async def scenario():
+            return await AsyncClient().get("/api/books/events/?serials=abc")
+
+        assert asyncio.run(scenario()).status_code == 400
+
+    def test_refuses_to_stream_over_wsgi(self):
+        response = Client().get("/api/books/events/")
+
+        assert response.status_code == 501
+        assert "ASGI" in response.json()["detail"]
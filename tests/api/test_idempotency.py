@@ -0,0 +1,158 @@
+import hashlib
+import json
+from datetime import timedelta
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from api.models import Book, IdempotencyKey, Reader
+from api.services import create_reader, BookService
+
+
+def _fingerprint_of(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+@pytest.mark.django_db
+class TestIdempotencyKey:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.client = APIClient()
+        self.books_url = reverse("book-list")
+
+    def post_book(self, key, data=None):
+        data = data or {"serial_number": "123456", "title": "Book", "author": "A"}
+        return self.client.post(
+            self.books_url, data, format="json", HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retried_create_replays_first_response(self):
+        first = self.post_book("key-1")
+        second = self.post_book("key-1")
+
+        assert first.status_code == status.HTTP_201_CREATED
+        assert second.status_code == status.HTTP_201_CREATED
+        assert second.data == first.data
+        assert second["Idempotent-Replayed"] == "true"
+        assert Book.objects.count() == 1
+
+    def test_without_key_runs_every_time(self):
+        self.client.post(
+            self.books_url,
+            {"serial_number": "123456", "title": "Book", "author": "A"},
+            format="json",
+        )
+        response = self.client.post(
+            self.books_url,
+            {"serial_number": "123456", "title": "Book", "author": "A"},
+            format="json",
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_retried_reader_create_replays_first_response(self):
+        url = reverse("reader-create")
+        for _ in range(2):
+            response = self.client.post(
+                url,
+                {"serial_number": "654321"},
+                format="json",
+                HTTP_IDEMPOTENCY_KEY="r",
+            )
+            assert response.status_code == status.HTTP_201_CREATED
+
+        assert Reader.objects.count() == 1
+
+    def test_retried_status_patch_applies_once(self):
+        book = BookService.create_book("123456", "Book", "Author")
+        reader = create_reader("654321")
+        url = reverse("book-status", kwargs={"pk": book.serial_number})
+
+        first = self.client.patch(
+            url, {"borrower": "654321"}, format="json", HTTP_IDEMPOTENCY_KEY="p"
+        )
+        second = self.client.patch(
+            url, {"borrower": "654321"}, format="json", HTTP_IDEMPOTENCY_KEY="p"
+        )
+
+        reader.refresh_from_db()
+        assert second.data["borrow_date"] == first.data["borrow_date"]
+        assert reader.active_loans == 1
+
+    def test_key_reused_with_another_body(self):
+        self.post_book("key-1")
+        response = self.post_book(
+            "key-1", {"serial_number": "123457", "title": "Other", "author": "B"}
+        )
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert not Book.objects.filter(serial_number="123457").exists()
+
+    def test_in_flight_duplicate_times_out_with_conflict(self, settings):
+        settings.IDEMPOTENCY_WAIT_TIMEOUT = 0.1
+        data = {"serial_number": "123456", "title": "Book", "author": "A"}
+        self.post_book("key-1", data)
+        IdempotencyKey.objects.update(status_code=None, response_body=None)
+
+        response = self.post_book("key-1", data)
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+
+    def test_dead_in_flight_request_is_taken_over(self, settings):
+        settings.IDEMPOTENCY_WAIT_TIMEOUT = 5
+        data = {"serial_number": "123456", "title": "Book", "author": "A"}
+        # The worker serving the first request died before storing a response
+        IdempotencyKey.objects.create(
+            key="key-1",
+            method="POST",
+            path=self.books_url,
+            fingerprint=_fingerprint_of(data),
+            claimed_at=timezone.now()
+            - timedelta(seconds=settings.IDEMPOTENCY_LEASE + 1),
+            expires_at=timezone.now() + timedelta(days=1),
+        )
+
+        response = self.post_book("key-1", data)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Book.objects.count() == 1
+        assert IdempotencyKey.objects.get().status_code == 201
+        assert self.post_book("key-1", data)["Idempotent-Replayed"] == "true"
+
+    def test_waiting_retry_takes_over_when_the_lease_expires(self, settings):
+        settings.IDEMPOTENCY_LEASE = 0.2
+        data = {"serial_number": "123456", "title": "Book", "author": "A"}
+        self.post_book("key-1", data)
+        Book.objects.all().delete()
+        IdempotencyKey.objects.update(
+            status_code=None, response_body=None, claimed_at=timezone.now()
+        )
+
+        response = self.post_book("key-1", data)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Book.objects.count() == 1
+
+    def test_expired_key_runs_again(self):
+        self.post_book("key-1")
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        Book.objects.all().delete()
+
+        response = self.post_book("key-1")
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert "Idempotent-Replayed" not in response
+        assert Book.objects.count() == 1
+
+    def test_failed_request_releases_key(self):
+        url = reverse("book-status", kwargs={"pk": "999999"})
+
+        response = self.client.patch(
+            url, {"borrower": None}, format="json", HTTP_IDEMPOTENCY_KEY="p"
+        )
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert not IdempotencyKey.objects.exists()
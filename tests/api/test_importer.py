@@ -0,0 +1,139 @@
+import csv
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from api import importer, stats
+from api.importer import BookImportError, import_books
+from api.models import Book, BookChange, Checkpoint
+from api.services import BookService, create_reader
+
+
+def write_csv(path, rows, header=("serial_number", "title", "author")):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return path
+
+
+@pytest.mark.django_db
+class TestImportBooks:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.tmp_path = tmp_path
+        self.path = write_csv(
+            tmp_path / "books.csv",
+            [
+                ("123450", "Book 0", "Author"),
+                ("12345", "Too short", "Author"),
+                ("123451", "Book 1", "Author"),
+                ("123452", "", "Author"),
+                ("123453", "Book 3", "Author"),
+                ("123454", "Book 4", "Author"),
+            ],
+        )
+
+    def test_imports_valid_rows(self):
+        counts = import_books(self.path, batch_size=2)
+
+        assert counts == {"created": 4, "updated": 0, "unchanged": 0, "rejected": 2}
+        assert list(Book.objects.order_by("pk").values_list("pk", flat=True)) == [
+            "123450",
+            "123451",
+            "123453",
+            "123454",
+        ]
+        assert stats.get_counters()["total"] == 4
+        assert BookChange.objects.filter(op=BookChange.CREATE).count() == 4
+        assert not Checkpoint.objects.exists()
+
+    def test_rejected_rows_go_to_side_file(self):
+        import_books(self.path)
+
+        with open(f"{self.path}.rejected.csv", newline="") as f:
+            rejected = list(csv.DictReader(f))
+        assert [row["serial_number"] for row in rejected] == ["12345", "123452"]
+        assert "title is required." in rejected[1]["error"]
+
+    def test_upserts_existing_books(self):
+        book = BookService.create_book("123450", "Old title", "Author")
+        BookService.update_borrow_status(book, create_reader("654321"))
+        BookService.create_book("123451", "Book 1", "Author")
+
+        counts = import_books(self.path)
+
+        assert counts == {"created": 2, "updated": 1, "unchanged": 1, "rejected": 2}
+        book = Book.objects.get(pk="123450")
+        assert book.title == "Book 0"
+        assert book.borrower.serial_number == "654321"
+        assert stats.get_counters() == {"total": 4, "borrowed": 1, "available": 3}
+        assert BookChange.objects.filter(
+            serial_number="123450", op=BookChange.UPDATE
+        ).exists()
+        assert not BookChange.objects.filter(
+            serial_number="123451", op=BookChange.UPDATE
+        ).exists()
+
+    def test_duplicate_rows_in_a_batch(self):
+        path = write_csv(
+            self.tmp_path / "duplicates.csv",
+            [("123450", "First", "Author"), ("123450", "Second", "Author")],
+        )
+
+        import_books(path)
+
+        assert Book.objects.get(pk="123450").title == "Second"
+
+    def test_resumes_after_interruption(self):
+        upsert = importer._upsert
+        calls = []
+
+        def failing_upsert(rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise RuntimeError("Connection lost")
+            return upsert(rows)
+
+        with mock.patch.object(importer, "_upsert", failing_upsert):
+            with pytest.raises(RuntimeError):
+                import_books(self.path, batch_size=2)
+        assert Checkpoint.objects.get().position["rows"] == 2
+
+        counts = import_books(self.path, batch_size=2)
+
+        assert counts == {"created": 3, "updated": 0, "unchanged": 0, "rejected": 1}
+        assert Book.objects.count() == 4
+
+    def test_modified_file_starts_over(self):
+        Checkpoint.objects.create(
+            name=f"import_books:{self.path}",
+            position={"source": {"size": 1, "mtime": 0}, "rows": 4},
+        )
+
+        assert import_books(self.path)["created"] == 4
+
+    def test_missing_columns(self):
+        path = write_csv(
+            self.tmp_path / "bad.csv", [("123450", "Book")], ("serial_number", "name")
+        )
+
+        with pytest.raises(BookImportError):
+            import_books(path)
+
+
+@pytest.mark.django_db
+class TestImportBooksCommand:
+    def test_import(self, tmp_path):
+        path = write_csv(tmp_path / "books.csv", [("123450", "Book", "Author")])
+        out = StringIO()
+
+        call_command("import_books", str(path), stdout=out)
+
+        assert "1 created, 0 updated, 0 unchanged, 0 rejected" in out.getvalue()
+
+    def test_missing_file(self, tmp_path):
+        with pytest.raises(CommandError):
+            call_command("import_books", str(tmp_path / "missing.csv"))
@@ -0,0 +1,241 @@
+import csv
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import QuerySet
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import jobs
+from api.branches import atomic
+from api.jobs import claim, enqueue, requeue_stale, run_job, run_worker
+from api.models import Job
+from api.services import BookService, create_reader
+
+
+@pytest.fixture
+def registry():
+    """Jobs registered by a test are removed after it"""
+    with mock.patch.dict(jobs.registry):
+        yield jobs.registry
+
+
+@pytest.mark.django_db
+class TestJobQueue:
+    @pytest.fixture(autouse=True)
+    def setup(self, registry, settings):
+        settings.JOBS = {**settings.JOBS, "RETRY_DELAY": 10}
+        self.calls = []
+
+        @jobs.job("add")
+        def add(context, a, b):
+            self.calls.append((a, b))
+            context.progress(1, 1)
+            return a + b
+
+        @jobs.job("fail", max_attempts=2)
+        def fail(context):
+            raise RuntimeError("boom")
+
+    def test_enqueue_unknown_job(self):
+        with pytest.raises(LookupError):
+            enqueue("missing")
+
+    def test_claim_takes_oldest_due_job(self):
+        first = enqueue("add", a=1, b=2)
+        enqueue("add", a=3, b=4)
+        Job.objects.create(name="add", run_after=timezone.now() + timedelta(minutes=5))
+
+        job = claim("worker-1")
+
+        assert job.pk == first.pk
+        assert job.status == Job.RUNNING
+        assert job.locked_by == "worker-1"
+        assert job.attempts == 1
+        assert claim("worker-2").pk != first.pk
+        assert claim("worker-3") is None
+
+    def test_claim_skips_job_taken_by_another_worker(self):
+        taken = enqueue("add", a=1, b=2)
+        free = enqueue("add", a=3, b=4)
+        update = QuerySet.update
+        raced = []
+
+        def racing_update(queryset, **kwargs):
+            # Another worker takes the first candidate just before us
+            if not raced:
+                raced.append(True)
+                update(
+                    Job.objects.filter(pk=taken.pk),
+                    status=Job.RUNNING,
+                    locked_by="worker-2",
+                )
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, "update", racing_update):
+            job = claim("worker-1")
+
+        assert job.pk == free.pk
+        taken.refresh_from_db()
+        assert taken.locked_by == "worker-2"
+
+    def test_run_job_records_result(self):
+        enqueue("add", a=1, b=2)
+        job = claim("worker-1")
+
+        assert run_job(job, "worker-1") == Job.SUCCEEDED
+
+        job.refresh_from_db()
+        assert job.status == Job.SUCCEEDED
+        assert job.result == 3
+        assert (job.progress, job.total) == (1, 1)
+        assert job.locked_by == ""
+        assert job.finished_at is not None
+
+    def test_failed_job_is_retried_with_backoff(self):
+        enqueue("fail")
+        job = claim("worker-1")
+
+        assert run_job(job, "worker-1") == Job.QUEUED
+
+        job.refresh_from_db()
+        assert "RuntimeError: boom" in job.error
+        assert job.run_after >= timezone.now() + timedelta(seconds=9)
+        assert claim("worker-1") is None
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        job = claim("worker-1")
+        assert job.attempts == 2
+        assert run_job(job, "worker-1") == Job.FAILED
+        job.refresh_from_db()
+        assert job.status == Job.FAILED
+        assert job.finished_at is not None
+
+    def test_stale_job_is_requeued(self):
+        enqueue("add", a=1, b=2)
+        job = claim("worker-1")
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(hours=1)
+        )
+
+        assert requeue_stale(lease_seconds=60) == 1
+
+        job.refresh_from_db()
+        assert job.status == Job.QUEUED
+        assert job.locked_by == ""
+        # The lost worker can't record a result any more
+        assert run_job(claim("worker-2"), "worker-2") == Job.SUCCEEDED
+        assert run_job(job, "worker-1") is None
+
+    def test_stale_job_out_of_attempts_fails(self):
+        enqueue("add", max_attempts=1, a=1, b=2)
+        job = claim("worker-1")
+        Job.objects.filter(pk=job.pk).update(
+            locked_at=timezone.now() - timedelta(hours=1)
+        )
+
+        requeue_stale(lease_seconds=60)
+
+        job.refresh_from_db()
+        assert job.status == Job.FAILED
+
+    def test_run_worker_once(self):
+        enqueue("add", a=1, b=2)
+        enqueue("add", a=3, b=4)
+
+        assert run_worker("worker-1", once=True) == 2
+        assert self.calls == [(1, 2), (3, 4)]
+        assert not Job.objects.exclude(status=Job.SUCCEEDED).exists()
+
+    def test_run_worker_max_jobs(self):
+        enqueue("add", a=1, b=2)
+        enqueue("add", a=3, b=4)
+
+        assert run_worker("worker-1", once=True, max_jobs=1) == 1
+        assert Job.objects.filter(status=Job.QUEUED).count() == 1
+
+    def test_command(self):
+        enqueue("add", a=1, b=2)
+        out = StringIO()
+
+        call_command("run_worker", "--once", "--worker-id", "w", stdout=out)
+
+        assert "w ran 1 job(s)." in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestJobEndpoints:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, tmp_path):
+        settings.JOBS = {**settings.JOBS, "EXPORT_DIR": str(tmp_path)}
+        self.client = APIClient()
+        reader = create_reader("654321")
+        BookService.create_book("123456", "Book", "Author")
+        BookService.create_book("123457", "Other", "Author")
+        BookService.update_borrow_status(BookService.get_by_serial("123456"), reader)
+        self.reader = reader
+
+    def test_export_returns_accepted_job(self):
+        """Test that the export is queued instead of run in the request"""
+        response = self.client.post(reverse("book-export"))
+
+        assert response.status_code == 202
+        assert response.data["status"] == Job.QUEUED
+        assert response["Location"] == reverse("job-detail", args=[response.data["id"]])
+
+    def test_export_job_writes_csv(self):
+        """Test that a worker runs the export and the job reports its file"""
+        job_id = self.client.post(reverse("book-export")).data["id"]
+        run_worker("worker-1", once=True)
+
+        response = self.client.get(reverse("job-detail", args=[job_id]))
+
+        assert response.status_code == 200
+        assert response.data["status"] == Job.SUCCEEDED
+        assert (response.data["progress"], response.data["total"]) == (2, 2)
+        assert response.data["result"]["rows"] == 2
+        with open(response.data["result"]["path"], newline="") as f:
+            rows = list(csv.DictReader(f))
+        assert [row["serial_number"] for row in rows] == ["123456", "123457"]
+        assert rows[0]["borrower_serial_number"] == self.reader.serial_number
+        assert rows[1]["borrow_date"] == ""
+
+    def test_unknown_job(self):
+        """Test that an unknown job id returns 404"""
+        response = self.client.get(reverse("job-detail", args=[999]))
+
+        assert response.status_code == 404
+
+
+@pytest.mark.django_db(transaction=True)
+class TestProgressInTransaction:
+    def test_progress_outside_the_jobs_transaction(self, registry):
+        @jobs.job("read")
+        def read(context):
+            with atomic():
+                context.outside_transaction(context.progress)(5, 10)
+                # Progress survives the rollback, so it was written elsewhere
+                transaction.set_rollback(True)
+
+        enqueue("read")
+        job = claim("worker-1")
+
+        assert run_job(job, "worker-1") == Job.SUCCEEDED
+
+        job.refresh_from_db()
+        assert (job.progress, job.total) == (5, 10)
+
+    def test_snapshot_job(self, registry, tmp_path):
+        BookService.create_book("123456", "Book", "Author")
+        job = enqueue("snapshot", path=str(tmp_path / "library.jsonl.gz"))
+
+        assert run_job(claim("worker-1"), "worker-1") == Job.SUCCEEDED
+
+        job.refresh_from_db()
+        assert job.result["book"] == 1
+        assert job.progress == 1
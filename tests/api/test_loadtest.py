@@ -0,0 +1,183 @@
+import json
+import random
+import socket
+import threading
+from collections import Counter
+from io import StringIO
+
+import pytest
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+
+from api.loadtest import HTTPConnection, ZipfSampler, parse_mix
+from api.models import Book, Reader
+
+
+class TestParseMix:
+    def test_weights(self):
+        assert parse_mix("retrieve=3, status=1") == {"retrieve": 3.0, "status": 1.0}
+
+    @pytest.mark.parametrize("value", ["browse=1", "retrieve=-1", "retrieve=0"])
+    def test_invalid(self, value):
+        with pytest.raises(ValueError):
+            parse_mix(value)
+
+
+class TestZipfSampler:
+    def test_popularity_falls_with_rank(self):
+        sampler = ZipfSampler(100, 1.1, random.Random(1))
+
+        counts = Counter(sampler.sample() for _ in range(20000))
+
+        assert set(counts) <= set(range(100))
+        assert counts[0] > counts[1] > counts[9] > counts[99]
+        assert counts[0] / 20000 > 0.15
+
+    def test_zero_exponent_is_uniform(self):
+        sampler = ZipfSampler(4, 0, random.Random(1))
+
+        counts = Counter(sampler.sample() for _ in range(20000))
+
+        assert all(4000 < count < 6000 for count in counts.values())
+
+
+@pytest.mark.django_db(transaction=True)
+class TestLoadTestCommand:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        # Rate limited like production, with empty buckets for each test
+        settings.RATE_LIMIT = {
+            "ENABLED": True,
+            "RATE": 20,
+            "BURST": 100,
+            "BACKEND": "api.throttling.CacheBucketStore",
+            "OPTIONS": {},
+        }
+        cache.clear()
+
+    def test_runs_the_mix_and_reports(self, live_server, tmp_path):
+        output = tmp_path / "report.json"
+
+        # One connection: the live server's threads share one SQLite connection
+        call_command(
+            "loadtest",
+            live_server.url,
+            "--setup",
+            "--duration",
+            "1",
+            "--concurrency",
+            "1",
+            "--books",
+            "20",
+            "--readers",
+            "5",
+            "--mix",
+            "list=1,retrieve=4,status=4,create=2,delete=1",
+            "--seed",
+            "1",
+            "--output",
+            str(output),
+            stdout=StringIO(),
+        )
+
+        report = json.loads(output.read_text())
+        assert report["requests"] > 0
+        assert report["errors"] == 0
+        assert set(report["endpoints"]) == {
+            "list",
+            "retrieve",
+            "status",
+            "create",
+            "delete",
+        }
+        retrieve = report["endpoints"]["retrieve"]
+        assert retrieve["status"] == {"200": retrieve["requests"]}
+        assert retrieve["latency_ms"]["p50"] <= retrieve["latency_ms"]["p99"]
+        assert Book.objects.count() == 20
+        assert Reader.objects.count() == 5
+
+    def test_setup_waits_out_rate_limiting(self, live_server, settings, monkeypatch):
+        settings.RATE_LIMIT = {**settings.RATE_LIMIT, "RATE": 10, "BURST": 5}
+        statuses = Counter()
+        request = HTTPConnection.request
+
+        async def counting_request(connection, *args):
+            response = await request(connection, *args)
+            statuses[response[0]] += 1
+            return response
+
+        monkeypatch.setattr(HTTPConnection, "request", counting_request)
+        call_command(
+            "loadtest",
+            live_server.url,
+            "--setup",
+            "--duration",
+            "0.1",
+            "--concurrency",
+            "1",
+            "--books",
+            "10",
+            "--readers",
+            "5",
+            stdout=StringIO(),
+        )
+
+        assert statuses[429] > 0
+        assert Book.objects.count() == 10
+        assert Reader.objects.count() == 5
+
+    def test_setup_fails_on_refused_requests(self, live_server):
+        with pytest.raises(CommandError, match="returned 400"):
+            call_command(
+                "loadtest",
+                live_server.url,
+                "--setup",
+                "--first-serial",
+                "12",
+                "--books",
+                "1",
+                "--readers",
+                "1",
+                stdout=StringIO(),
+            )
+
+    def test_broken_server(self):
+        # Accepts connections and closes them without answering
+        server = socket.create_server(("127.0.0.1", 0))
+
+        def serve():
+            while True:
+                try:
+                    connection, _ = server.accept()
+                except OSError:
+                    return
+                connection.recv(65536)
+                connection.close()
+
+        threading.Thread(target=serve, daemon=True).start()
+        try:
+            with pytest.raises(CommandError, match="Can't reach"):
+                call_command(
+                    "loadtest",
+                    f"http://127.0.0.1:{server.getsockname()[1]}",
+                    "--setup",
+                    stdout=StringIO(),
+                )
+        finally:
+            server.close()
+
+    def test_unreachable_server(self):
+        with pytest.raises(CommandError, match="Can't reach"):
+            call_command(
+                "loadtest",
+                "http://127.0.0.1:1",
+                "--duration",
+                "0.1",
+                "--concurrency",
+                "1",
+                stdout=StringIO(),
+            )
+
+    def test_invalid_mix(self):
+        with pytest.raises(CommandError):
+            call_command("loadtest", "http://localhost:8000", "--mix", "browse=1")
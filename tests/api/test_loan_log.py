@@ -0,0 +1,155 @@
+import pytest
+from django.db import OperationalError
+from django.db.models import QuerySet
+
+from api import loan_log
+from api.loan_log import (
+    LoanEventBuffer,
+    get_book_history,
+    get_reader_history,
+    record_loan_event,
+)
+from api.models import LoanEvent
+from api.services import create_reader, BookService
+
+
+@pytest.mark.django_db
+class TestLoanEventBuffer:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.buffer = LoanEventBuffer()
+
+    def make_event(self, event=LoanEvent.BORROW):
+        return LoanEvent(
+            book_serial_number="123456",
+            reader_serial_number="654321",
+            event=event,
+            created_at="2025-05-11T14:30:00Z",
+        )
+
+    def test_events_wait_in_buffer_until_flushed(self):
+        self.buffer.add(self.make_event())
+
+        assert len(self.buffer) == 1
+        assert LoanEvent.objects.count() == 0
+
+        assert self.buffer.flush() == 1
+        assert LoanEvent.objects.count() == 1
+        assert len(self.buffer) == 0
+
+    def test_full_buffer_flushes(self, settings):
+        settings.LOAN_EVENTS = {**settings.LOAN_EVENTS, "BATCH_SIZE": 3}
+
+        for _ in range(3):
+            self.buffer.add(self.make_event())
+
+        assert LoanEvent.objects.count() == 3
+        assert len(self.buffer) == 0
+
+    def fail_writes(self, monkeypatch):
+        def bulk_create(*args, **kwargs):
+            raise OperationalError("server closed the connection unexpectedly")
+
+        monkeypatch.setattr(QuerySet, "bulk_create", bulk_create)
+
+    def test_failed_write_is_retried(self, monkeypatch):
+        self.buffer.add(self.make_event(LoanEvent.BORROW))
+        with monkeypatch.context() as patch:
+            self.fail_writes(patch)
+            with pytest.raises(OperationalError):
+                self.buffer.flush()
+        self.buffer.add(self.make_event(LoanEvent.RETURN))
+
+        assert len(self.buffer) == 2
+        assert self.buffer.flush() == 2
+        assert list(
+            LoanEvent.objects.order_by("pk").values_list("event", flat=True)
+        ) == [
+            LoanEvent.BORROW,
+            LoanEvent.RETURN,
+        ]
+
+    def test_events_kept_for_retry_are_bounded(self, settings, monkeypatch):
+        settings.LOAN_EVENTS = {**settings.LOAN_EVENTS, "MAX_PENDING": 2}
+        self.fail_writes(monkeypatch)
+        for _ in range(3):
+            self.buffer.add(self.make_event())
+
+        with pytest.raises(OperationalError):
+            self.buffer.flush()
+
+        assert len(self.buffer) == 2
+        assert self.buffer.dropped == 1
+
+
+@pytest.mark.django_db
+class TestRecordLoanEvent:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.book = BookService.create_book("123456", "Test Book", "Test Author")
+        self.reader = create_reader("654321")
+        # Drop events buffered by earlier tests
+        loan_log.buffer.flush()
+        LoanEvent.objects.all().delete()
+        yield
+        loan_log.buffer.flush()
+
+    def test_buffered_after_commit(self, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            record_loan_event("123456", "654321", LoanEvent.BORROW)
+
+        assert LoanEvent.objects.count() == 0
+        loan_log.buffer.flush()
+        assert LoanEvent.objects.count() == 1
+
+    def test_not_recorded_without_commit(self, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks() as callbacks:
+            record_loan_event("123456", "654321", LoanEvent.BORROW)
+
+        assert len(callbacks) == 1
+        assert len(loan_log.buffer) == 0
+
+    def test_durable_mode_writes_immediately(self, settings):
+        settings.LOAN_EVENTS = {**settings.LOAN_EVENTS, "DURABLE": True}
+
+        record_loan_event("123456", "654321", LoanEvent.BORROW)
+
+        assert LoanEvent.objects.count() == 1
+
+    def test_transitions_are_logged(self, settings):
+        settings.LOAN_EVENTS = {**settings.LOAN_EVENTS, "DURABLE": True}
+        other = create_reader("654322")
+
+        BookService.update_borrow_status(self.book, self.reader)
+        BookService.update_borrow_status(self.book, self.reader)
+        BookService.update_borrow_status(self.book, other)
+        BookService.update_borrow_status(self.book, None)
+
+        assert [
+            (e.event, e.reader_serial_number) for e in get_book_history("123456")
+        ] == [
+            (LoanEvent.RETURN, "654322"),
+            (LoanEvent.BORROW, "654322"),
+            (LoanEvent.RETURN, "654321"),
+            (LoanEvent.BORROW, "654321"),
+        ]
+        assert [e.event for e in get_reader_history("654321")] == [
+            LoanEvent.RETURN,
+            LoanEvent.BORROW,
+        ]
+
+    def test_deleting_borrowed_book_logs_return(self, settings):
+        settings.LOAN_EVENTS = {**settings.LOAN_EVENTS, "DURABLE": True}
+        BookService.update_borrow_status(self.book, self.reader)
+
+        BookService.delete("123456")
+
+        assert get_book_history("123456").first().event == LoanEvent.RETURN
+
+    def test_deleting_reader_logs_return(self, settings):
+        settings.LOAN_EVENTS = {**settings.LOAN_EVENTS, "DURABLE": True}
+        BookService.update_borrow_status(self.book, self.reader)
+
+        self.reader.delete()
+
+        assert get_reader_history("654321").first().event == LoanEvent.RETURN
@@ -0,0 +1,163 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from api.middleware import (
+    AdaptiveConcurrencyLimiter,
+    ConcurrencyLimitMiddleware,
+    queue_time,
+)
+
+
+class TestAdaptiveConcurrencyLimiter:
+    def test_rejects_above_limit(self):
+        limiter = AdaptiveConcurrencyLimiter(2, 1, 10, latency_target=1)
+
+        assert limiter.acquire() is True
+        assert limiter.acquire() is True
+        assert limiter.acquire() is False
+
+    def test_slow_requests_shrink_limit(self):
+        limiter = AdaptiveConcurrencyLimiter(10, 4, 20, latency_target=0.1)
+
+        limiter.acquire()
+        limiter.release(latency=1.0)
+
+        assert limiter.limit == pytest.approx(9)
+        assert limiter.in_flight == 0
+
+    def test_fast_busy_requests_grow_limit(self):
+        limiter = AdaptiveConcurrencyLimiter(2, 1, 3, latency_target=1)
+
+        for _ in range(3):
+            limiter.acquire()
+            limiter.acquire()
+            limiter.release(latency=0.01)
+            limiter.release(latency=0.01)
+
+        assert limiter.limit == 3
+
+
+class TestConcurrencyLimitMiddleware:
+    def test_sheds_api_requests_with_503(self, settings):
+        settings.CONCURRENCY_LIMIT = {
+            **settings.CONCURRENCY_LIMIT,
+            "ENABLED": True,
+            "INITIAL_LIMIT": 1,
+            "MIN_LIMIT": 1,
+        }
+        factory = RequestFactory()
+        responses = []
+
+        def view(request):
+            # A second request arriving while this one is in flight is shed
+            responses.append(middleware(factory.get("/api/books/")))
+            return HttpResponse()
+
+        middleware = ConcurrencyLimitMiddleware(view)
+        response = middleware(factory.get("/api/books/"))
+
+        assert response.status_code == 200
+        assert responses[0].status_code == 503
+        assert responses[0]["Retry-After"] == "1"
+        assert middleware.limiter.in_flight == 0
+
+    def test_ignores_non_api_paths(self, settings):
+        settings.CONCURRENCY_LIMIT = {
+            **settings.CONCURRENCY_LIMIT,
+            "INITIAL_LIMIT": 0,
+        }
+        middleware = ConcurrencyLimitMiddleware(lambda request: HttpResponse())
+
+        response = middleware(RequestFactory().get("/admin/"))
+
+        assert response.status_code == 200
+
+    def test_queue_time_counts_toward_latency(self, settings):
+        settings.CONCURRENCY_LIMIT = {
+            **settings.CONCURRENCY_LIMIT,
+            "INITIAL_LIMIT": 10,
+            "MIN_LIMIT": 1,
+            "LATENCY_TARGET": 1,
+            "QUEUE_START_HEADER": "X-Request-Start",
+        }
+        middleware = ConcurrencyLimitMiddleware(lambda request: HttpResponse())
+
+        middleware(
+            RequestFactory().get(
+                "/api/books/", headers={"X-Request-Start": f"t={time.time() - 2}"}
+            )
+        )
+
+        assert middleware.limiter.limit == pytest.approx(9)
+
+    @pytest.mark.parametrize("value", ["", "t=soon", "t=-inf", f"t={2**40}"])
+    def test_ignores_unusable_queue_start(self, value):
+        request = RequestFactory().get(
+            "/api/books/", headers={"X-Request-Start": value}
+        )
+
+        assert queue_time(request, "X-Request-Start") == 0
+        assert queue_time(request, "") == 0
+
+
+class TestLoadShedding:
+    """
+    More clients than threads: requests queue for one of THREADS threads,
+    each taking SERVICE_TIME, like in a gthread worker.
+    """
+
+    THREADS = 2
+    SERVICE_TIME = 0.1
+
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.CONCURRENCY_LIMIT = {
+            **settings.CONCURRENCY_LIMIT,
+            "ENABLED": True,
+            "INITIAL_LIMIT": self.THREADS,
+            "MIN_LIMIT": 1,
+            "MAX_LIMIT": self.THREADS,
+            "LATENCY_TARGET": 0.15,
+            "QUEUE_START_HEADER": "X-Request-Start",
+        }
+
+    def serve(self, clients):
+        def view(request):
+            time.sleep(self.SERVICE_TIME)
+            return HttpResponse()
+
+        middleware = ConcurrencyLimitMiddleware(view)
+        factory = RequestFactory()
+        with ThreadPoolExecutor(self.THREADS) as threads:
+            responses = [
+                threads.submit(
+                    middleware,
+                    factory.get(
+                        "/api/books/",
+                        headers={"X-Request-Start": f"t={time.time()}"},
+                    ),
+                )
+                for _ in range(clients)
+            ]
+        return [response.result().status_code for response in responses]
+
+    def test_sheds_when_requests_queue(self):
+        statuses = self.serve(clients=6 * self.THREADS)
+
+        assert statuses[: self.THREADS] == [200] * self.THREADS
+        assert 503 in statuses
+
+    def test_threads_alone_never_fill_the_limit(self, settings):
+        """Without queue times only slow service shrinks the limit"""
+        settings.CONCURRENCY_LIMIT = {
+            **settings.CONCURRENCY_LIMIT,
+            "QUEUE_START_HEADER": "",
+        }
+
+        statuses = self.serve(clients=6 * self.THREADS)
+
+        assert statuses == [200] * (6 * self.THREADS)
@@ -0,0 +1,146 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+from django.utils import timezone
+
+from api.models import Book, Checkpoint, OverdueNotice, Reader
+from api.notifications import JsonLinesSink, NoticeSink, send_overdue_notices
+from api.services import BookService, create_reader
+
+
+class RecordingSink(NoticeSink):
+    def __init__(self, fail_after=None):
+        self.sent = []
+        self.fail_after = fail_after
+
+    def send(self, notices):
+        if self.fail_after is not None and len(self.sent) >= self.fail_after:
+            raise RuntimeError("Sink unavailable")
+        self.sent.extend(notice.book_serial_number for notice in notices)
+
+
+@pytest.mark.django_db
+class TestDueDates:
+    def test_borrow_sets_due_date(self, settings):
+        settings.LOAN_PERIOD_DAYS = 7
+        book = BookService.create_book("123456", "Book", "Author")
+
+        book = BookService.update_borrow_status(book, create_reader("654321"))
+
+        assert book.due_date == book.borrow_date + timedelta(days=7)
+
+    def test_return_clears_due_date(self):
+        book = BookService.create_book("123456", "Book", "Author")
+        BookService.update_borrow_status(book, create_reader("654321"))
+
+        book = BookService.update_borrow_status(book, None)
+
+        assert book.due_date is None
+
+    def test_reader_delete_clears_due_date(self):
+        book = BookService.create_book("123456", "Book", "Author")
+        reader = create_reader("654321")
+        BookService.update_borrow_status(book, reader)
+
+        reader.delete()
+
+        assert Book.objects.get(pk="123456").due_date is None
+
+
+@pytest.mark.django_db
+class TestSendOverdueNotices:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.reader = Reader.objects.create(serial_number="654321")
+        now = timezone.now()
+        self.books = [
+            Book.objects.create(
+                serial_number=f"12345{i}",
+                title=f"Book {i}",
+                author="Author",
+                borrower=self.reader,
+                borrow_date=now - timedelta(days=20 - i),
+                due_date=now - timedelta(days=6 - i),
+            )
+            for i in range(5)
+        ]
+        # Not due yet, and not borrowed
+        Book.objects.create(
+            serial_number="123459",
+            title="Book 9",
+            author="Author",
+            borrower=self.reader,
+            borrow_date=now,
+            due_date=now + timedelta(days=14),
+        )
+        Book.objects.create(serial_number="123458", title="Book 8", author="Author")
+        self.today = date(2026, 1, 1)
+
+    def test_notifies_overdue_loans_in_chunks(self):
+        sink = RecordingSink()
+
+        sent = send_overdue_notices(self.today, chunk_size=2, sink=sink)
+
+        assert sent == 5
+        assert sink.sent == [book.serial_number for book in self.books]
+        assert OverdueNotice.objects.filter(notice_date=self.today).count() == 5
+        assert not Checkpoint.objects.exists()
+
+    def test_does_not_renotify_same_day(self):
+        send_overdue_notices(self.today, sink=RecordingSink())
+        sink = RecordingSink()
+
+        assert send_overdue_notices(self.today, sink=sink) == 0
+        assert sink.sent == []
+        assert send_overdue_notices(self.today + timedelta(days=1), sink=sink) == 5
+
+    def test_new_loan_of_same_book_is_notified(self):
+        send_overdue_notices(self.today, sink=RecordingSink())
+        book = self.books[0]
+        book.borrow_date -= timedelta(days=1)
+        book.save()
+
+        assert send_overdue_notices(self.today, sink=RecordingSink()) == 1
+
+    def test_resumes_after_interruption(self):
+        with pytest.raises(RuntimeError):
+            send_overdue_notices(
+                self.today, chunk_size=2, sink=RecordingSink(fail_after=2)
+            )
+        assert OverdueNotice.objects.count() == 2
+        assert Checkpoint.objects.get().position["serial_number"] == "123451"
+
+        sink = RecordingSink()
+        assert send_overdue_notices(self.today, chunk_size=2, sink=sink) == 3
+        assert sink.sent == ["123452", "123453", "123454"]
+
+    def test_restart_ignores_checkpoint(self):
+        with pytest.raises(RuntimeError):
+            send_overdue_notices(
+                self.today, chunk_size=2, sink=RecordingSink(fail_after=2)
+            )
+        OverdueNotice.objects.all().delete()
+
+        assert send_overdue_notices(self.today, sink=RecordingSink(), restart=True) == 5
+
+
+class TestJsonLinesSink:
+    def test_appends_notices(self, tmp_path):
+        path = tmp_path / "notices.jsonl"
+        sink = JsonLinesSink(path)
+        now = timezone.now()
+        notice = OverdueNotice(
+            book_serial_number="123456",
+            reader_serial_number="654321",
+            borrow_date=now,
+            due_date=now,
+            notice_date=date(2026, 1, 1),
+        )
+
+        sink.send([notice])
+        sink.send([notice])
+
+        lines = path.read_text().splitlines()
+        assert len(lines) == 2
+        assert json.loads(lines[0])["notice_date"] == "2026-01-01"
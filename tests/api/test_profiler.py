@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.profiler import ProfileStore, StackSampler, function_samples, get_store
+from api.services import BookService
+
+
+def spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class TestStackSampler:
+    def test_samples_the_stacks_of_the_thread(self):
+        sampler = StackSampler(interval=0.001).start()
+        spin(0.05)
+        stacks = sampler.stop()
+
+        assert sum(stacks.values()) > 0
+        assert any(stack.endswith("test_profiler:spin") for stack in stacks)
+
+    def test_keeps_at_most_max_stacks(self):
+        done = threading.Event()
+        thread = threading.Thread(target=done.wait)
+        thread.start()
+        sampler = StackSampler(thread.ident, interval=0.001, max_stacks=0).start()
+        time.sleep(0.02)
+        stacks = sampler.stop()
+        done.set()
+        thread.join()
+
+        assert list(stacks) == ["[truncated]"]
+
+
+class TestProfileStore:
+    def test_overwrites_the_oldest_profiles(self, tmp_path):
+        store = ProfileStore(tmp_path, capacity=3)
+
+        ids = [store.add({"path": f"/api/books/{i}/"}) for i in range(5)]
+
+        assert ids == [1, 2, 3, 4, 5]
+        assert [profile["id"] for profile in store.list()] == [5, 4, 3]
+        assert store.get(1) is None
+        assert store.get(4)["path"] == "/api/books/3/"
+        assert len(list(tmp_path.glob("profile-*.json"))) == 3
+
+    def test_function_samples(self):
+        assert function_samples("a;b 3\na;c;b 1\na 2\n") == [
+            ("a", 2, 6),
+            ("b", 4, 4),
+            ("c", 0, 1),
+        ]
+
+
+@pytest.mark.django_db
+class TestProfilerMiddleware:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, tmp_path):
+        settings.PROFILER = {
+            **settings.PROFILER,
+            "ENABLED": True,
+            "TOKEN": "secret",
+            "DIR": str(tmp_path),
+        }
+        self.client = APIClient()
+        self.url = reverse("book-detail", args=["123456"])
+        BookService.create_book("123456", "Book", "Author")
+
+    def test_profiles_requests_with_the_token(self):
+        """Test that a request sending the profile token is profiled"""
+        response = self.client.get(self.url, HTTP_X_PROFILE_TOKEN="secret")
+
+        assert response.status_code == 200
+        profile = get_store().get(int(response["X-Profile-Id"]))
+        assert profile["path"] == "/api/books/123456/"
+        assert profile["trigger"] == "token"
+        assert profile["status"] == 200
+
+    def test_rejects_a_wrong_token(self):
+        """Test that a wrong profile token returns 403"""
+        response = self.client.get(self.url, HTTP_X_PROFILE_TOKEN="guess")
+
+        assert response.status_code == 403
+        assert get_store().list() == []
+
+    def test_samples_requests(self, settings):
+        """Test that SAMPLE_RATE selects requests at random"""
+        response = self.client.get(self.url)
+        assert "X-Profile-Id" not in response
+
+        settings.PROFILER = {**settings.PROFILER, "SAMPLE_RATE": 1}
+        response = self.client.get(self.url)
+
+        assert get_store().get(int(response["X-Profile-Id"]))["trigger"] == "sampled"
+
+    def test_disabled(self, settings):
+        """Test that nothing is profiled while the profiler is disabled"""
+        settings.PROFILER = {**settings.PROFILER, "ENABLED": False, "SAMPLE_RATE": 1}
+
+        response = self.client.get(self.url, HTTP_X_PROFILE_TOKEN="secret")
+
+        assert "X-Profile-Id" not in response
+        assert get_store().list() == []
+
+
+@pytest.mark.django_db
+class TestProfileAdmin:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, tmp_path, admin_client):
+        settings.PROFILER = {**settings.PROFILER, "DIR": str(tmp_path)}
+        self.client = admin_client
+        self.profile_id = get_store().add(
+            {
+                "method": "GET",
+                "path": "/api/books/123456/",
+                "status": 200,
+                "trigger": "token",
+                "started_at": "2026-10-19T09:00:00+00:00",
+                "duration_ms": 12.5,
+                "interval_ms": 1.0,
+                "samples": 3,
+                "pid": 1,
+                "stacks": "main;api.views:BookViewSet.retrieve 3\n",
+            }
+        )
+
+    def test_lists_profiles(self):
+        response = self.client.get(reverse("admin:profile_list"))
+
+        assert response.status_code == 200
+        assert b"/api/books/123456/" in response.content
+        index = self.client.get(reverse("admin:index"))
+        assert b"Request profiles" in index.content
+
+    def test_profile_detail_and_download(self):
+        url = reverse("admin:profile_detail", args=[self.profile_id])
+
+        response = self.client.get(url)
+        download = self.client.get(url, {"format": "collapsed"})
+
+        assert b"api.views:BookViewSet.retrieve" in response.content
+        assert download["Content-Type"].startswith("text/plain")
+        assert download.content == b"main;api.views:BookViewSet.retrieve 3\n"
+
+    def test_staff_without_superuser_is_refused(self, client, django_user_model):
+        staff = django_user_model.objects.create_user(
+            "staff", password="x", is_staff=True
+        )
+        client.force_login(staff)
+
+        response = client.get(reverse("admin:profile_list"))
+
+        assert response.status_code == 403
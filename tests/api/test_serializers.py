@@ -0,0 +1,33 @@
+from unittest import mock
+
+from rest_framework import serializers
+
+from api.models import Book
+from api.serializers import BookListSerializer, BookSerializer
+
+
+class TestCachedFieldsMixin:
+    def test_fields_are_built_once_per_class(self):
+        class CountingSerializer(BookSerializer):
+            pass
+
+        with mock.patch.object(
+            serializers.ModelSerializer,
+            "get_fields",
+            autospec=True,
+            side_effect=serializers.ModelSerializer.get_fields,
+        ) as get_fields:
+            for _ in range(3):
+                CountingSerializer().fields
+
+        assert get_fields.call_count == 1
+
+    def test_instances_get_their_own_fields(self):
+        book = Book(serial_number="123456", title="Title", author="Author")
+
+        sparse = BookListSerializer(book, fields=["serial_number"])
+        full = BookListSerializer(book)
+
+        assert sparse.data == {"serial_number": "123456"}
+        assert set(full.data) == set(BookListSerializer.Meta.fields)
+        assert full.fields["title"].parent is full
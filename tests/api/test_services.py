@@ -2,7 +2,13 @@ import pytest
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from datetime import timedelta
-from api.services import create_reader, BookService
+from api.services import (
+    create_reader,
+    reconcile_loan_counters,
+    BookService,
+    ReservationService,
+)
+from api import stats
 from api.models import Book, Reader
 
 
@@ -182,3 +188,236 @@ class TestBookService:
         assert updated_book.borrow_date > old_date
         assert book.borrower == reader2
         assert book.borrow_date > old_date
+
+    def test_update_borrow_status_of_a_book_withdrawn_meanwhile(self):
+        book = BookService.create_book("123456", "Test Book", "Test Author")
+        reader = create_reader("654321")
+        BookService.delete(book.serial_number)
+
+        with pytest.raises(Book.DoesNotExist):
+            BookService.update_borrow_status(book, reader)
+
+        assert Book.all_objects.get(pk="123456").withdrawn_at is not None
+        assert Book.all_objects.get(pk="123456").borrower is None
+        assert stats.get_counters() == {"total": 0, "borrowed": 0, "available": 0}
+
+
+@pytest.mark.django_db
+class TestBorrowLimits:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.READER_LOAN_LIMIT = 2
+        self.reader = create_reader("654321")
+        self.books = [
+            BookService.create_book(f"12345{i}", f"Book {i}", "Author")
+            for i in range(3)
+        ]
+
+    def test_borrow_increments_active_loans(self):
+        BookService.update_borrow_status(self.books[0], self.reader)
+
+        self.reader.refresh_from_db()
+        assert self.reader.active_loans == 1
+
+    def test_return_decrements_active_loans(self):
+        BookService.update_borrow_status(self.books[0], self.reader)
+        BookService.update_borrow_status(self.books[0], None)
+
+        self.reader.refresh_from_db()
+        assert self.reader.active_loans == 0
+
+    def test_reborrow_by_same_reader_does_not_count_twice(self):
+        BookService.update_borrow_status(self.books[0], self.reader)
+        BookService.update_borrow_status(self.books[0], self.reader)
+
+        self.reader.refresh_from_db()
+        assert self.reader.active_loans == 1
+
+    def test_change_borrower_moves_loan(self):
+        other = create_reader("654322")
+        BookService.update_borrow_status(self.books[0], self.reader)
+        BookService.update_borrow_status(self.books[0], other)
+
+        self.reader.refresh_from_db()
+        other.refresh_from_db()
+        assert self.reader.active_loans == 0
+        assert other.active_loans == 1
+
+    def test_global_limit_enforced(self):
+        BookService.update_borrow_status(self.books[0], self.reader)
+        BookService.update_borrow_status(self.books[1], self.reader)
+
+        with pytest.raises(ValidationError):
+            BookService.update_borrow_status(self.books[2], self.reader)
+
+        self.reader.refresh_from_db()
+        assert self.reader.active_loans == 2
+        assert Book.objects.get(pk=self.books[2].pk).borrower is None
+
+    def test_per_reader_limit_overrides_global(self):
+        self.reader.loan_limit = 1
+        self.reader.save()
+        BookService.update_borrow_status(self.books[0], self.reader)
+
+        with pytest.raises(ValidationError):
+            BookService.update_borrow_status(self.books[1], self.reader)
+
+    def test_delete_borrowed_book_releases_loan(self):
+        BookService.update_borrow_status(self.books[0], self.reader)
+        BookService.delete(self.books[0].serial_number)
+
+        self.reader.refresh_from_db()
+        assert self.reader.active_loans == 0
+
+    def test_reconcile_loan_counters(self):
+        Book.objects.filter(pk=self.books[0].pk).update(borrower=self.reader)
+        other = create_reader("654322")
+        Reader.objects.filter(pk=other.pk).update(active_loans=3)
+
+        assert reconcile_loan_counters(dry_run=True) == 2
+        assert reconcile_loan_counters() == 2
+
+        self.reader.refresh_from_db()
+        other.refresh_from_db()
+        assert self.reader.active_loans == 1
+        assert other.active_loans == 0
+        assert reconcile_loan_counters(dry_run=True) == 0
+
+
+@pytest.mark.django_db
+class TestReservationService:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.book = BookService.create_book("123456", "Test Book", "Test Author")
+        self.holder = create_reader("654321")
+        self.waiting = [create_reader("654322"), create_reader("654323")]
+        BookService.update_borrow_status(self.book, self.holder)
+
+    def test_place_reservation(self):
+        reservation = ReservationService.place(self.book, self.waiting[0])
+
+        assert reservation.pk is not None
+        assert list(ReservationService.get_queue(self.book)) == [reservation]
+
+    def test_place_reservation_on_available_book(self):
+        BookService.update_borrow_status(self.book, None)
+
+        with pytest.raises(ValidationError):
+            ReservationService.place(self.book, self.waiting[0])
+
+    def test_place_reservation_by_current_borrower(self):
+        with pytest.raises(ValidationError):
+            ReservationService.place(self.book, self.holder)
+
+    def test_place_duplicate_reservation(self):
+        ReservationService.place(self.book, self.waiting[0])
+
+        with pytest.raises(ValidationError):
+            ReservationService.place(self.book, self.waiting[0])
+
+    def test_cancel_reservation(self):
+        ReservationService.place(self.book, self.waiting[0])
+
+        assert ReservationService.cancel(self.book, "654322") is True
+        assert ReservationService.cancel(self.book, "654322") is False
+
+    def test_return_hands_book_to_head_of_queue(self):
+        for reader in self.waiting:
+            ReservationService.place(self.book, reader)
+
+        updated_book = BookService.update_borrow_status(self.book, None)
+
+        self.book.refresh_from_db()
+        self.holder.refresh_from_db()
+        self.waiting[0].refresh_from_db()
+        assert updated_book.borrower == self.waiting[0]
+        assert self.book.borrower == self.waiting[0]
+        assert self.book.borrow_date is not None
+        assert self.holder.active_loans == 0
+        assert self.waiting[0].active_loans == 1
+        assert [r.reader for r in ReservationService.get_queue(self.book)] == [
+            self.waiting[1]
+        ]
+
+    def test_return_skips_readers_at_loan_limit(self, settings):
+        for reader in self.waiting:
+            ReservationService.place(self.book, reader)
+        Reader.objects.filter(pk=self.waiting[0].pk).update(loan_limit=0)
+
+        updated_book = BookService.update_borrow_status(self.book, None)
+
+        assert updated_book.borrower == self.waiting[1]
+        assert [r.reader for r in ReservationService.get_queue(self.book)] == [
+            self.waiting[0]
+        ]
+
+    def test_return_with_empty_queue_makes_book_available(self):
+        updated_book = BookService.update_borrow_status(self.book, None)
+
+        assert updated_book.borrower is None
+        assert updated_book.borrow_date is None
+
+    def test_borrowing_directly_removes_own_reservation(self):
+        ReservationService.place(self.book, self.waiting[0])
+
+        BookService.update_borrow_status(self.book, self.waiting[0])
+
+        assert not ReservationService.get_queue(self.book).exists()
+
+
+@pytest.mark.django_db
+class TestBulkLoans:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.reader = create_reader("654321")
+        self.books = [
+            BookService.create_book(f"12345{i}", f"Book {i}", "Author")
+            for i in range(4)
+        ]
+        self.serial_numbers = [book.serial_number for book in self.books]
+
+    def test_bulk_borrow(self):
+        BookService.update_borrow_status(self.books[0], create_reader("654322"))
+
+        borrowed = BookService.bulk_borrow(self.serial_numbers, self.reader)
+
+        assert sorted(borrowed) == self.serial_numbers[1:]
+        books = Book.objects.filter(borrower=self.reader)
+        assert books.count() == 3
+        assert all(book.due_date for book in books)
+        self.reader.refresh_from_db()
+        assert self.reader.active_loans == 3
+
+    def test_bulk_borrow_respects_loan_limit(self):
+        self.reader.loan_limit = 2
+        self.reader.save()
+
+        with pytest.raises(ValidationError):
+            BookService.bulk_borrow(self.serial_numbers, self.reader)
+
+        assert not Book.objects.filter(borrower=self.reader).exists()
+        self.reader.refresh_from_db()
+        assert self.reader.active_loans == 0
+
+    def test_bulk_return(self):
+        other = create_reader("654322")
+        BookService.bulk_borrow(self.serial_numbers[:2], self.reader)
+        BookService.update_borrow_status(self.books[2], other)
+
+        returned = BookService.bulk_return(self.serial_numbers)
+
+        assert sorted(returned) == self.serial_numbers[:3]
+        assert not Book.objects.filter(borrower__isnull=False).exists()
+        assert Reader.objects.get(pk=self.reader.pk).active_loans == 0
+        assert Reader.objects.get(pk=other.pk).active_loans == 0
+
+    def test_bulk_return_hands_held_books_to_queue(self):
+        waiting = create_reader("654322")
+        BookService.bulk_borrow(self.serial_numbers[:2], self.reader)
+        ReservationService.place(Book.objects.get(pk="123450"), waiting)
+
+        BookService.bulk_return(self.serial_numbers[:2])
+
+        assert Book.objects.get(pk="123450").borrower == waiting
+        assert Book.objects.get(pk="123451").borrower is None
+        assert Reader.objects.get(pk=self.reader.pk).active_loans == 0
@@ -0,0 +1,129 @@
+import gzip
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from api import stats
+from api.changefeed import CursorExpired, get_changes
+from api.models import Book, BookChange, Reader, Reservation
+from api.services import BookService, ReservationService, create_reader
+from api.snapshot import SnapshotError, restore, snapshot
+
+
+@pytest.mark.django_db
+class TestSnapshot:
+    @pytest.fixture(autouse=True)
+    def setup(self, tmp_path):
+        self.path = tmp_path / "catalog.jsonl.gz"
+        self.readers = [create_reader(f"65432{i}") for i in range(3)]
+        self.readers[2].loan_limit = 1
+        self.readers[2].save()
+        self.books = [
+            BookService.create_book(f"12345{i}", f"Book {i}", f"Author {i % 2}")
+            for i in range(5)
+        ]
+        BookService.update_borrow_status(self.books[0], self.readers[0])
+        BookService.update_borrow_status(self.books[1], self.readers[0])
+        BookService.update_borrow_status(self.books[2], self.readers[2])
+
+    def catalog(self):
+        return (
+            list(Reader.objects.order_by("pk").values()),
+            list(Book.objects.order_by("pk").values()),
+            list(Reservation.objects.order_by("pk").values()),
+        )
+
+    def test_snapshot_is_chunked_jsonl(self):
+        progress = []
+
+        counts = snapshot(
+            self.path, chunk_size=2, progress=lambda *args: progress.append(args)
+        )
+
+        assert counts == {"reader": 3, "book": 5, "reservation": 0}
+        assert progress == [
+            ("reader", 2),
+            ("reader", 3),
+            ("book", 2),
+            ("book", 4),
+            ("book", 5),
+        ]
+        with gzip.open(self.path, "rt") as f:
+            lines = [json.loads(line) for line in f]
+        assert lines[0]["format"] == "library-snapshot"
+        assert lines[1] == ["reader", self.readers[0].pk, "654320", None]
+        assert lines[4][:4] == ["book", "123450", "Book 0", "Author 0"]
+        assert lines[4][4] == self.readers[0].pk
+
+    def test_restore_round_trip(self):
+        ReservationService.place(self.books[0], self.readers[2])
+        ReservationService.place(self.books[0], self.readers[1])
+        snapshot(self.path)
+        before = self.catalog()
+        ReservationService.place(self.books[2], self.readers[1])
+        ReservationService.cancel(self.books[0], "654322")
+        BookService.update_borrow_status(self.books[3], self.readers[1])
+        BookService.delete("123454")
+        create_reader("654329")
+
+        counts = restore(self.path, chunk_size=2)
+
+        assert counts == {"reader": 3, "book": 5, "reservation": 2}
+        assert self.catalog() == before
+        assert [
+            reservation.reader.serial_number
+            for reservation in ReservationService.get_queue(self.books[0])
+        ] == ["654322", "654321"]
+        assert stats.get_counters() == {"total": 5, "borrowed": 3, "available": 2}
+        assert stats.rebuild(verify_only=True) == []
+        # New readers don't collide with restored primary keys
+        assert create_reader("654329").pk > self.readers[2].pk
+
+    def test_restore_restarts_change_feed(self):
+        cursor = BookChange.objects.latest("pk").pk
+        snapshot(self.path)
+
+        restore(self.path)
+
+        with pytest.raises(CursorExpired):
+            get_changes(cursor, 100)
+        changes, books = get_changes(0, 100)
+        assert [change.serial_number for change in changes] == [
+            "123450",
+            "123451",
+            "123452",
+            "123453",
+            "123454",
+        ]
+        assert {change.op for change in changes} == {BookChange.CREATE}
+
+    def test_restore_rejects_other_files(self):
+        with gzip.open(self.path, "wt") as f:
+            f.write(json.dumps({"format": "something-else"}) + "\n")
+
+        with pytest.raises(SnapshotError):
+            restore(self.path)
+        assert Book.objects.count() == 5
+
+
+@pytest.mark.django_db
+class TestSnapshotCommands:
+    def test_snapshot_and_restore(self, tmp_path):
+        path = str(tmp_path / "catalog.jsonl.gz")
+        create_reader("654321")
+        out = StringIO()
+
+        call_command("snapshot", path, stdout=out)
+        Reader.objects.all().delete()
+        call_command("restore", path, "--no-input", stdout=out)
+
+        assert "Wrote 1 reader(s), 0 book(s) and 0 reservation(s)" in out.getvalue()
+        assert "reader: 1" in out.getvalue()
+        assert "Restored 1 reader(s), 0 book(s) and 0 reservation(s)." in out.getvalue()
+        assert Reader.objects.filter(serial_number="654321").exists()
+
+    def test_restore_missing_file(self, tmp_path):
+        with pytest.raises(CommandError):
+            call_command("restore", str(tmp_path / "missing.jsonl.gz"), "--no-input")
@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from api import stats
+from api.models import AuthorLoanCount, Book, CirculationCounter
+from api.services import create_reader, BookService
+
+
+@pytest.mark.django_db
+class TestCirculationCounters:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.LOAN_EVENTS = {**settings.LOAN_EVENTS, "DURABLE": True}
+        self.reader = create_reader("654321")
+        self.books = [
+            BookService.create_book("123456", "Book 1", "Author A"),
+            BookService.create_book("123457", "Book 2", "Author B"),
+        ]
+
+    def test_counters_follow_service_writes(self):
+        assert stats.get_counters() == {"total": 2, "borrowed": 0, "available": 2}
+
+        BookService.update_borrow_status(self.books[0], self.reader)
+        assert stats.get_counters() == {"total": 2, "borrowed": 1, "available": 1}
+
+        BookService.update_borrow_status(self.books[0], create_reader("654322"))
+        assert stats.get_counters()["borrowed"] == 1
+
+        BookService.delete("123456")
+        assert stats.get_counters() == {"total": 1, "borrowed": 0, "available": 1}
+
+    def test_return_decrements_borrowed(self):
+        BookService.update_borrow_status(self.books[0], self.reader)
+        BookService.update_borrow_status(self.books[0], None)
+
+        assert stats.get_counters()["borrowed"] == 0
+
+    def test_reader_delete_decrements_borrowed(self):
+        BookService.update_borrow_status(self.books[0], self.reader)
+        BookService.update_borrow_status(self.books[1], self.reader)
+
+        self.reader.delete()
+
+        assert stats.get_counters()["borrowed"] == 0
+
+    def test_counters_are_sharded(self, settings):
+        settings.STATS_COUNTER_SHARDS = 4
+        for i in range(20):
+            BookService.create_book(f"2000{i:02d}", "Book", "Author")
+
+        assert stats.get_counters()["total"] == 22
+        assert CirculationCounter.objects.filter(name="total").count() > 1
+
+    def test_author_loans(self):
+        BookService.update_borrow_status(self.books[0], self.reader)
+        BookService.update_borrow_status(self.books[0], None)
+        BookService.update_borrow_status(self.books[0], self.reader)
+
+        assert AuthorLoanCount.objects.get(author="Author A").loans == 2
+
+    def test_overdue_loans(self):
+        BookService.update_borrow_status(self.books[0], self.reader)
+        BookService.update_borrow_status(self.books[1], self.reader)
+        Book.objects.filter(pk="123456").update(
+            borrow_date=timezone.now() - timedelta(days=20)
+        )
+
+        assert [book.serial_number for book in stats.get_overdue_loans(14)] == [
+            "123456"
+        ]
+
+    def test_count_loans_between(self):
+        BookService.update_borrow_status(self.books[0], self.reader)
+        now = timezone.now()
+
+        assert stats.count_loans_between(now - timedelta(hours=1), now) == 1
+        assert stats.count_loans_between(end=now - timedelta(hours=1)) == 0
+
+    def test_rebuild_fixes_and_verifies(self):
+        BookService.update_borrow_status(self.books[0], self.reader)
+        CirculationCounter.objects.update(value=0)
+        AuthorLoanCount.objects.all().delete()
+
+        assert set(stats.rebuild(verify_only=True)) == {
+            ("total", 0, 2),
+            ("borrowed", 0, 1),
+            ("author:Author A", 0, 1),
+        }
+        assert stats.get_counters()["total"] == 0
+
+        stats.rebuild()
+
+        assert stats.rebuild(verify_only=True) == []
+        assert stats.get_counters() == {"total": 2, "borrowed": 1, "available": 1}
+        assert AuthorLoanCount.objects.get(author="Author A").loans == 1
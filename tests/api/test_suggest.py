@@ -0,0 +1,195 @@
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from api.changefeed import record_changes
+from api.models import Book, BookChange
+from api.services import BookService
+from api.suggest import IndexNotReady, PrefixIndex, suggester
+
+
+class TestPrefixIndex:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.index = PrefixIndex.build(
+            [
+                ("123456", "Harry Potter", "J. K. Rowling"),
+                ("123457", "The Hobbit", "J. R. R. Tolkien"),
+                ("123458", "Harvest", "Someone Else"),
+            ]
+        )
+
+    def test_matches_word_prefixes_of_titles_and_authors(self):
+        assert self.index.search("har", 10) == [
+            ("123456", "Harry Potter", "J. K. Rowling"),
+            ("123458", "Harvest", "Someone Else"),
+        ]
+        assert [r[0] for r in self.index.search("POTT", 10)] == ["123456"]
+        assert [r[0] for r in self.index.search("tolk", 10)] == ["123457"]
+        assert [r[0] for r in self.index.search("harry  pot", 10)] == ["123456"]
+        assert self.index.search("potters", 10) == []
+
+    def test_limit_and_duplicates(self):
+        # "Harvest" matches "h" once, even though several of its terms start with h
+        assert len(self.index.search("h", 10)) == 3
+        assert len(self.index.search("h", 2)) == 2
+
+    def test_add_and_remove(self):
+        self.index.add("123459", "Hamlet", "Shakespeare")
+        self.index.add("123456", "Philosopher's Stone", "J. K. Rowling")
+        self.index.remove("123458")
+
+        assert [r[0] for r in self.index.search("ha", 10)] == ["123459"]
+        assert [r[0] for r in self.index.search("stone", 10)] == ["123456"]
+        assert len(self.index) == 3
+        assert self.index.entry_count == len(
+            {
+                entry
+                for sn in ("123456", "123457", "123459")
+                for entry in PrefixIndex.terms(*self.index._books[sn])
+            }
+        )
+
+
+@pytest.mark.django_db
+class TestTitleSuggester:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.SUGGEST = {**settings.SUGGEST, "REFRESH_INTERVAL": 0}
+        suggester.reset()
+        BookService.create_book("123456", "Harry Potter", "J. K. Rowling")
+        suggester.rebuild()
+        yield
+        suggester.reset()
+
+    def serials(self, prefix):
+        return [result[0] for result in suggester.suggest(prefix, 10)]
+
+    def test_applies_local_writes(self):
+        assert self.serials("harry") == ["123456"]
+
+        BookService.create_book("123457", "Harry's Game", "Gerald Seymour")
+        BookService.delete("123456")
+
+        assert self.serials("harry") == ["123457"]
+
+    def test_applies_signals_on_commit(
+        self, settings, django_capture_on_commit_callbacks
+    ):
+        settings.SUGGEST = {**settings.SUGGEST, "REFRESH_INTERVAL": 3600}
+        assert self.serials("harry") == ["123456"]
+
+        with django_capture_on_commit_callbacks(execute=True):
+            BookService.create_book("123457", "Harry's Game", "Gerald Seymour")
+
+        assert self.serials("harry's") == ["123457"]
+
+    def test_catches_up_with_bulk_writes(self):
+        assert self.serials("ham") == []
+
+        Book.objects.bulk_create(
+            [Book(serial_number="123457", title="Hamlet", author="Shakespeare")]
+        )
+        record_changes(["123457"], BookChange.CREATE)
+
+        assert self.serials("ham") == ["123457"]
+
+
+# The index is built on a thread of its own, which needs committed books
+@pytest.mark.django_db(transaction=True)
+class TestBackgroundBuild:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.SUGGEST = {**settings.SUGGEST, "REFRESH_INTERVAL": 0}
+        suggester.reset()
+        BookService.create_book("123456", "Harry Potter", "J. K. Rowling")
+        yield
+        suggester.wait()
+        suggester.reset()
+
+    def serials(self, prefix):
+        return [result[0] for result in suggester.suggest(prefix, 10)]
+
+    def test_start(self):
+        suggester.start()
+        suggester.wait()
+
+        assert suggester.loaded
+        assert self.serials("harry") == ["123456"]
+
+    def test_lookups_before_the_build_start_it(self):
+        with pytest.raises(IndexNotReady):
+            self.serials("harry")
+        suggester.wait()
+
+        assert self.serials("harry") == ["123456"]
+
+    def test_rebuilds_when_out_of_sync(self, settings):
+        suggester.start()
+        suggester.wait()
+        assert self.serials("ham") == []
+        settings.SUGGEST = {**settings.SUGGEST, "CHECK_INTERVAL": 0}
+
+        # A write that left no trace in the change feed
+        Book.objects.bulk_create(
+            [Book(serial_number="123457", title="Hamlet", author="Shakespeare")]
+        )
+
+        # Served from the old index until the new one is built
+        assert self.serials("ham") == []
+        suggester.wait()
+        assert self.serials("ham") == ["123457"]
+
+
+@pytest.mark.django_db
+class TestBookViewSetSuggest:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        suggester.reset()
+        self.client = APIClient()
+        self.url = reverse("book-suggest")
+        BookService.create_book("123456", "Harry Potter", "J. K. Rowling")
+        BookService.create_book("123457", "The Hobbit", "J. R. R. Tolkien")
+        yield
+        suggester.wait()
+        suggester.reset()
+
+    def test_suggest(self, django_assert_max_num_queries):
+        """
+        GET /books/suggest/?prefix= returns matching books from the in-memory index
+        """
+        suggester.rebuild()
+        self.client.get(self.url, {"prefix": "ho"})
+
+        with django_assert_max_num_queries(0):
+            response = self.client.get(self.url, {"prefix": "hob"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == [
+            {
+                "serial_number": "123457",
+                "title": "The Hobbit",
+                "author": "J. R. R. Tolkien",
+            }
+        ]
+
+    def test_suggest_invalid_params(self):
+        """
+        GET /books/suggest/ with a too short prefix or invalid limit returns 400
+        """
+        assert self.client.get(self.url, {"prefix": "h"}).status_code == 400
+        response = self.client.get(self.url, {"prefix": "ha", "limit": "x"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.django_db(transaction=True)
+    def test_suggest_while_loading(self, settings):
+        """
+        GET /books/suggest/ returns 503 while the index is being built
+        """
+        response = self.client.get(self.url, {"prefix": "hob"})
+
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response["Retry-After"] == str(settings.SUGGEST["RETRY_AFTER"])
+        suggester.wait()
+        assert len(self.client.get(self.url, {"prefix": "hob"}).data) == 1
@@ -0,0 +1,104 @@
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from api.throttling import CacheBucketStore, SharedMemoryBucketStore, _take
+
+
+class TestTakeTokens:
+    def test_new_bucket_starts_full(self):
+        tokens, allowed, wait = _take(0.0, 0.0, 100.0, 1, rate=1, capacity=10)
+
+        assert allowed is True
+        assert tokens == 9
+        assert wait == 0
+
+    def test_empty_bucket_reports_wait(self):
+        tokens, allowed, wait = _take(0.5, 100.0, 100.0, 2, rate=1, capacity=10)
+
+        assert allowed is False
+        assert wait == pytest.approx(1.5)
+
+    def test_refill_is_capped_at_capacity(self):
+        tokens, allowed, _ = _take(0.0, 1.0, 1000.0, 1, rate=1, capacity=10)
+
+        assert allowed is True
+        assert tokens == 9
+
+
+@pytest.mark.parametrize("store_class", [SharedMemoryBucketStore, CacheBucketStore])
+def test_store_limits_after_burst(store_class):
+    store = store_class()
+
+    results = [store.consume("client", 1, rate=0.001, capacity=3)[0] for _ in range(4)]
+
+    assert results == [True, True, True, False]
+    assert store.consume("other-client", 1, rate=0.001, capacity=3)[0] is True
+
+
+@pytest.mark.django_db
+class TestTokenBucketThrottle:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.RATE_LIMIT = {
+            "ENABLED": True,
+            "RATE": 0.001,
+            "BURST": 25,
+            "BACKEND": "api.throttling.CacheBucketStore",
+            "OPTIONS": {},
+        }
+        self.client = APIClient()
+
+    def get_books(self, ip):
+        return self.client.get(reverse("book-list"), REMOTE_ADDR=ip)
+
+    def test_expensive_action_costs_more(self):
+        assert self.get_books("10.0.0.1").status_code == status.HTTP_200_OK
+
+        response = self.get_books("10.0.0.1")
+
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert "Retry-After" in response
+
+    def test_clients_have_separate_buckets(self):
+        self.get_books("10.0.0.2")
+
+        assert self.get_books("10.0.0.3").status_code == status.HTTP_200_OK
+
+    def test_spoofed_forwarded_for_shares_the_bucket(self):
+        """Without proxies X-Forwarded-For is the client's to write, and ignored"""
+        url = reverse("book-list")
+        self.client.get(url, REMOTE_ADDR="10.0.0.5", HTTP_X_FORWARDED_FOR="1.1.1.1")
+
+        response = self.client.get(
+            url, REMOTE_ADDR="10.0.0.5", HTTP_X_FORWARDED_FOR="2.2.2.2"
+        )
+
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+    def test_client_address_from_the_proxy(self, settings):
+        """Behind a proxy the address it added identifies the client"""
+        settings.REST_FRAMEWORK = {**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}
+        url = reverse("book-list")
+
+        def get_books(forwarded_for):
+            return self.client.get(
+                url, REMOTE_ADDR="10.0.0.6", HTTP_X_FORWARDED_FOR=forwarded_for
+            )
+
+        get_books("1.1.1.1, 10.0.1.1")
+
+        assert (
+            get_books("2.2.2.2, 10.0.1.1").status_code
+            == status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        assert get_books("10.0.1.2").status_code == status.HTTP_200_OK
+
+    def test_cheap_actions_use_default_cost(self):
+        url = reverse("book-detail", kwargs={"pk": "999999"})
+        responses = [self.client.get(url, REMOTE_ADDR="10.0.0.4") for _ in range(25)]
+
+        assert all(r.status_code == status.HTTP_404_NOT_FOUND for r in responses)
+        response = self.client.get(url, REMOTE_ADDR="10.0.0.4")
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
@@ -0,0 +1,219 @@
+import json
+import time
+
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.services import BookService, create_reader
+from api.tracing import (
+    JsonLinesExporter,
+    Span,
+    get_exporter,
+    parse_traceparent,
+    span,
+    start_trace,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+def read_spans(path):
+    get_exporter().flush()
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+class TestParseTraceparent:
+    def test_valid(self):
+        assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (
+            TRACE_ID,
+            PARENT_ID,
+            True,
+        )
+        assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00")[2] is False
+
+    def test_future_versions_may_add_fields(self):
+        assert parse_traceparent(f"01-{TRACE_ID}-{PARENT_ID}-01-extra") == (
+            TRACE_ID,
+            PARENT_ID,
+            True,
+        )
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            "",
+            f"00-{TRACE_ID}-{PARENT_ID}",
+            f"00-{TRACE_ID.upper()}-{PARENT_ID}-01",
+            f"00-{TRACE_ID}-{PARENT_ID}-01-extra",
+            f"ff-{TRACE_ID}-{PARENT_ID}-01",
+            f"00-{'0' * 32}-{PARENT_ID}-01",
+            f"00-{TRACE_ID}-{'0' * 16}-01",
+        ],
+    )
+    def test_invalid(self, value):
+        assert parse_traceparent(value) is None
+
+
+class TestJsonLinesExporter:
+    def test_writes_batches_from_a_background_thread(self, tmp_path):
+        path = tmp_path / "spans.jsonl"
+        exporter = JsonLinesExporter(str(path), batch_size=2, flush_interval=10)
+        spans = [Span(f"span-{i}", TRACE_ID) for i in range(3)]
+        for s in spans:
+            s.end()
+            exporter.export(s)
+
+        # The full batch wakes the flusher, the rest waits for the interval
+        deadline = time.monotonic() + 5
+        while not path.exists() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        exporter.flush()
+
+        lines = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [line["name"] for line in lines] == ["span-0", "span-1", "span-2"]
+
+    def test_drops_spans_when_the_queue_is_full(self, tmp_path):
+        path = tmp_path / "spans.jsonl"
+        exporter = JsonLinesExporter(
+            str(path), batch_size=10, flush_interval=0, max_queue_size=2
+        )
+        for i in range(3):
+            s = Span(f"span-{i}", TRACE_ID)
+            s.end()
+            exporter.export(s)
+        exporter.flush()
+
+        assert exporter.dropped == 1
+        assert len(path.read_text().splitlines()) == 2
+
+
+class TestSpans:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, tmp_path):
+        self.path = tmp_path / "spans.jsonl"
+        settings.TRACING = {
+            **settings.TRACING,
+            "EXPORTER": {
+                "BACKEND": "api.tracing.JsonLinesExporter",
+                "OPTIONS": {"path": str(self.path), "flush_interval": 0},
+            },
+        }
+
+    def test_nested_spans(self):
+        with start_trace("root", TRACE_ID, PARENT_ID) as root:
+            with span("child", {"key": "value"}) as child:
+                pass
+
+        spans = {s["name"]: s for s in read_spans(self.path)}
+        assert spans["root"]["parent_id"] == PARENT_ID
+        assert spans["child"]["parent_id"] == root.span_id
+        assert spans["child"]["span_id"] == child.span_id
+        assert spans["child"]["trace_id"] == TRACE_ID
+        assert spans["child"]["attributes"] == {"key": "value"}
+
+    def test_records_errors(self):
+        with pytest.raises(ValueError):
+            with start_trace("root"):
+                raise ValueError
+
+        (root,) = read_spans(self.path)
+        assert root["status"] == "error"
+        assert root["attributes"]["error.type"] == "ValueError"
+
+    def test_nothing_is_recorded_outside_a_trace(self):
+        with span("orphan") as orphan:
+            pass
+
+        assert orphan is None
+        assert read_spans(self.path) == []
+
+
+@pytest.mark.django_db
+class TestTracingMiddleware:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings, tmp_path):
+        self.path = tmp_path / "spans.jsonl"
+        settings.TRACING = {
+            **settings.TRACING,
+            "ENABLED": True,
+            "SAMPLE_RATE": 1,
+            "EXPORTER": {
+                "BACKEND": "api.tracing.JsonLinesExporter",
+                "OPTIONS": {"path": str(self.path), "flush_interval": 0},
+            },
+        }
+        self.client = APIClient()
+        BookService.create_book("123456", "Book", "Author")
+        create_reader("654321")
+        self.url = reverse("book-status", args=["123456"])
+
+    def test_traces_the_status_update(self):
+        """Test that a status update is traced down to its SQL statements"""
+        response = self.client.patch(self.url, {"borrower": "654321"}, format="json")
+
+        assert response.status_code == 200
+        spans = read_spans(self.path)
+        by_id = {s["span_id"]: s for s in spans}
+        root = next(s for s in spans if s["parent_id"] is None)
+        assert root["name"] == "PATCH book-status"
+        assert root["attributes"]["http.status_code"] == 200
+        assert (
+            response["traceresponse"] == f"00-{root['trace_id']}-{root['span_id']}-01"
+        )
+        assert {s["trace_id"] for s in spans} == {root["trace_id"]}
+        children = [s["name"] for s in spans if s["parent_id"] == root["span_id"]]
+        for name in [
+            "BookService.get_by_serial",
+            "BookStatusSerializer.is_valid",
+            "BookService.update_borrow_status",
+            "BookListSerializer.data",
+            "render",
+        ]:
+            assert name in children
+        statements = [s for s in spans if s["name"] == "sql"]
+        assert statements
+        assert all(s["parent_id"] in by_id for s in statements)
+        assert any(
+            by_id[s["parent_id"]]["name"] == "BookStatusSerializer.is_valid"
+            and "api_reader" in s["attributes"]["db.statement"]
+            for s in statements
+        )
+
+    def test_continues_the_callers_trace(self, settings):
+        """Test that a sampled traceparent is followed whatever the sample rate"""
+        settings.TRACING = {**settings.TRACING, "SAMPLE_RATE": 0}
+
+        response = self.client.get(
+            reverse("book-detail", args=["123456"]),
+            HTTP_TRACEPARENT=f"00-{TRACE_ID}-{PARENT_ID}-01",
+        )
+
+        root = next(s for s in read_spans(self.path) if s["name"] == "GET book-detail")
+        assert root["trace_id"] == TRACE_ID
+        assert root["parent_id"] == PARENT_ID
+        assert response["traceresponse"].startswith(f"00-{TRACE_ID}-")
+
+    def test_follows_the_callers_decision_not_to_sample(self):
+        """Test that an unsampled traceparent isn't recorded"""
+        response = self.client.get(
+            reverse("book-detail", args=["123456"]),
+            HTTP_TRACEPARENT=f"00-{TRACE_ID}-{PARENT_ID}-00",
+        )
+
+        assert response.status_code == 200
+        assert "traceresponse" not in response
+        assert read_spans(self.path) == []
+
+    def test_disabled(self, settings):
+        """Test that nothing is traced while tracing is disabled"""
+        settings.TRACING = {**settings.TRACING, "ENABLED": False}
+
+        response = self.client.patch(self.url, {"borrower": None}, format="json")
+
+        assert response.status_code == 200
+        assert "traceresponse" not in response
+        assert read_spans(self.path) == []
@@ -9,6 +9,7 @@ from datetime import timedelta
 
 from api.models import Reader, Book
 from api.services import create_reader, BookService
+from api.views import BookViewSet
 
 
 @pytest.mark.django_db
@@ -42,18 +43,106 @@ class TestReaderCreateAPIView:
         [
             ("delete", status.HTTP_405_METHOD_NOT_ALLOWED),
             ("put", status.HTTP_405_METHOD_NOT_ALLOWED),
-            ("get", status.HTTP_405_METHOD_NOT_ALLOWED),
         ],
     )
     def test_reader_methods_not_allowed(self, method, expected_status):
         """
-        Methods DELETE, PUT, GET on /readers/ return 405 Method Not Allowed
+        Methods DELETE, PUT on /readers/ return 405 Method Not Allowed
         """
         client_method = getattr(self.client, method)
         response = client_method(self.url)
         assert response.status_code == expected_status
 
 
+@pytest.mark.django_db
+class TestReaderEndpoints:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.client = APIClient()
+        self.readers = [create_reader(f"65432{i}") for i in range(5)]
+        for i, reader in enumerate(self.readers):
+            for j in range(i):
+                book = BookService.create_book(f"1{i}{j}000", f"Book {i}{j}", "Author")
+                BookService.update_borrow_status(book, reader)
+
+    def test_list_readers(self, django_assert_num_queries):
+        """
+        GET /readers/ returns readers with their loans in a constant number of queries
+        """
+        with django_assert_num_queries(2):
+            response = self.client.get(reverse("reader-create"))
+
+        assert response.status_code == status.HTTP_200_OK
+        results = response.data["results"]
+        assert [reader["serial_number"] for reader in results] == [
+            "654320",
+            "654321",
+            "654322",
+            "654323",
+            "654324",
+        ]
+        assert [len(reader["loans"]) for reader in results] == [0, 1, 2, 3, 4]
+        assert results[1]["active_loans"] == 1
+        assert results[1]["loans"][0]["serial_number"] == "110000"
+        assert results[1]["loans"][0]["due_date"] is not None
+
+    def test_list_readers_paginated(self, django_assert_num_queries):
+        """
+        GET /readers/?page_size= follows the next cursor with the same query count
+        """
+        response = self.client.get(reverse("reader-create"), {"page_size": 2})
+        assert len(response.data["results"]) == 2
+
+        with django_assert_num_queries(2):
+            response = self.client.get(response.data["next"])
+
+        assert [reader["serial_number"] for reader in response.data["results"]] == [
+            "654322",
+            "654323",
+        ]
+
+    def test_retrieve_reader(self, django_assert_num_queries):
+        """
+        GET /readers/{serial_number}/ returns the reader with their loans
+        """
+        url = reverse("reader-detail", kwargs={"serial_number": "654322"})
+        with django_assert_num_queries(2):
+            response = self.client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["serial_number"] == "654322"
+        assert [book["serial_number"] for book in response.data["loans"]] == [
+            "120000",
+            "121000",
+        ]
+
+    def test_reader_books(self, django_assert_num_queries):
+        """
+        GET /readers/{serial_number}/books/ returns the reader's loans, oldest first
+        """
+        url = reverse("reader-books", kwargs={"serial_number": "654324"})
+        with django_assert_num_queries(2):
+            response = self.client.get(url, {"page_size": 3})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [book["serial_number"] for book in response.data["results"]] == [
+            "140000",
+            "141000",
+            "142000",
+        ]
+        assert response.data["next"] is not None
+
+    def test_reader_not_found(self):
+        """
+        GET /readers/{serial_number}/ and its books for an unknown reader return 404
+        """
+        for name in ("reader-detail", "reader-books"):
+            url = reverse(name, kwargs={"serial_number": "999999"})
+            response = self.client.get(url)
+
+            assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
 @pytest.mark.django_db
 class TestBookViewSetList:
     @pytest.fixture(autouse=True)
@@ -100,6 +189,52 @@ class TestBookViewSetList:
         assert book2_data["borrower_serial_number"] is None
         assert book2_data["borrow_date"] is None
 
+    def test_list_sparse_fields(self, django_assert_num_queries):
+        """
+        GET /books/?fields= returns only the requested fields, without the borrower join
+        """
+        with django_assert_num_queries(1) as context:
+            response = self.client.get(self.url, {"fields": "serial_number,status"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert sorted(response.data, key=lambda item: item["serial_number"]) == [
+            {"serial_number": "123456", "status": "borrowed"},
+            {"serial_number": "123457", "status": "available"},
+        ]
+        sql = context.captured_queries[0]["sql"]
+        assert "api_reader" not in sql
+        assert '"title"' not in sql
+
+    def test_list_sparse_fields_with_borrower(self):
+        """
+        GET /books/?fields= with a borrower field still returns the borrower
+        """
+        response = self.client.get(
+            self.url, {"fields": "serial_number,borrower_serial_number"}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        book1_data = next(
+            item for item in response.data if item["serial_number"] == "123456"
+        )
+        assert book1_data == {
+            "serial_number": "123456",
+            "borrower_serial_number": "654321",
+        }
+
+    def test_list_unknown_fields(self):
+        """
+        GET /books/?fields= with unknown or no fields returns 400
+        """
+        response = self.client.get(self.url, {"fields": "serial_number,isbn"})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "isbn" in response.data["detail"]
+
+        response = self.client.get(self.url, {"fields": ""})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
 
 @pytest.mark.django_db
 class TestBookViewSetCreate:
@@ -177,6 +312,19 @@ class TestBookViewSetRetrieve:
         assert response.data["title"] == "Test Book"
         assert response.data["author"] == "Test Author"
 
+    def test_retrieve_sparse_fields(self):
+        """
+        GET /books/{serial_number}/?fields= returns only the requested fields
+        """
+        response = self.client.get(self.url, {"fields": "title,borrower"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {"title": "Test Book", "borrower": None}
+
+        response = self.client.get(self.url, {"fields": "status"})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
     def test_retrieve_book_not_found(self):
         """
         GET /books/{serial_number}/ with non-existent serial returns 404
@@ -240,6 +388,26 @@ class TestBookViewSetStatus:
         assert self.book.borrower == self.reader
         assert self.book.borrow_date is not None
 
+    def test_update_status_of_a_book_withdrawn_meanwhile(self, monkeypatch):
+        """
+        PATCH /books/{serial_number}/status/ returns 404 if a DELETE wins the race
+        """
+        get_object = BookViewSet.get_object
+
+        def get_then_withdraw(view, serial_number, columns=None):
+            book = get_object(view, serial_number, columns)
+            BookService.delete(serial_number)
+            return book
+
+        monkeypatch.setattr(BookViewSet, "get_object", get_then_withdraw)
+
+        data = {"borrower": self.reader.serial_number}
+        response = self.client.patch(self.url, data, format="json")
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert not Book.objects.filter(pk=self.book.pk).exists()
+        assert Book.all_objects.get(pk=self.book.pk).borrower is None
+
     def test_update_status_to_available(self):
         """
         PATCH /books/{serial_number}/status/ sets book as available
@@ -308,3 +476,294 @@ class TestBookViewSetStatus:
 
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert "borrower" in response.data
+
+    def test_update_status_loan_limit_reached(self):
+        """
+        PATCH /books/{serial_number}/status/ over the reader's loan limit returns 400
+        """
+        self.reader.loan_limit = 0
+        self.reader.save()
+
+        data = {"borrower": self.reader.serial_number}
+        response = self.client.patch(self.url, data, format="json")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "borrower" in response.data
+        self.book.refresh_from_db()
+        assert self.book.borrower is None
+
+
+@pytest.mark.django_db
+class TestBookViewSetReservations:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.client = APIClient()
+        self.book = BookService.create_book("123456", "Test Book", "Test Author")
+        self.holder = create_reader("654321")
+        self.reader = create_reader("654322")
+        BookService.update_borrow_status(self.book, self.holder)
+        self.url = reverse("book-reservations", kwargs={"pk": self.book.serial_number})
+
+    def test_place_reservation(self):
+        """
+        POST /books/{serial_number}/reservations/ places a hold
+        """
+        response = self.client.post(self.url, {"reader": "654322"}, format="json")
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["book"] == "123456"
+        assert response.data["reader"] == "654322"
+
+    def test_place_reservation_unknown_reader(self):
+        """
+        POST /books/{serial_number}/reservations/ with unknown reader returns 400
+        """
+        response = self.client.post(self.url, {"reader": "999999"}, format="json")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "reader" in response.data
+
+    def test_place_reservation_on_available_book(self):
+        """
+        POST /books/{serial_number}/reservations/ on an available book returns 400
+        """
+        BookService.update_borrow_status(self.book, None)
+
+        response = self.client.post(self.url, {"reader": "654322"}, format="json")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_list_reservations(self):
+        """
+        GET /books/{serial_number}/reservations/ lists the queue in order
+        """
+        self.client.post(self.url, {"reader": "654322"}, format="json")
+
+        response = self.client.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [item["reader"] for item in response.data] == ["654322"]
+
+    def test_cancel_reservation(self):
+        """
+        DELETE /books/{serial_number}/reservations/?reader= cancels the hold
+        """
+        self.client.post(self.url, {"reader": "654322"}, format="json")
+
+        response = self.client.delete(f"{self.url}?reader=654322")
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+        response = self.client.delete(f"{self.url}?reader=654322")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_return_hands_book_to_next_reader(self):
+        """
+        PATCH /books/{serial_number}/status/ returning a held book lends it on
+        """
+        self.client.post(self.url, {"reader": "654322"}, format="json")
+        url = reverse("book-status", kwargs={"pk": self.book.serial_number})
+
+        response = self.client.patch(url, {"borrower": None}, format="json")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["status"] == "borrowed"
+        assert response.data["borrower_serial_number"] == "654322"
+
+
+@pytest.mark.django_db
+class TestLoanHistory:
+    @pytest.fixture(autouse=True)
+    def setup(self, settings):
+        settings.LOAN_EVENTS = {**settings.LOAN_EVENTS, "DURABLE": True}
+        self.client = APIClient()
+        self.book = BookService.create_book("123456", "Test Book", "Test Author")
+        self.reader = create_reader("654321")
+        BookService.update_borrow_status(self.book, self.reader)
+        BookService.update_borrow_status(self.book, None)
+
+    def test_book_history(self):
+        """
+        GET /books/{serial_number}/history/ lists loan events, newest first
+        """
+        url = reverse("book-history", kwargs={"pk": "123456"})
+        response = self.client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [item["event"] for item in response.data["results"]] == [
+            "return",
+            "borrow",
+        ]
+        assert response.data["results"][0]["reader_serial_number"] == "654321"
+
+    def test_book_history_is_paginated(self):
+        url = reverse("book-history", kwargs={"pk": "123456"})
+        response = self.client.get(url, {"page_size": 1})
+
+        assert len(response.data["results"]) == 1
+        assert response.data["next"] is not None
+
+        response = self.client.get(response.data["next"])
+        assert response.data["results"][0]["event"] == "borrow"
+
+    def test_reader_history(self):
+        """
+        GET /readers/{serial_number}/history/ lists the reader's loan events
+        """
+        url = reverse("reader-history", kwargs={"serial_number": "654321"})
+        response = self.client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["results"]) == 2
+
+
+@pytest.mark.django_db
+class TestBookViewSetChanges:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.client = APIClient()
+        self.url = reverse("book-changes")
+        BookService.create_book("123456", "Test Book", "Test Author")
+        BookService.create_book("123457", "Other Book", "Other Author")
+        BookService.delete("123457")
+
+    def test_changes_since_start(self):
+        """
+        GET /books/changes/ returns the changes with the current book state
+        """
+        response = self.client.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+        results = response.data["results"]
+        assert [(item["serial_number"], item["op"]) for item in results] == [
+            ("123456", "create"),
+            ("123457", "create"),
+            ("123457", "delete"),
+        ]
+        assert results[0]["book"]["status"] == "available"
+        assert results[1]["book"] is None
+        assert response.data["next_cursor"] == results[-1]["cursor"]
+        assert response.data["has_more"] is False
+
+    def test_changes_after_cursor_when_quiet(self):
+        """
+        GET /books/changes/?since=<latest cursor> returns nothing new
+        """
+        cursor = self.client.get(self.url).data["next_cursor"]
+
+        response = self.client.get(self.url, {"since": cursor})
+
+        assert response.data["results"] == []
+        assert response.data["next_cursor"] == cursor
+
+    def test_changes_limit(self):
+        response = self.client.get(self.url, {"limit": 2})
+
+        assert len(response.data["results"]) == 2
+        assert response.data["has_more"] is True
+
+    def test_changes_invalid_cursor(self):
+        response = self.client.get(self.url, {"since": "abc"})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestStatsViewSet:
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.client = APIClient()
+        self.reader = create_reader("654321")
+        self.book = BookService.create_book("123456", "Test Book", "Test Author")
+        BookService.create_book("123457", "Other Book", "Other Author")
+        BookService.update_borrow_status(self.book, self.reader)
+
+    def test_counters(self):
+        """
+        GET /stats/ returns the total, borrowed and available counts
+        """
+        response = self.client.get(reverse("stats-list"))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {"total": 2, "borrowed": 1, "available": 1}
+
+    def test_overdue(self):
+        """
+        GET /stats/overdue/?days=N lists loans older than N days
+        """
+        Book.objects.filter(pk="123456").update(
+            borrow_date=timezone.now() - timedelta(days=30)
+        )
+
+        response = self.client.get(reverse("stats-overdue"), {"days": 14})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [item["serial_number"] for item in response.data["results"]] == [
+            "123456"
+        ]
+        response = self.client.get(reverse("stats-overdue"), {"days": 60})
+        assert response.data["results"] == []
+
+    def test_loans_in_range(self):
+        """
+        GET /stats/loans/?from=&to= counts loans started in the range
+        """
+        response = self.client.get(
+            reverse("stats-loans"), {"from": "2000-01-01T00:00:00Z"}
+        )
+        assert response.data == {"count": 1}
+
+        response = self.client.get(reverse("stats-loans"), {"from": "yesterday"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_loans_with_an_impossible_date(self):
+        """
+        GET /stats/loans/ with a well-formed but impossible date returns 400
+        """
+        response = self.client.get(
+            reverse("stats-loans"), {"to": "2024-02-30T00:00:00"}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data["detail"] == "to must be an ISO 8601 date and time"
+
+    def test_top_readers(self):
+        """
+        GET /stats/readers/ ranks readers by current loans
+        """
+        response = self.client.get(reverse("stats-readers"))
+
+        assert response.data == [{"serial_number": "654321", "active_loans": 1}]
+
+    def test_top_authors(self):
+        """
+        GET /stats/authors/ ranks authors by loans
+        """
+        response = self.client.get(reverse("stats-authors"))
+
+        assert response.data == [{"author": "Test Author", "loans": 1}]
+
+    def test_pool(self, monkeypatch):
+        """
+        GET /stats/pool/ returns the connection pool statistics per database
+        """
+        response = self.client.get(reverse("stats-pool"))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["databases"] == {
+            "default": None,
+            "east": None,
+            "west": None,
+        }
+
+        class Pool:
+            def get_stats(self):
+                return {"pool_size": 4, "pool_available": 3}
+
+        monkeypatch.setattr(
+            "api.pooling.get_pool", lambda alias: Pool() if alias == "east" else None
+        )
+        response = self.client.get(reverse("stats-pool"))
+
+        assert response.data["databases"]["east"] == {
+            "pool_size": 4,
+            "pool_available": 3,
+        }
@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+from django.db import connections
+
+from api.serializers import BookSerializer, BookStatusSerializer
+from api.warmup import warm_up_app, warm_up_connections
+
+
+class TestWarmUpApp:
+    def test_builds_the_cached_serializer_fields(self):
+        for cls in (BookSerializer, BookStatusSerializer):
+            if "_cached_fields" in cls.__dict__:
+                del cls._cached_fields
+
+        warm_up_app()
+
+        assert "_cached_fields" in BookSerializer.__dict__
+        assert "_cached_fields" in BookStatusSerializer.__dict__
+
+
+@pytest.mark.django_db(databases=["default", "east", "west"])
+class TestWarmUpConnections:
+    def test_connects_the_current_thread_to_every_database(self):
+        opened = {}
+
+        def warm_up():
+            warm_up_connections()
+            opened.update(
+                (alias, connections[alias].connection is not None)
+                for alias in ("default", "east", "west")
+            )
+            connections.close_all()
+
+        thread = threading.Thread(target=warm_up)
+        thread.start()
+        thread.join()
+
+        assert opened == {"default": True, "east": True, "west": True}